@@ -9,7 +9,9 @@ def create_app(test_config=None):
     app.config.from_mapping(
         SECRET_KEY='dev',
         UPLOAD_FOLDER=os.path.join(app.instance_path, 'uploads'),
-        MAX_CONTENT_LENGTH=300 * 1024 * 1024  # 300MB限制
+        MAX_CONTENT_LENGTH=300 * 1024 * 1024,  # 300MB限制
+        SOURCE_PRIORITY=None,  # 步数/距离去重的数据源优先级关键字列表，None表示手表优先于手机
+        COMPRESS_RESPONSES=True  # 按Accept-Encoding压缩JSON和HTML响应（gzip，安装brotli后支持br）
     )
 
     if test_config is None:
@@ -32,6 +34,14 @@ def create_app(test_config=None):
     app.register_blueprint(upload.bp)
     app.register_blueprint(analysis.bp)
     
+    # 注册响应压缩
+    from app.utils.compression import init_compression
+    init_compression(app)
+    
+    # 注册命令行命令（flask render-reports）
+    from app.utils.reports import render_reports_command
+    app.cli.add_command(render_reports_command)
+    
     # 设置主页路由
     from flask import redirect, url_for
     @app.route('/')
@@ -1,20 +1,95 @@
 from flask import (
     Blueprint, flash, g, redirect, render_template, request, 
-    session, url_for, jsonify
+    session, url_for, jsonify, current_app
 )
 from app.utils.health_parser import HealthDataParser
-import pandas as pd
+from app.utils.lazy import lazy_module
 import json
 import os
-from app.components.dashboard import initialize_parser
+from app.components.dashboard import (
+    initialize_parser, get_dataset_version, get_artifact_dir, get_health_summary, json_response
+)
+from app.utils.timekeys import days_to_iso, GRANULARITIES, GRANULARITY_UNITS, bucket_labels, date_to_day
+from app.utils.cache import result_cache, cached_payload, load_artifact, save_artifact
+from app.utils.correlation import (
+    pearson_matrix, spearman_matrix, correlation_pvalues, matrix_to_list,
+    lagged_cross_correlation, peak_lag
+)
+from app.utils.health_parser import is_cumulative_type
+from app.utils.indicators import compute_indicators
+from app.utils.sketches import rank_errors
+from app.utils.anomalies import detect_all_anomalies, DEFAULT_DETECTION_PARAMS, DEFAULT_THRESHOLD
+from app.utils.resampling import bootstrap_correlation_ci, permutation_test
 import numpy as np
 import traceback
 
+pd = lazy_module('pandas')
+
 bp = Blueprint('analysis', __name__, url_prefix='/analysis')
 
+# 滞后相关的默认最大滞后及允许的上限（按时间粒度：两周的小时、一年的天、两年的周）
+DEFAULT_MAX_LAGS = {'hour': 48, 'day': 7, 'week': 4}
+MAX_LAG_LIMITS = {'hour': 336, 'day': 365, 'week': 104}
+
+def _summary_stats(summary):
+    """
+    由健康摘要得到分析页面各统计卡片的数据
+    
+    参数:
+        summary: get_health_summary返回的摘要字典
+        
+    返回:
+        卡片名称 -> {显示名称: 数值}的字典，没有数据的卡片不包含
+    """
+    stats = {}
+    
+    heart_rate = summary.get('heart_rate')
+    if heart_rate:
+        stats['heart_rate'] = {
+            '平均心率': heart_rate['average'],
+            '最大心率': heart_rate['max'],
+            '最小心率': heart_rate['min']
+        }
+        if 'median' in heart_rate:
+            stats['heart_rate'].update({
+                'P5心率': heart_rate['p5'],
+                '心率中位数': heart_rate['median'],
+                'P95心率': heart_rate['p95']
+            })
+    
+    steps = summary.get('steps')
+    if steps:
+        stats['steps'] = {
+            '总步数': steps['total'],
+            '平均每日步数': steps['average'],
+            '最高步数': steps['max'],
+            '最低步数': steps['min']
+        }
+    
+    sleep = summary.get('sleep')
+    if sleep:
+        stats['sleep'] = {
+            '平均睡眠时长': sleep['average'],
+            '最长睡眠时长': sleep['max'],
+            '最短睡眠时长': sleep['min']
+        }
+    
+    ecg = summary.get('ecg')
+    if ecg:
+        stats['ecg'] = {
+            'ECG记录数': ecg['count']
+        }
+    
+    return stats
+
 @bp.route('', methods=('GET',))
 def index():
-    """显示健康数据分析选项"""
+    """
+    显示健康数据分析选项
+    
+    统计卡片和数据类型列表来自与数据集一起持久化的健康摘要（上传时已计算），
+    只有摘要尚未生成时才解析数据。
+    """
     
     # 检查是否有已解析的数据文件
     data_file_path = session.get('data_file_path')
@@ -26,56 +101,15 @@ def index():
         return redirect(url_for('upload.upload_file'))
     
     try:
-        # 初始化解析器并加载数据
-        parser = initialize_parser()
-        if not parser:
+        summary = get_health_summary()
+        if summary is None:
             flash('加载数据文件时出错')
             return redirect(url_for('upload.upload_file'))
         
-        # 获取所有可用的数据类型
-        data_types = parser.get_all_data_types()
-        
-        # 获取一些基本统计数据
-        stats = {}
-        
-        # 获取心率统计
-        heart_rate_stats = parser.get_heart_rate_stats()
-        if heart_rate_stats:
-            stats['heart_rate'] = heart_rate_stats
-        
-        # 获取步数数据
-        daily_steps = parser.get_daily_step_count()
-        if not daily_steps.empty:
-            stats['steps'] = {
-                '总步数': daily_steps['步数'].sum(),
-                '平均每日步数': daily_steps['步数'].mean(),
-                '最高步数': daily_steps['步数'].max(),
-                '最低步数': daily_steps['步数'].min()
-            }
-        
-        # 获取睡眠数据
-        sleep_data = parser.get_sleep_duration_daily()
-        if not sleep_data.empty:
-            stats['sleep'] = {
-                '平均睡眠时长': sleep_data['睡眠时长(小时)'].mean(),
-                '最长睡眠时长': sleep_data['睡眠时长(小时)'].max(),
-                '最短睡眠时长': sleep_data['睡眠时长(小时)'].min()
-            }
-        
-        # 获取心电图数据
-        ecg_data = parser.get_ecg_data()
-        if not ecg_data.empty:
-            stats['ecg'] = {
-                'ECG记录数': len(ecg_data)
-            }
-        
-        # 清理解析器
-        parser.clean_up()
-        
         return render_template(
             'analysis.html', 
-            data_types=data_types,
-            stats=stats
+            data_types=summary.get('data_types', []),
+            stats=_summary_stats(summary)
         )
     
     except Exception as e:
@@ -100,6 +134,12 @@ def get_data(data_type):
             parser.clean_up()
             return jsonify({'error': f'没有{data_type}类型的数据'}), 404
         
+        # 可选只返回前limit条记录（如数据预览表格）
+        count = len(data)
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit >= 0:
+            data = data.head(limit)
+        
         # 将数据转换为JSON
         # 注意：需要处理日期时间格式
         data_json = json.loads(data.to_json(orient='records', date_format='iso'))
@@ -109,273 +149,766 @@ def get_data(data_type):
         
         return jsonify({
             'data': data_json,
-            'count': len(data_json)
+            'count': count
         })
     
     except Exception as e:
         return jsonify({'error': f'获取数据时出错: {str(e)}'}), 500
 
-@bp.route('/correlation', methods=('GET',))
-def correlation_analysis():
-    """执行相关性分析"""
+def _build_indicators(data_type, bucket, sma_windows, rsi_period, band_window, band_multiplier, atr_period):
+    """
+    按时间桶汇总指定类型的数据并计算技术指标
     
-    # 获取请求参数
-    type1 = request.args.get('type1')
-    type2 = request.args.get('type2')
+    累计型数据以每个桶的总和作为代表值；其他数据以桶内均值作为代表值，
+    桶内最高、最低值用于计算真实范围。
     
-    if not type1 or not type2:
-        return jsonify({'error': '必须指定两种数据类型进行相关性分析'}), 400
+    返回:
+        可JSON序列化的结果字典，没有数据时返回None
+    """
+    parser = initialize_parser()
+    if not parser:
+        return None
     
     try:
-        # 初始化解析器
-        parser = initialize_parser()
-        if not parser:
+        rollup = parser.get_rollup(data_type, bucket)
+    finally:
+        parser.clean_up()
+    
+    if rollup is None:
+        return None
+    
+    if is_cumulative_type(data_type):
+        close = rollup['sum']
+        high = low = None
+    else:
+        close, high, low = rollup['mean'], rollup['max'], rollup['min']
+    
+    indicators = compute_indicators(
+        close, high, low,
+        sma_windows=sma_windows,
+        rsi_period=rsi_period,
+        band_window=band_window,
+        band_multiplier=band_multiplier,
+        atr_period=atr_period
+    )
+    
+    def to_list(values):
+        return matrix_to_list([values])[0]
+    
+    return {
+        'type': data_type,
+        'bucket': bucket,
+        'dates': bucket_labels(rollup['key'], bucket).tolist(),
+        'value': to_list(close),
+        'count': rollup['count'].tolist(),
+        'sma': {str(window): to_list(line) for window, line in indicators['sma'].items()},
+        'bollinger': {
+            'window': band_window,
+            'multiplier': band_multiplier,
+            **{name: to_list(line) for name, line in indicators['bollinger'].items()}
+        },
+        'rsi': {'period': rsi_period, 'values': to_list(indicators['rsi'])},
+        'atr': {'period': atr_period, 'values': to_list(indicators['atr'])}
+    }
+
+@bp.route('/indicators/<data_type>', methods=('GET',))
+def get_indicators(data_type):
+    """获取指定类型按时间桶汇总的序列及其技术指标（SMA、RSI、布林带、ATR）"""
+    
+    bucket = request.args.get('bucket', 'day')
+    window_param = request.args.get('window', '7,14,30')
+    rsi_period = request.args.get('rsi_period', 14, type=int)
+    band_window = request.args.get('band_window', 20, type=int)
+    band_multiplier = request.args.get('band_multiplier', 2.0, type=float)
+    atr_period = request.args.get('atr_period', 14, type=int)
+    
+    if bucket not in GRANULARITIES:
+        return jsonify({'error': f'不支持的时间粒度: {bucket}'}), 400
+    
+    try:
+        sma_windows = tuple(sorted({int(w) for w in window_param.split(',') if w.strip()}))
+    except ValueError:
+        return jsonify({'error': 'window必须是逗号分隔的正整数'}), 400
+    
+    periods = sma_windows + (rsi_period or 0, band_window or 0, atr_period or 0)
+    if not sma_windows or min(periods) < 1 or band_multiplier is None:
+        return jsonify({'error': '窗口和周期必须是正整数'}), 400
+    
+    try:
+        version = get_dataset_version()
+        if version is None:
             return jsonify({'error': '没有可用的数据'}), 400
         
-        # 获取两种类型的数据
-        data1 = parser.get_data_by_type(type1)
-        data2 = parser.get_data_by_type(type2)
-        
-        # 如果任一类型没有数据，返回错误
-        if data1.empty or data2.empty:
-            parser.clean_up()
-            return jsonify({'error': '指定的数据类型之一没有数据'}), 404
+        params = {
+            'type': data_type,
+            'bucket': bucket,
+            'window': sma_windows,
+            'rsi_period': rsi_period,
+            'band_window': band_window,
+            'band_multiplier': band_multiplier,
+            'atr_period': atr_period
+        }
+        result = result_cache.get_or_compute(
+            version, 'indicators',
+            lambda: _build_indicators(data_type, bucket, sma_windows, rsi_period,
+                                      band_window, band_multiplier, atr_period),
+            params=params
+        )
         
-        # 为简化分析，我们按日期对数据进行分组并计算每日平均值
-        # 确保日期列存在
-        date_cols1 = [col for col in data1.columns if col.lower() in ['startdate', 'date', '日期', 'start']]
-        date_cols2 = [col for col in data2.columns if col.lower() in ['startdate', 'date', '日期', 'start']]
+        if result is None:
+            return jsonify({'error': f'没有{data_type}类型的数值数据'}), 404
         
-        if not date_cols1 or not date_cols2:
-            parser.clean_up()
-            return jsonify({'error': '数据缺少有效的日期列'}), 400
-            
-        # 提取日期列
-        date_col1 = date_cols1[0]
-        date_col2 = date_cols2[0]
+        return jsonify(result)
+    
+    except Exception as e:
+        print(f"计算技术指标时出错: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': f'计算技术指标时出错: {str(e)}'}), 500
+
+def _build_percentiles(data_type, percentiles, by, start_day, end_day):
+    """
+    合并分位数摘要，计算指定日期范围内的整体分位数以及按天或按一天中小时的分位数
+    
+    返回:
+        可JSON序列化的结果字典，没有数据时返回None
+    """
+    parser = initialize_parser()
+    if not parser:
+        return None
+    
+    try:
+        day_sketches = parser.get_quantile_sketches(data_type, 'day')
+        hour_sketches = parser.get_quantile_sketches(data_type, 'hour') if by == 'hour_of_day' else None
+    finally:
+        parser.clean_up()
+    
+    if day_sketches is None:
+        return None
+    
+    qs = [p / 100.0 for p in percentiles]
+    in_range = np.ones(day_sketches.keys.size, dtype=bool)
+    if start_day is not None:
+        in_range &= day_sketches.keys >= start_day
+    if end_day is not None:
+        in_range &= day_sketches.keys <= end_day
+    
+    overall, count = day_sketches.range_quantiles(qs, start_day, end_day)
+    result = {
+        'type': data_type,
+        'percentiles': percentiles,
+        'by': by,
+        'sketch_size': day_sketches.k,
+        'overall': {
+            'values': matrix_to_list([overall])[0],
+            'count': count,
+            'max_rank_error': day_sketches.rank_error_bound(in_range)
+        }
+    }
+    
+    if by == 'day':
+        keys, matrix = day_sketches.quantiles(qs)
+        counts = day_sketches.counts
+        result.update({
+            'groups': days_to_iso(keys[in_range]).tolist(),
+            'values': matrix_to_list(matrix[in_range]),
+            'counts': counts[in_range].tolist(),
+            'max_rank_error': rank_errors(counts[in_range], day_sketches.k).tolist()
+        })
+    elif by == 'hour_of_day':
+        days = hour_sketches.keys // 24
+        hour_range = np.ones(hour_sketches.keys.size, dtype=bool)
+        if start_day is not None:
+            hour_range &= days >= start_day
+        if end_day is not None:
+            hour_range &= days <= end_day
+        
+        # 范围外的小时归入组-1，最后丢弃
+        groups = np.where(hour_range, hour_sketches.keys % 24, -1)
+        hours, matrix, counts = hour_sketches.grouped_quantiles(groups, qs)
+        keep = hours >= 0
+        result.update({
+            'groups': hours[keep].tolist(),
+            'values': matrix_to_list(matrix[keep]),
+            'counts': counts[keep].tolist(),
+            'max_rank_error': np.bincount(
+                groups[hour_range], weights=rank_errors(hour_sketches.counts[hour_range], hour_sketches.k), minlength=24
+            )[hours[keep]].astype(int).tolist()
+        })
+    
+    return result
+
+@bp.route('/percentiles/<data_type>', methods=('GET',))
+def get_percentiles(data_type):
+    """获取指定类型的分位数（整体，以及按天或按一天中的小时），由每日/每小时分位数摘要合并得到"""
+    
+    q_param = request.args.get('q', '5,50,95')
+    by = request.args.get('by', 'day')
+    start = request.args.get('start')
+    end = request.args.get('end')
+    
+    if by not in ('day', 'hour_of_day', 'none'):
+        return jsonify({'error': f'不支持的分组方式: {by}'}), 400
+    
+    try:
+        percentiles = sorted({float(p) for p in q_param.split(',') if p.strip()})
+        start_day = date_to_day(start) if start else None
+        end_day = date_to_day(end) if end else None
+    except ValueError:
+        return jsonify({'error': '分位数或日期参数格式错误'}), 400
+    
+    if not percentiles or percentiles[0] < 0 or percentiles[-1] > 100:
+        return jsonify({'error': '分位数必须在0到100之间'}), 400
+    if is_cumulative_type(data_type):
+        return jsonify({'error': f'{data_type}是累计型数据，不支持样本分位数'}), 400
+    
+    try:
+        version = get_dataset_version()
+        if version is None:
+            return jsonify({'error': '没有可用的数据'}), 400
         
-        # 确保日期列是日期类型
-        data1[date_col1] = pd.to_datetime(data1[date_col1], errors='coerce')
-        data2[date_col2] = pd.to_datetime(data2[date_col2], errors='coerce')
+        result = result_cache.get_or_compute(
+            version, 'percentiles',
+            lambda: _build_percentiles(data_type, percentiles, by, start_day, end_day),
+            params={'type': data_type, 'q': tuple(percentiles), 'by': by, 'start': start_day, 'end': end_day}
+        )
         
-        # 提取日期部分
-        data1['date'] = data1[date_col1].dt.date
-        data2['date'] = data2[date_col2].dt.date
+        if result is None:
+            return jsonify({'error': f'没有{data_type}类型的数值数据'}), 404
         
-        # 提取值列
-        value_cols1 = [col for col in data1.columns if col.lower() in ['value', 'values', '值', '数值']]
-        value_cols2 = [col for col in data2.columns if col.lower() in ['value', 'values', '值', '数值']]
+        return jsonify(result)
+    
+    except Exception as e:
+        print(f"计算分位数时出错: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': f'计算分位数时出错: {str(e)}'}), 500
+
+def _load_anomalies(version):
+    """
+    读取持久化的异常检测结果，不存在时对所有类型批量检测并保存
+    
+    返回:
+        异常检测结果字典，没有数据时返回None
+    """
+    directory = get_artifact_dir()
+    stored = load_artifact(directory, 'anomalies', version)
+    if stored is not None:
+        return stored
+    
+    parser = initialize_parser()
+    if not parser:
+        return None
+    
+    try:
+        stored = {
+            'threshold': DEFAULT_THRESHOLD,
+            'params': DEFAULT_DETECTION_PARAMS,
+            'anomalies': detect_all_anomalies(parser)
+        }
+    finally:
+        parser.clean_up()
+    
+    save_artifact(directory, 'anomalies', version, stored)
+    return stored
+
+@bp.route('/anomalies', methods=('GET',))
+def get_anomalies():
+    """获取所有指标每日、每小时汇总序列上检测到的异常点（滚动中位数/MAD稳健z分数）"""
+    
+    data_type = request.args.get('type')
+    granularity = request.args.get('granularity')
+    min_score = request.args.get('min_score', 0.0, type=float)
+    
+    if granularity and granularity not in GRANULARITIES:
+        return jsonify({'error': f'不支持的时间粒度: {granularity}'}), 400
+    
+    try:
+        version = get_dataset_version()
+        if version is None:
+            return jsonify({'error': '没有可用的数据'}), 400
         
-        if not value_cols1 or not value_cols2:
-            parser.clean_up()
-            return jsonify({'error': '数据缺少有效的值列'}), 400
-            
-        # 提取值列
-        value_col1 = value_cols1[0]
-        value_col2 = value_cols2[0]
+        stored = result_cache.get_or_compute(version, 'anomalies', lambda: _load_anomalies(version))
+        if stored is None:
+            return jsonify({'error': '没有可用的数据'}), 400
         
-        # 确保value列是数值类型
-        data1[value_col1] = pd.to_numeric(data1[value_col1], errors='coerce')
-        data2[value_col2] = pd.to_numeric(data2[value_col2], errors='coerce')
+        # 按类型、粒度和分数筛选
+        anomalies = {}
+        for type_name, by_granularity in stored['anomalies'].items():
+            if data_type and type_name != data_type:
+                continue
+            for gran, points in by_granularity.items():
+                if granularity and gran != granularity:
+                    continue
+                selected = [point for point in points if abs(point['score']) >= min_score]
+                if selected:
+                    anomalies.setdefault(type_name, {})[gran] = selected
         
-        # 过滤掉NaN值
-        data1 = data1.dropna(subset=[value_col1, 'date'])
-        data2 = data2.dropna(subset=[value_col2, 'date'])
+        return jsonify({
+            'threshold': stored['threshold'],
+            'params': stored['params'],
+            'anomalies': anomalies,
+            'count': sum(len(points) for by_gran in anomalies.values() for points in by_gran.values())
+        })
+    
+    except Exception as e:
+        print(f"获取异常检测结果时出错: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': f'获取异常检测结果时出错: {str(e)}'}), 500
+
+def _build_correlation(type1, type2, granularity, agg1, agg2, bootstrap, n_boot, block_length, confidence,
+                       permutation, n_permutations):
+    """
+    按时间桶对齐两种类型的汇总序列并执行相关性分析
+    
+    返回:
+        (可JSON序列化的结果字典, HTTP状态码)，出错时结果字典只包含error
+    """
+    # 初始化解析器
+    parser = initialize_parser()
+    if not parser:
+        return {'error': '没有可用的数据'}, 400
+    
+    # 按时间桶汇总两种类型（汇总结果在解析器中按类型和粒度缓存）
+    try:
+        series1 = parser.get_rollup_series(type1, granularity, agg1)
+        series2 = parser.get_rollup_series(type2, granularity, agg2)
+    except ValueError as e:
+        parser.clean_up()
+        return {'error': str(e)}, 400
+    
+    # 如果任一类型没有数据，返回错误
+    if series1 is None or series2 is None:
+        parser.clean_up()
+        return {'error': '指定的数据类型之一没有数据'}, 404
+    
+    # 在已排序的整数桶键上做归并连接，只保留两种类型都有数据的桶
+    keys, index1, index2 = np.intersect1d(series1[0], series2[0], assume_unique=True, return_indices=True)
+    x = series1[1][index1]
+    y = series2[1][index2]
+    
+    # 过滤掉NaN和无限值
+    valid = np.isfinite(x) & np.isfinite(y)
+    keys, x, y = keys[valid], x[valid], y[valid]
+    
+    # 如果没有重叠的时间桶或数据过少，返回错误
+    if keys.size < 3:
+        parser.clean_up()
+        return {'error': '有效数据不足（少于3个点），无法进行相关性分析'}, 404
+    
+    merged_data = pd.DataFrame({'value_1': x, 'value_2': y})
+    
+    try:
+        # 计算皮尔逊相关系数
+        correlation = merged_data['value_1'].corr(merged_data['value_2'])
         
-        if data1.empty or data2.empty:
+        if pd.isna(correlation):
             parser.clean_up()
-            return jsonify({'error': '清洗后数据为空，无法进行分析'}), 404
+            return {'error': '无法计算相关系数（可能数据无变化或包含特殊值）'}, 400
         
-        # 计算每日平均值
-        daily_data1 = data1.groupby('date')[value_col1].mean().reset_index()
-        daily_data2 = data2.groupby('date')[value_col2].mean().reset_index()
+        # 计算斯皮尔曼相关系数（非参数）
+        spearman_corr = merged_data['value_1'].corr(merged_data['value_2'], method='spearman')
         
-        # 合并两个数据集
-        merged_data = pd.merge(daily_data1, daily_data2, on='date', suffixes=('_1', '_2'))
+        # 计算协方差
+        covariance = merged_data['value_1'].cov(merged_data['value_2'])
         
-        # 再次确保数据有效
-        merged_data = merged_data.dropna()
-        
-        # 如果没有重叠的日期或数据过少，返回错误
-        if merged_data.empty or len(merged_data) < 3:
-            parser.clean_up()
-            return jsonify({'error': '有效数据不足（少于3个点），无法进行相关性分析'}), 404
+        # 线性回归拟合
+        from scipy import stats
+        slope, intercept, r_value, p_value, std_err = stats.linregress(
+            merged_data['value_1'], 
+            merged_data['value_2']
+        )
         
-        try:
-            # 检查数据是否包含无限值
-            merged_data = merged_data.replace([np.inf, -np.inf], np.nan).dropna()
+        # 检验正态性
+        normal_test1 = None
+        normal_test2 = None
+        normal_test_pvalue1 = None
+        normal_test_pvalue2 = None
+        
+        if len(merged_data) >= 8:  # 最小样本量要求
+            try:
+                # shapiro-wilk 正态检验
+                normal_test1, normal_test_pvalue1 = stats.shapiro(merged_data['value_1'])
+                normal_test2, normal_test_pvalue2 = stats.shapiro(merged_data['value_2'])
+            except:
+                pass  # 如果正态检验失败，保持为None
+        
+        # 准备散点图数据（按列输出：时间桶键一次向量化转换为ISO字符串，数值直接转换为列表）
+        scatter_data = {
+            'date': bucket_labels(keys, granularity).tolist(),
+            'value_1': x.tolist(),
+            'value_2': y.tolist()
+        }
+        
+        # 生成相关系数分析提示
+        corr_interpretation = ""
+        if abs(correlation) < 0.1:
+            corr_interpretation = "两个变量基本无相关性"
+        elif abs(correlation) < 0.3:
+            corr_interpretation = "两个变量呈弱相关性"
+        elif abs(correlation) < 0.5:
+            corr_interpretation = "两个变量呈中度相关性"
+        elif abs(correlation) < 0.7:
+            corr_interpretation = "两个变量呈强相关性"
+        else:
+            corr_interpretation = "两个变量呈极强相关性"
             
-            if merged_data.empty or len(merged_data) < 3:
-                parser.clean_up()
-                return jsonify({'error': '清洗无限值后数据不足，无法进行分析'}), 404
-            
-            # 计算皮尔逊相关系数
-            correlation = merged_data[f'{value_col1}_1'].corr(merged_data[f'{value_col2}_2'])
-            
-            if pd.isna(correlation):
-                parser.clean_up()
-                return jsonify({'error': '无法计算相关系数（可能数据无变化或包含特殊值）'}), 400
-            
-            # 计算斯皮尔曼相关系数（非参数）
-            spearman_corr = merged_data[f'{value_col1}_1'].corr(merged_data[f'{value_col2}_2'], method='spearman')
-            
-            # 计算协方差
-            covariance = merged_data[f'{value_col1}_1'].cov(merged_data[f'{value_col2}_2'])
-            
-            # 线性回归拟合
-            from scipy import stats
-            slope, intercept, r_value, p_value, std_err = stats.linregress(
-                merged_data[f'{value_col1}_1'], 
-                merged_data[f'{value_col2}_2']
-            )
-            
-            # 检验正态性
-            normal_test1 = None
-            normal_test2 = None
-            normal_test_pvalue1 = None
-            normal_test_pvalue2 = None
-            
-            if len(merged_data) >= 8:  # 最小样本量要求
-                try:
-                    # shapiro-wilk 正态检验
-                    normal_test1, normal_test_pvalue1 = stats.shapiro(merged_data[f'{value_col1}_1'])
-                    normal_test2, normal_test_pvalue2 = stats.shapiro(merged_data[f'{value_col2}_2'])
-                except:
-                    pass  # 如果正态检验失败，保持为None
-            
-            # 准备散点图数据
-            scatter_data = []
-            for _, row in merged_data.iterrows():
-                scatter_data.append({
-                    'date': row['date'].strftime('%Y-%m-%d'),
-                    'value_1': float(row[f'{value_col1}_1']),
-                    'value_2': float(row[f'{value_col2}_2'])
-                })
-            
-            # 生成相关系数分析提示
-            corr_interpretation = ""
-            if abs(correlation) < 0.1:
-                corr_interpretation = "两个变量基本无相关性"
-            elif abs(correlation) < 0.3:
-                corr_interpretation = "两个变量呈弱相关性"
-            elif abs(correlation) < 0.5:
-                corr_interpretation = "两个变量呈中度相关性"
-            elif abs(correlation) < 0.7:
-                corr_interpretation = "两个变量呈强相关性"
-            else:
-                corr_interpretation = "两个变量呈极强相关性"
-                
+        if correlation > 0:
+            corr_interpretation += "（正相关）"
+        else:
+            corr_interpretation += "（负相关）"
+        
+        # 计算R方（决定系数）
+        r_squared = r_value ** 2
+        
+        # 生成更详细的线性回归解释
+        linear_interpretation = ""
+        if p_value < 0.05:
+            linear_interpretation = f"这是一个统计学上显著的关系，有 {round(r_squared * 100, 2)}% 的 {type2} 变化可以通过 {type1} 解释。"
             if correlation > 0:
-                corr_interpretation += "（正相关）"
-            else:
-                corr_interpretation += "（负相关）"
-            
-            # 计算R方（决定系数）
-            r_squared = r_value ** 2
-            
-            # 生成更详细的线性回归解释
-            linear_interpretation = ""
-            if p_value < 0.05:
-                linear_interpretation = f"这是一个统计学上显著的关系，有 {round(r_squared * 100, 2)}% 的 {type2} 变化可以通过 {type1} 解释。"
-                if correlation > 0:
-                    linear_interpretation += f" 每增加一个单位的 {type1}，{type2} 平均增加 {round(float(slope), 4)} 个单位。"
-                else:
-                    linear_interpretation += f" 每增加一个单位的 {type1}，{type2} 平均减少 {abs(round(float(slope), 4))} 个单位。"
+                linear_interpretation += f" 每增加一个单位的 {type1}，{type2} 平均增加 {round(float(slope), 4)} 个单位。"
             else:
-                linear_interpretation = f"这种关系在统计学上不显著，无法确定 {type1} 对 {type2} 有预测作用。"
-            
-            # 添加健康相关解释
-            health_interpretation = ""
-            if type1 == "HKQuantityTypeIdentifierStepCount" and type2 == "HKQuantityTypeIdentifierHeartRate":
-                if correlation > 0.3:
-                    health_interpretation = "步数与心率的正相关表明身体活动量增加导致心率上升，这是正常的生理反应。"
-                elif correlation < -0.3:
-                    health_interpretation = "步数与心率的负相关可能表明心肺适应能力较好，或数据存在时间不匹配问题。"
-            elif (type1 == "HKQuantityTypeIdentifierStepCount" and type2 == "HKQuantityTypeIdentifierRestingHeartRate") or \
-                 (type2 == "HKQuantityTypeIdentifierStepCount" and type1 == "HKQuantityTypeIdentifierRestingHeartRate"):
-                if correlation < -0.3:
-                    health_interpretation = "步数增加与静息心率下降的负相关关系表明规律运动可能改善了心血管健康，这是一个积极信号。"
-            elif (type1 == "HKQuantityTypeIdentifierSleepAnalysis" and type2 == "HKQuantityTypeIdentifierStepCount") or \
-                 (type2 == "HKQuantityTypeIdentifierSleepAnalysis" and type1 == "HKQuantityTypeIdentifierStepCount"):
-                if correlation > 0.3:
-                    health_interpretation = "睡眠时长与步数的正相关表明充足的睡眠可能有助于提高日间活动水平。"
-            
-            # 根据数据分布提供方法建议
-            method_suggestion = ""
-            if (normal_test_pvalue1 is not None and normal_test_pvalue1 <= 0.05) or \
-               (normal_test_pvalue2 is not None and normal_test_pvalue2 <= 0.05):
-                method_suggestion = "由于至少一个变量不符合正态分布，斯皮尔曼相关系数(值为" + str(round(float(spearman_corr), 4)) + ")可能比皮尔逊相关系数更适合描述这种关系。"
-            
-            # 生成完整分析结果
-            analysis_result = {
-                'correlation': round(float(correlation), 4),
-                'spearman_correlation': round(float(spearman_corr), 4) if not pd.isna(spearman_corr) else None,
-                'covariance': round(float(covariance), 4) if not pd.isna(covariance) else None,
-                'linear_regression': {
-                    'slope': round(float(slope), 4) if not pd.isna(slope) else None,
-                    'intercept': round(float(intercept), 4) if not pd.isna(intercept) else None,
-                    'r_value': round(float(r_value), 4) if not pd.isna(r_value) else None,
-                    'p_value': round(float(p_value), 4) if not pd.isna(p_value) else None,
-                    'std_err': round(float(std_err), 4) if not pd.isna(std_err) else None,
-                    'r_squared': round(float(r_squared), 4) if not pd.isna(r_value) else None
-                },
-                'normality_test': {
-                    'variable1': {
-                        'statistic': round(float(normal_test1), 4) if normal_test1 is not None else None,
-                        'p_value': round(float(normal_test_pvalue1), 4) if normal_test_pvalue1 is not None else None,
-                        'is_normal': bool(normal_test_pvalue1 > 0.05) if normal_test_pvalue1 is not None else None
-                    },
-                    'variable2': {
-                        'statistic': round(float(normal_test2), 4) if normal_test2 is not None else None,
-                        'p_value': round(float(normal_test_pvalue2), 4) if normal_test_pvalue2 is not None else None,
-                        'is_normal': bool(normal_test_pvalue2 > 0.05) if normal_test_pvalue2 is not None else None
-                    }
-                },
-                'type1': type1,
-                'type2': type2,
-                'data': scatter_data,
-                'count': int(len(scatter_data)),
-                'summary': f"相关系数为 {round(float(correlation), 4)}，{corr_interpretation}。值域为 -1~1，越接近 ±1 说明关系越强，接近 0 表示关系弱或无关。" + 
-                           (f" {health_interpretation}" if health_interpretation else "") + 
-                           (f" {method_suggestion}" if method_suggestion else ""),
-                'linear_summary': f"线性关系：y = {round(float(slope), 4)}x + {round(float(intercept), 4)}，p值 = {round(float(p_value), 4)}" + 
-                                 (f"，具有统计学显著性。{linear_interpretation}" if bool(p_value < 0.05) else f"，不具有统计学显著性。{linear_interpretation}")
-            }
-            
-            # 添加基本描述统计结果
-            analysis_result['descriptive_stats'] = {
+                linear_interpretation += f" 每增加一个单位的 {type1}，{type2} 平均减少 {abs(round(float(slope), 4))} 个单位。"
+        else:
+            linear_interpretation = f"这种关系在统计学上不显著，无法确定 {type1} 对 {type2} 有预测作用。"
+        
+        # 添加健康相关解释
+        health_interpretation = ""
+        if type1 == "HKQuantityTypeIdentifierStepCount" and type2 == "HKQuantityTypeIdentifierHeartRate":
+            if correlation > 0.3:
+                health_interpretation = "步数与心率的正相关表明身体活动量增加导致心率上升，这是正常的生理反应。"
+            elif correlation < -0.3:
+                health_interpretation = "步数与心率的负相关可能表明心肺适应能力较好，或数据存在时间不匹配问题。"
+        elif (type1 == "HKQuantityTypeIdentifierStepCount" and type2 == "HKQuantityTypeIdentifierRestingHeartRate") or \
+             (type2 == "HKQuantityTypeIdentifierStepCount" and type1 == "HKQuantityTypeIdentifierRestingHeartRate"):
+            if correlation < -0.3:
+                health_interpretation = "步数增加与静息心率下降的负相关关系表明规律运动可能改善了心血管健康，这是一个积极信号。"
+        elif (type1 == "HKQuantityTypeIdentifierSleepAnalysis" and type2 == "HKQuantityTypeIdentifierStepCount") or \
+             (type2 == "HKQuantityTypeIdentifierSleepAnalysis" and type1 == "HKQuantityTypeIdentifierStepCount"):
+            if correlation > 0.3:
+                health_interpretation = "睡眠时长与步数的正相关表明充足的睡眠可能有助于提高日间活动水平。"
+        
+        # 根据数据分布提供方法建议
+        method_suggestion = ""
+        if (normal_test_pvalue1 is not None and normal_test_pvalue1 <= 0.05) or \
+           (normal_test_pvalue2 is not None and normal_test_pvalue2 <= 0.05):
+            method_suggestion = "由于至少一个变量不符合正态分布，斯皮尔曼相关系数(值为" + str(round(float(spearman_corr), 4)) + ")可能比皮尔逊相关系数更适合描述这种关系。"
+        
+        # 生成完整分析结果
+        analysis_result = {
+            'correlation': round(float(correlation), 4),
+            'spearman_correlation': round(float(spearman_corr), 4) if not pd.isna(spearman_corr) else None,
+            'covariance': round(float(covariance), 4) if not pd.isna(covariance) else None,
+            'linear_regression': {
+                'slope': round(float(slope), 4) if not pd.isna(slope) else None,
+                'intercept': round(float(intercept), 4) if not pd.isna(intercept) else None,
+                'r_value': round(float(r_value), 4) if not pd.isna(r_value) else None,
+                'p_value': round(float(p_value), 4) if not pd.isna(p_value) else None,
+                'std_err': round(float(std_err), 4) if not pd.isna(std_err) else None,
+                'r_squared': round(float(r_squared), 4) if not pd.isna(r_value) else None
+            },
+            'normality_test': {
                 'variable1': {
-                    'mean': round(float(merged_data[f'{value_col1}_1'].mean()), 4),
-                    'median': round(float(merged_data[f'{value_col1}_1'].median()), 4),
-                    'std': round(float(merged_data[f'{value_col1}_1'].std()), 4),
-                    'min': round(float(merged_data[f'{value_col1}_1'].min()), 4),
-                    'max': round(float(merged_data[f'{value_col1}_1'].max()), 4),
+                    'statistic': round(float(normal_test1), 4) if normal_test1 is not None else None,
+                    'p_value': round(float(normal_test_pvalue1), 4) if normal_test_pvalue1 is not None else None,
+                    'is_normal': bool(normal_test_pvalue1 > 0.05) if normal_test_pvalue1 is not None else None
                 },
                 'variable2': {
-                    'mean': round(float(merged_data[f'{value_col2}_2'].mean()), 4),
-                    'median': round(float(merged_data[f'{value_col2}_2'].median()), 4),
-                    'std': round(float(merged_data[f'{value_col2}_2'].std()), 4),
-                    'min': round(float(merged_data[f'{value_col2}_2'].min()), 4),
-                    'max': round(float(merged_data[f'{value_col2}_2'].max()), 4),
+                    'statistic': round(float(normal_test2), 4) if normal_test2 is not None else None,
+                    'p_value': round(float(normal_test_pvalue2), 4) if normal_test_pvalue2 is not None else None,
+                    'is_normal': bool(normal_test_pvalue2 > 0.05) if normal_test_pvalue2 is not None else None
                 }
+            },
+            'type1': type1,
+            'type2': type2,
+            'granularity': granularity,
+            'aggregation': {'type1': agg1, 'type2': agg2},
+            'data': scatter_data,
+            'count': int(x.size),
+            'summary': f"相关系数为 {round(float(correlation), 4)}，{corr_interpretation}。值域为 -1~1，越接近 ±1 说明关系越强，接近 0 表示关系弱或无关。" + 
+                       (f" {health_interpretation}" if health_interpretation else "") + 
+                       (f" {method_suggestion}" if method_suggestion else ""),
+            'linear_summary': f"线性关系：y = {round(float(slope), 4)}x + {round(float(intercept), 4)}，p值 = {round(float(p_value), 4)}" + 
+                             (f"，具有统计学显著性。{linear_interpretation}" if bool(p_value < 0.05) else f"，不具有统计学显著性。{linear_interpretation}")
+        }
+        
+        # 块自助法置信区间（按日期顺序重采样，保留序列自相关）
+        if bootstrap:
+            analysis_result['bootstrap'] = bootstrap_correlation_ci(x, y, n_boot, confidence, block_length)
+        
+        # 置换检验（固定随机种子，结果可复现）
+        if permutation:
+            analysis_result['permutation_test'] = {
+                'pearson': permutation_test(x, y, n_permutations, method='pearson'),
+                'spearman': permutation_test(x, y, n_permutations, method='spearman')
             }
-            
-            # 清理解析器
-            parser.clean_up()
-            
-            return jsonify(analysis_result)
-            
-        except Exception as analysis_error:
-            parser.clean_up()
-            print(f"相关性分析计算出错: {str(analysis_error)}")
-            traceback.print_exc()
-            return jsonify({'error': f'相关性分析计算出错: {str(analysis_error)}'}), 500
+        
+        # 添加基本描述统计结果（两列一次归约）
+        described = merged_data.agg(['mean', 'median', 'std', 'min', 'max'])
+        analysis_result['descriptive_stats'] = {
+            name: {stat: round(float(value), 4) for stat, value in described[column].items()}
+            for name, column in zip(('variable1', 'variable2'), described.columns)
+        }
+        
+        # 清理解析器
+        parser.clean_up()
+        
+        return analysis_result, 200
+        
+    except Exception as analysis_error:
+        parser.clean_up()
+        print(f"相关性分析计算出错: {str(analysis_error)}")
+        traceback.print_exc()
+        return {'error': f'相关性分析计算出错: {str(analysis_error)}'}, 500
+
+@bp.route('/correlation', methods=('GET',))
+def correlation_analysis():
+    """执行相关性分析"""
+    
+    # 获取请求参数
+    type1 = request.args.get('type1')
+    type2 = request.args.get('type2')
+    
+    # 时间粒度及每种类型在桶内的聚合方式（默认累计型求和、其余求平均）
+    granularity = request.args.get('granularity', 'day')
+    agg1 = request.args.get('agg1') or ('sum' if is_cumulative_type(type1 or '') else 'mean')
+    agg2 = request.args.get('agg2') or ('sum' if is_cumulative_type(type2 or '') else 'mean')
+    
+    # 可选的块自助法置信区间
+    bootstrap = request.args.get('bootstrap', 'false').lower() in ('1', 'true', 'yes')
+    n_boot = request.args.get('n_boot', 2000, type=int)
+    block_length = request.args.get('block_length', type=int)
+    confidence = request.args.get('confidence', 0.95, type=float)
+    
+    # 可选的置换检验（不依赖正态和独立同分布假设的经验p值）
+    permutation = request.args.get('permutation', 'false').lower() in ('1', 'true', 'yes')
+    n_permutations = request.args.get('n_permutations', 10000, type=int)
+    
+    if not type1 or not type2:
+        return jsonify({'error': '必须指定两种数据类型进行相关性分析'}), 400
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f'不支持的时间粒度: {granularity}'}), 400
+    if bootstrap and (n_boot is None or not 100 <= n_boot <= 50000):
+        return jsonify({'error': 'n_boot必须在100到50000之间'}), 400
+    if bootstrap and (confidence is None or not 0 < confidence < 1):
+        return jsonify({'error': 'confidence必须在0到1之间'}), 400
+    if permutation and (n_permutations is None or not 100 <= n_permutations <= 100000):
+        return jsonify({'error': 'n_permutations必须在100到100000之间'}), 400
+    
+    # 影响结果的全部参数（不需要的可选参数不计入，避免产生等价的重复缓存）
+    params = {
+        'type1': type1, 'type2': type2, 'granularity': granularity, 'agg1': agg1, 'agg2': agg2,
+        'bootstrap': (n_boot, block_length, confidence) if bootstrap else None,
+        'permutation': n_permutations if permutation else None
+    }
+    status = []
+    
+    def compute():
+        result, code = _build_correlation(
+            type1, type2, granularity, agg1, agg2, bootstrap, n_boot, block_length, confidence,
+            permutation, n_permutations
+        )
+        status.append(code)
+        return current_app.json.dumps(result)
+    
+    try:
+        # 整个响应按(数据集版本, 参数)缓存，命中时不解析数据；出错的结果不缓存
+        payload, etag = cached_payload(
+            get_dataset_version(), get_artifact_dir(), 'correlation', compute, params,
+            cache_if=lambda: status[0] == 200
+        )
+        response = json_response(payload, etag)
+        if status and status[0] != 200:
+            response.status_code = status[0]
+        return response
     
     except Exception as e:
         print(f"执行相关性分析时出错: {str(e)}")
         traceback.print_exc()
         return jsonify({'error': f'执行相关性分析时出错: {str(e)}'}), 500
 
+def _build_correlation_matrix(types, min_periods):
+    """
+    基于每日汇总构建 日期×指标 矩阵，并一次性计算全部指标两两之间的相关系数
+    
+    参数:
+        types: 参与分析的数据类型列表，为空时使用全部可用的数值类型
+        min_periods: 每对指标所需的最少共同天数
+        
+    返回:
+        相关矩阵结果字典，没有可用数据时返回None
+    """
+    parser = initialize_parser()
+    if not parser:
+        return None
+    
+    try:
+        if not types:
+            types = sorted(parser.get_all_data_types())
+        
+        # 收集每种类型的每日序列
+        series = {}
+        for data_type in types:
+            daily = parser.get_rollup_series(data_type, 'day')
+            if daily is not None:
+                series[data_type] = daily
+    finally:
+        parser.clean_up()
+    
+    if len(series) < 2:
+        return None
+    
+    # 按全部日期的并集对齐为矩阵
+    names = list(series.keys())
+    all_days = np.unique(np.concatenate([series[name][0] for name in names]))
+    matrix = np.full((all_days.size, len(names)), np.nan)
+    for j, name in enumerate(names):
+        keys, values = series[name]
+        matrix[np.searchsorted(all_days, keys), j] = values
+    
+    pearson_r, counts = pearson_matrix(matrix, min_periods=min_periods)
+    spearman_r, _ = spearman_matrix(matrix, min_periods=min_periods)
+    
+    return {
+        'types': names,
+        'aggregation': {name: ('sum' if is_cumulative_type(name) else 'mean') for name in names},
+        'days': int(all_days.size),
+        'start_date': str(days_to_iso(all_days[:1])[0]),
+        'end_date': str(days_to_iso(all_days[-1:])[0]),
+        'n': counts.tolist(),
+        'pearson': {
+            'r': matrix_to_list(pearson_r),
+            'p_value': matrix_to_list(correlation_pvalues(pearson_r, counts))
+        },
+        'spearman': {
+            'r': matrix_to_list(spearman_r),
+            'p_value': matrix_to_list(correlation_pvalues(spearman_r, counts))
+        }
+    }
+
+@bp.route('/correlation/matrix', methods=('GET',))
+def correlation_matrix():
+    """一次性计算多个指标两两之间的相关矩阵（皮尔逊、斯皮尔曼、样本数和p值）"""
+    
+    # 获取请求参数
+    types = [t for t in request.args.get('types', '').split(',') if t]
+    # 每对指标至少需要3个共同点；在这里统一限制，计算和缓存键使用同一个值
+    min_periods = max(request.args.get('min_periods', 3, type=int) or 3, 3)
+    
+    if len(types) == 1:
+        return jsonify({'error': '至少需要两种数据类型进行相关性分析'}), 400
+    
+    try:
+        version = get_dataset_version()
+        if version is None:
+            return jsonify({'error': '没有可用的数据'}), 400
+        
+        # 结果按数据集版本缓存，命中时无需重新解析数据
+        result = result_cache.get_or_compute(
+            version, 'correlation_matrix',
+            lambda: _build_correlation_matrix(types, min_periods),
+            params={'types': ','.join(types), 'min_periods': min_periods}
+        )
+        
+        if result is None:
+            return jsonify({'error': '可用于相关性分析的数值类型不足两种'}), 404
+        
+        return jsonify(result)
+    
+    except Exception as e:
+        print(f"计算相关矩阵时出错: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': f'计算相关矩阵时出错: {str(e)}'}), 500
+
+def _build_lagged_correlation(type1, type2, granularity, max_lag):
+    """
+    将两种类型的汇总序列对齐到同一规则时间网格，计算 -max_lag..max_lag 各滞后的相关系数
+    
+    返回:
+        滞后相关结果字典，任一类型没有数据时返回None
+    """
+    parser = initialize_parser()
+    if not parser:
+        return None
+    
+    try:
+        series1 = parser.get_rollup_series(type1, granularity)
+        series2 = parser.get_rollup_series(type2, granularity)
+    finally:
+        parser.clean_up()
+    
+    if series1 is None or series2 is None:
+        return None
+    
+    # 对齐到连续的整数桶网格，缺失的桶为NaN
+    keys1, values1 = series1
+    keys2, values2 = series2
+    first = min(keys1[0], keys2[0])
+    last = max(keys1[-1], keys2[-1])
+    x = np.full(last - first + 1, np.nan)
+    y = np.full(last - first + 1, np.nan)
+    x[keys1 - first] = values1
+    y[keys2 - first] = values2
+    
+    result = lagged_cross_correlation(x, y, max_lag)
+    peak = peak_lag(result)
+    
+    return {
+        'type1': type1,
+        'type2': type2,
+        'granularity': granularity,
+        'lag_unit': granularity,
+        'lags': result['lags'].tolist(),
+        'correlation': matrix_to_list([result['r']])[0],
+        'p_value': matrix_to_list([result['p_value']])[0],
+        'n': result['n'].tolist(),
+        'peak': {k: (round(v, 6) if isinstance(v, float) else v) for k, v in peak.items()} if peak else None,
+        'summary': (
+            f"{type1} 与 {type2} 在滞后 {peak['lag']} 个{GRANULARITY_UNITS[granularity]}时相关性最强"
+            f"（r = {round(peak['r'], 4)}，校正后p值 = {round(peak['p_value_adjusted'], 4)}）。"
+            f"滞后为正表示 {type1} 的变化领先于 {type2}。"
+        ) if peak else '有效数据不足，无法计算滞后相关'
+    }
+
+@bp.route('/correlation/lagged', methods=('GET',))
+def lagged_correlation():
+    """计算两种指标在一系列时间滞后上的互相关，找出最强关联所在的滞后"""
+    
+    # 获取请求参数
+    type1 = request.args.get('type1')
+    type2 = request.args.get('type2')
+    granularity = request.args.get('granularity', 'day')
+    
+    if not type1 or not type2:
+        return jsonify({'error': '必须指定两种数据类型进行相关性分析'}), 400
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f'不支持的时间粒度: {granularity}'}), 400
+    
+    # 给出但不是整数的max_lag按无效参数处理，不回退到默认值
+    max_lag = request.args.get('max_lag', type=int) if 'max_lag' in request.args else DEFAULT_MAX_LAGS[granularity]
+    limit = MAX_LAG_LIMITS[granularity]
+    if max_lag is None or not 0 <= max_lag <= limit:
+        return jsonify({'error': f'max_lag必须是0到{limit}之间的整数'}), 400
+    
+    try:
+        version = get_dataset_version()
+        if version is None:
+            return jsonify({'error': '没有可用的数据'}), 400
+        
+        result = result_cache.get_or_compute(
+            version, 'lagged_correlation',
+            lambda: _build_lagged_correlation(type1, type2, granularity, max_lag),
+            params={'type1': type1, 'type2': type2, 'granularity': granularity, 'max_lag': max_lag}
+        )
+        
+        if result is None:
+            return jsonify({'error': '指定的数据类型之一没有数据'}), 404
+        
+        return jsonify(result)
+    
+    except Exception as e:
+        print(f"计算滞后相关时出错: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': f'计算滞后相关时出错: {str(e)}'}), 500
+
 @bp.route('/summary', methods=('GET',))
 def health_summary():
     """显示用户健康数据摘要"""
@@ -388,121 +921,12 @@ def health_summary():
             flash('没有可用的健康数据，请先上传健康数据')
             return redirect(url_for('upload.upload_file'))
         
-        # 初始化解析器并加载数据
-        parser = initialize_parser()
-        if not parser:
+        # 读取与数据集一起持久化的摘要（上传时已计算），旧数据没有时计算一次并保存
+        summary = get_health_summary()
+        if summary is None:
             flash('加载数据文件时出错')
             return redirect(url_for('upload.upload_file'))
         
-        # 收集各类健康数据
-        summary = {}
-        
-        # 心率数据
-        heart_rate_data = parser.get_heart_rate_data()
-        if not heart_rate_data.empty:
-            # 确保数值列是数值类型
-            heart_rate_data['value'] = pd.to_numeric(heart_rate_data['value'], errors='coerce')
-            # 过滤掉NaN值
-            heart_rate_data = heart_rate_data.dropna(subset=['value'])
-            
-            if not heart_rate_data.empty:
-                mean_hr = float(heart_rate_data['value'].mean())
-                max_hr = float(heart_rate_data['value'].max())
-                min_hr = float(heart_rate_data['value'].min())
-                
-                hr_status = "正常"
-                if mean_hr > 100:
-                    hr_status = "偏高"
-                elif mean_hr < 60:
-                    hr_status = "偏低"
-                
-                summary['heart_rate'] = {
-                    'average': mean_hr,
-                    'max': max_hr,
-                    'min': min_hr,
-                    'status': hr_status
-                }
-        
-        # 步数数据
-        steps_data = parser.get_daily_step_count()
-        if not steps_data.empty:
-            # 确保数值列是数值类型
-            steps_data['步数'] = pd.to_numeric(steps_data['步数'], errors='coerce')
-            # 过滤掉NaN值
-            steps_data = steps_data.dropna(subset=['步数'])
-            
-            if not steps_data.empty:
-                avg_steps = float(steps_data['步数'].mean())
-                
-                activity_level = "低活动量"
-                if avg_steps >= 10000:
-                    activity_level = "高活动量"
-                elif avg_steps >= 7500:
-                    activity_level = "中高活动量"
-                elif avg_steps >= 5000:
-                    activity_level = "中等活动量"
-                
-                summary['steps'] = {
-                    'average': avg_steps,
-                    'activity_level': activity_level
-                }
-        
-        # 睡眠数据
-        sleep_data = parser.get_sleep_duration_daily()
-        if not sleep_data.empty:
-            # 确保数值列是数值类型
-            sleep_data['睡眠时长(小时)'] = pd.to_numeric(sleep_data['睡眠时长(小时)'], errors='coerce')
-            # 过滤掉NaN值
-            sleep_data = sleep_data.dropna(subset=['睡眠时长(小时)'])
-            
-            if not sleep_data.empty:
-                avg_sleep = float(sleep_data['睡眠时长(小时)'].mean())
-                
-                sleep_status = "正常"
-                if avg_sleep < 6:
-                    sleep_status = "睡眠不足"
-                elif avg_sleep > 9:
-                    sleep_status = "睡眠过多"
-                
-                summary['sleep'] = {
-                    'average': avg_sleep,
-                    'status': sleep_status
-                }
-        
-        # 压力指标
-        stress_data = parser.get_stress_indicators()
-        if not stress_data.empty:
-            # 确保压力指数列是数值类型
-            if '压力指数' in stress_data.columns:
-                stress_data['压力指数'] = pd.to_numeric(stress_data['压力指数'], errors='coerce')
-                # 过滤掉NaN值
-                stress_data = stress_data.dropna(subset=['压力指数'])
-                
-                if not stress_data.empty:
-                    avg_stress = float(stress_data['压力指数'].mean())
-                    
-                    stress_level = "中等压力"
-                    if avg_stress > 10:
-                        stress_level = "高压力"
-                    elif avg_stress < 5:
-                        stress_level = "低压力"
-                    
-                    summary['stress'] = {
-                        'average': avg_stress,
-                        'level': stress_level
-                    }
-        
-        # 心电图数据
-        ecg_data = parser.get_ecg_data()
-        if not ecg_data.empty:
-            summary['ecg'] = {
-                'count': int(len(ecg_data)),
-                'status': '已记录'
-            }
-        
-        # 清理解析器
-        parser.clean_up()
-        
         return render_template('summary.html', summary=summary)
     
     except Exception as e:
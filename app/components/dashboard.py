@@ -1,17 +1,98 @@
 from flask import (
     Blueprint, flash, g, redirect, render_template, request, 
-    session, url_for, jsonify
+    session, url_for, jsonify, current_app
 )
 import os
+import numpy as np
 from app.utils.health_parser import HealthDataParser
-from app.utils.visualization import HealthDataVisualizer
-import pandas as pd
+from app.utils.cache import (
+    dataset_version, artifact_dir, cached_payload, peek_payload, store_payload, payload_etag, result_cache
+)
+from app.utils.summary import load_health_summary, persist_health_summary
+from app.utils.downsampling import DEFAULT_MAX_POINTS, DOWNSAMPLING_METHODS
+from app.utils.timekeys import window_start_day
+from app.utils.figures import encode_figure
+from app.utils.viewport import (
+    VIEWPORT_METRICS, build_viewport_store, save_viewport_store, load_viewport_store, viewport_series
+)
+from app.utils.lazy import lazy_module
+
+# 可视化模块（及其依赖的pandas和plotly）在第一次生成图表时才导入，上传页和应用启动不需要它们
+visualization = lazy_module('app.utils.visualization')
 
 bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
 
+# 可获取的图表类型
+CHART_TYPES = ('heart_rate', 'steps', 'sleep', 'stress', 'ecg', 'heatmap', 'dashboard')
+
+# 作息热力图支持的时段长度（分钟）：60为7×24网格，15为7×96网格
+HEATMAP_SLOTS = (60, 15)
+# 常用类型的热力图标题
+HEATMAP_TITLES = {
+    'HKQuantityTypeIdentifierHeartRate': '心率作息分布（星期×时段平均心率）',
+    'HKQuantityTypeIdentifierStepCount': '步数作息分布（星期×时段平均每天步数）'
+}
+
+# 仪表板默认显示的天数，以及days参数的上限
+DEFAULT_DASHBOARD_DAYS = 30
+MAX_DAYS = 3650
+
+# 流式仪表板响应的类型（每行一个JSON）
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# 视口序列接口的图表像素宽度（默认值和允许范围）
+DEFAULT_VIEWPORT_WIDTH = 1000
+MIN_VIEWPORT_WIDTH = 50
+MAX_VIEWPORT_WIDTH = 5000
+
+def _days_param(default=None):
+    """
+    读取days查询参数（只显示最近多少天的数据）
+    
+    返回:
+        (天数, 错误信息)；未给出时为default，不是1到MAX_DAYS之间的整数时返回错误信息
+    """
+    if 'days' not in request.args:
+        return default, None
+    days = request.args.get('days', type=int)
+    if days is None or not 1 <= days <= MAX_DAYS:
+        return None, f"days必须是1到{MAX_DAYS}之间的整数"
+    return days, None
+
+def _chart_params(chart_type, days):
+    """
+    规范化图表请求参数，用作缓存键和ETag（只包含影响结果的参数，无关的查询参数不产生新的缓存项）
+    
+    days不为None时加入窗口起始日since_day：“最近days天”的内容随日期变化，跨天后缓存键和ETag随之改变。
+    
+    返回:
+        (参数字典, 错误信息)
+    """
+    params = {}
+    if days is not None:
+        params['days'] = days
+        params['since_day'] = window_start_day(days)
+    
+    if chart_type == 'heart_rate':
+        # points为曲线最大点数，downsample为降采样方法（lttb或minmax）
+        points = request.args.get('points', DEFAULT_MAX_POINTS, type=int)
+        if points is None or not 10 <= points <= 20000:
+            return None, "points必须在10到20000之间"
+        method = request.args.get('downsample', 'lttb')
+        if method not in DOWNSAMPLING_METHODS:
+            return None, f"不支持的降采样方法: {method}"
+        params.update(points=points, downsample=method)
+    elif chart_type == 'heatmap':
+        # 星期×时段作息热力图，默认为心率，slot为时段长度（60或15分钟）
+        slot_minutes = request.args.get('slot', 60, type=int)
+        if slot_minutes not in HEATMAP_SLOTS:
+            return None, f"不支持的时段长度: {request.args.get('slot')}"
+        params.update(type=request.args.get('type', 'HKQuantityTypeIdentifierHeartRate'), slot=slot_minutes)
+    return params, None
+
 def initialize_parser():
     """初始化解析器并加载数据"""
-    parser = HealthDataParser()
+    parser = HealthDataParser(source_priority=current_app.config.get('SOURCE_PRIORITY'))
     
     # 检查是否有已解析的数据文件
     data_file_path = session.get('data_file_path')
@@ -29,11 +110,51 @@ def initialize_parser():
         # 如果没有可用数据
         return None
     
+    # 分位数摘要从与数据集一起持久化的结果中读取
+    parser.use_sketch_store(get_artifact_dir(), get_dataset_version())
     return parser
 
+def get_dataset_version():
+    """获取当前会话中数据集的版本号（数据变化后版本号随之改变），没有数据时返回None"""
+    return dataset_version(session.get('data_file_path'), session.get('data_dir_path'))
+
+def get_artifact_dir():
+    """获取当前会话中数据集派生结果的持久化目录，没有数据时返回None"""
+    return artifact_dir(session.get('data_file_path'), session.get('data_dir_path'))
+
+def get_health_summary():
+    """
+    获取当前数据集的健康摘要（进程内缓存 → 与数据集一起持久化的摘要 → 解析数据计算并保存）
+    
+    返回:
+        摘要字典，加载数据失败时返回None
+    """
+    data_file_path = session.get('data_file_path')
+    data_dir_path = session.get('data_dir_path')
+    
+    def load():
+        summary = load_health_summary(data_file_path, data_dir_path)
+        if summary is not None:
+            return summary
+        
+        parser = initialize_parser()
+        if not parser:
+            return None
+        try:
+            return persist_health_summary(parser, data_file_path, data_dir_path)
+        finally:
+            parser.clean_up()
+    
+    return result_cache.get_or_compute(get_dataset_version(), 'health_summary', load)
+
 @bp.route('', methods=('GET',))
 def index():
-    """显示健康数据仪表板"""
+    """
+    显示健康数据仪表板
+    
+    页面只包含由健康摘要得到的统计和页面框架，不解析数据也不生成图表；
+    综合仪表板图表由页面脚本从/dashboard/stream异步加载，各面板完成后依次显示。
+    """
     
     # 检查是否有已解析的数据文件或目录
     data_file_path = session.get('data_file_path')
@@ -44,94 +165,31 @@ def index():
         return render_template('index.html', has_data=False)
     
     try:
-        # 初始化解析器并加载数据
-        parser = initialize_parser()
-        if not parser:
+        # 统计和可用数据类型来自持久化的健康摘要（上传时已计算）
+        summary = get_health_summary()
+        if summary is None:
             flash('找不到有效的健康数据')
             return render_template('index.html', has_data=False)
         
-        # 初始化可视化器
-        visualizer = HealthDataVisualizer(parser)
-        
-        # 获取数据统计
-        stats = {}
-        
-        # 获取心率统计
-        heart_rate_stats = parser.get_heart_rate_stats()
-        if heart_rate_stats:
-            stats['heart_rate'] = heart_rate_stats
-        
-        # 获取步数数据
-        daily_steps = parser.get_daily_step_count()
-        if not daily_steps.empty:
-            # 确保步数列是数值类型，处理缺失值
-            daily_steps['步数'] = pd.to_numeric(daily_steps['步数'], errors='coerce')
-            # 删除无效数据
-            daily_steps = daily_steps.dropna(subset=['步数'])
-            
-            if not daily_steps.empty:
-                total_steps = float(daily_steps['步数'].sum())
-                avg_steps = float(daily_steps['步数'].mean())
-                # 四舍五入到整数
-                stats['steps'] = {
-                    '总步数': round(total_steps, 0),
-                    '平均每日步数': round(avg_steps, 0)
-                }
-        
-        # 获取睡眠数据
-        sleep_data = parser.get_sleep_duration_daily()
-        if not sleep_data.empty:
-            # 确保睡眠时长列是数值类型，处理缺失值
-            sleep_data['睡眠时长(小时)'] = pd.to_numeric(sleep_data['睡眠时长(小时)'], errors='coerce')
-            # 删除无效数据
-            sleep_data = sleep_data.dropna(subset=['睡眠时长(小时)'])
-            
-            if not sleep_data.empty:
-                avg_sleep = float(sleep_data['睡眠时长(小时)'].mean())
-                # 四舍五入到1位小数
-                stats['sleep'] = {
-                    '平均睡眠时长': round(avg_sleep, 1)
-                }
-        
-        # 获取心电图数据
-        ecg_data = parser.get_ecg_data()
-        if not ecg_data.empty:
-            ecg_count = len(ecg_data)
-            stats['ecg'] = {
-                'ECG记录数': ecg_count
-            }
-        
-        # 获取压力指标数据
-        stress_data = parser.get_stress_indicators()
-        if not stress_data.empty and '压力指数' in stress_data.columns:
-            # 确保压力指数列是数值类型，处理缺失值
-            stress_data['压力指数'] = pd.to_numeric(stress_data['压力指数'], errors='coerce')
-            # 删除无效数据
-            stress_data = stress_data.dropna(subset=['压力指数'])
-            
-            if not stress_data.empty:
-                avg_stress = float(stress_data['压力指数'].mean())
-                # 四舍五入到1位小数
-                stats['stress'] = {
-                    '平均压力指数': round(avg_stress, 1)
-                }
-        
-        # 创建仪表板图表
-        dashboard_chart = visualizer.create_health_dashboard()
-        
-        # 获取所有可用的数据类型
-        data_types = parser.get_all_data_types()
+        # 无效的days按默认值处理
+        days, error = _days_param(DEFAULT_DASHBOARD_DAYS)
+        if error:
+            flash(error)
+            days = DEFAULT_DASHBOARD_DAYS
         
-        # 清理解析器
-        parser.clean_up()
-        
-        return render_template(
+        response = current_app.make_response(render_template(
             'dashboard.html', 
             has_data=True,
-            stats=stats,
-            dashboard_chart=dashboard_chart,
-            data_types=data_types
-        )
+            stats=summary,
+            data_types=summary.get('data_types', []),
+            days=days
+        ))
+        
+        # 页面内容的强ETag，内容未变化时返回304
+        response.add_etag()
+        response.cache_control.no_cache = True
+        response.cache_control.private = True
+        return response.make_conditional(request)
     
     except Exception as e:
         flash(f'生成仪表板时出错: {str(e)}')
@@ -145,46 +203,269 @@ def clear_data():
     flash('数据已清除')
     return redirect(url_for('dashboard.index'))
 
+def _serialize_chart(chart):
+    """
+    将图表字典序列化为JSON文本（只序列化一次，同时用于JSON响应和嵌入页面脚本）
+    
+    numpy数组以plotly类型化数组编码；输出转义了<、>、&和单引号，文本可以直接嵌入<script>。
+    """
+    return encode_figure(chart)
+
+def _chart_payload(chart_type, build, params=None):
+    """
+    获取图表的JSON文本和ETag（按数据集版本缓存，缓存未命中时调用build()生成图表）
+    
+    错误结果（如没有数据）和综合仪表板中仍有面板在加载（layout.meta.pending非空）时，
+    结果只用于本次响应，不写入缓存。
+    """
+    complete = []
+    
+    def compute():
+        chart = build()
+        if isinstance(chart, dict) and 'error' not in chart:
+            if not (chart.get('layout', {}).get('meta') or {}).get('pending'):
+                complete.append(True)
+        return _serialize_chart(chart)
+    
+    return cached_payload(
+        get_dataset_version(), get_artifact_dir(), f'chart-{chart_type}',
+        compute, params, cache_if=lambda: bool(complete)
+    )
+
+def json_response(payload, etag=None, mimetype='application/json'):
+    """返回已序列化的JSON文本，带强ETag时支持If-None-Match条件请求（未变化时返回304）"""
+    response = current_app.response_class(payload, mimetype=mimetype)
+    if etag:
+        response.set_etag(etag)
+        # 每次使用缓存前都向服务器验证，数据集变化后ETag随之改变
+        response.cache_control.no_cache = True
+        response.cache_control.private = True
+    return response.make_conditional(request)
+
+def _dashboard_visualizer(days):
+    """
+    综合仪表板使用的可视化器
+    
+    所有面板都已缓存或正在后台构建时（如页面轮询仍在加载的面板）不解析数据，只读取缓存和构建状态；
+    否则加载数据。没有可用数据时返回None。
+    """
+    if visualization.HealthDataVisualizer.panels_available(days, get_dataset_version()):
+        return visualization.HealthDataVisualizer(None)
+    parser = initialize_parser()
+    return visualization.HealthDataVisualizer(parser) if parser else None
+
+def _build_chart(chart_type, params, days=None):
+    """生成指定类型的图表（缓存未命中时调用），days为None时显示全部历史"""
+    if chart_type == 'dashboard':
+        visualizer = _dashboard_visualizer(days)
+        if not visualizer:
+            return {"error": "没有可用的数据"}
+        return visualizer.create_health_dashboard(days=days, cache_version=get_dataset_version())
+    
+    parser = initialize_parser()
+    if not parser:
+        return {"error": "没有可用的数据"}
+    
+    visualizer = visualization.HealthDataVisualizer(parser)
+    since_day = window_start_day(days)
+    
+    if chart_type == 'heart_rate':
+        chart = visualizer.plot_heart_rate_over_time(params['points'], params['downsample'], days)
+        return chart if chart else {"error": "暂无心率数据"}
+    elif chart_type == 'steps':
+        chart = visualizer.plot_daily_steps(days)
+        return chart if chart else {"error": "暂无步数数据"}
+    elif chart_type == 'sleep':
+        chart = visualizer.plot_sleep_duration(days)
+        return chart if chart else {"error": "暂无睡眠数据"}
+    elif chart_type == 'stress':
+        # 获取压力指标图表
+        stress_data = parser.get_stress_indicators(since_day)
+        if stress_data.empty or '压力指数' not in stress_data.columns:
+            return {"error": "暂无压力数据"}
+        chart = visualizer.plot_stress_indicators(days)
+        return chart if chart else {"error": "暂无压力数据"}
+    elif chart_type == 'ecg':
+        # 获取ECG数据并传入plot_ecg_summary方法
+        ecg_data = parser.get_ecg_data(since_day)
+        if ecg_data.empty:
+            return {"error": "暂无心电图数据"}
+        chart = visualizer.plot_ecg_summary(ecg_data)
+        return chart if chart else {"error": "暂无心电图数据"}
+    elif chart_type == 'heatmap':
+        data_type = params['type']
+        chart = visualizer.plot_weekday_heatmap(data_type, params['slot'], HEATMAP_TITLES.get(data_type), days)
+        return chart if chart else {"error": "暂无该类型数据"}
+
 @bp.route('/chart/<chart_type>', methods=('GET',))
 def get_chart(chart_type):
-    """获取指定类型的图表"""
+    """
+    获取指定类型的图表
+    
+    图表JSON按(数据集版本, 图表类型, 规范化的请求参数)缓存在内存和磁盘上，响应带强ETag，
+    浏览器重新验证时数据集未变化即返回304；新的导入改变数据集版本后缓存自动失效。
+    days参数限制为最近多少天的数据（综合仪表板默认30天，其他图表默认全部历史）。
+    """
+    if chart_type not in CHART_TYPES:
+        return {"error": "无效的图表类型"}
+    
+    days, error = _days_param(DEFAULT_DASHBOARD_DAYS if chart_type == 'dashboard' else None)
+    if error:
+        return {"error": error}
+    
+    params, error = _chart_params(chart_type, days)
+    if error:
+        return {"error": error}
+    
     try:
-        parser = initialize_parser()
-        if not parser:
-            return {"error": "没有可用的数据"}
+        payload, etag = _chart_payload(chart_type, lambda: _build_chart(chart_type, params, days), params)
+        return json_response(payload, etag)
+    except Exception as e:
+        print(f"获取图表时出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return {"error": str(e)} 
+
+@bp.route('/stream', methods=('GET',))
+def stream_dashboard():
+    """
+    流式获取综合仪表板图表（NDJSON，每行一个完整的图表JSON）
+    
+    先发送只含已完成面板的图表，之后每完成一个面板发送一次更新后的图表。
+    所有面板都完成的最终图表写入缓存（与/chart/dashboard共用），之后的请求直接以带ETag的单行响应返回。
+    """
+    days, error = _days_param(DEFAULT_DASHBOARD_DAYS)
+    if error:
+        return {"error": error}
+    
+    version = get_dataset_version()
+    directory = get_artifact_dir()
+    # 与/chart/dashboard使用相同的参数，共用缓存的最终图表
+    params, _ = _chart_params('dashboard', days)
+    
+    try:
+        payload, _ = peek_payload(version, directory, 'chart-dashboard', params)
+        if payload is not None:
+            # NDJSON表示与/chart/dashboard的JSON正文不同，使用自己的ETag
+            return json_response(payload + '\n', payload_etag(version, 'stream-dashboard', params), NDJSON_MIMETYPE)
         
-        visualizer = HealthDataVisualizer(parser)
+        visualizer = _dashboard_visualizer(days)
+        if not visualizer:
+            return {"error": "没有可用的数据"}
+    except Exception as e:
+        print(f"获取仪表板时出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return {"error": str(e)}
+    
+    def generate():
+        text = None
+        pending = []
+        try:
+            for chart in visualizer.iter_health_dashboard(days=days, cache_version=version):
+                text = _serialize_chart(chart)
+                pending = ((chart.get('layout') or {}).get('meta') or {}).get('pending', [])
+                yield text + '\n'
+            # 仍有面板未完成时不缓存，页面随后通过/chart/dashboard重新获取
+            if text is not None and not pending:
+                store_payload(version, directory, 'chart-dashboard', text, params)
+        finally:
+            if visualizer.parser:
+                visualizer.parser.clean_up()
+    
+    response = current_app.response_class(generate(), mimetype=NDJSON_MIMETYPE)
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response
+
+def _viewport_time(name):
+    """
+    读取视口范围的时间参数（plotly的xaxis.range值，如'2024-01-05 12:30:15.123'，也可以只给日期）
+    
+    返回:
+        (datetime64[ms]或None, 错误信息)
+    """
+    text = request.args.get(name)
+    if not text:
+        return None, None
+    try:
+        return np.datetime64(text.strip().replace(' ', 'T'), 'ms'), None
+    except ValueError:
+        return None, f"{name}不是有效的时间: {text}"
+
+def get_viewport_store():
+    """
+    获取当前数据集的视口样本（进程内缓存 → 上传时持久化的样本 → 解析数据提取并保存）
+    
+    同一数据集版本只加载一次，之后的缩放/平移请求直接在内存中的数组上截取。
+    
+    返回:
+        build_viewport_store返回的数组字典，加载数据失败时返回None
+    """
+    version = get_dataset_version()
+    directory = get_artifact_dir()
+    
+    def load():
+        store = load_viewport_store(directory, version)
+        if store is not None:
+            return store
         
-        if chart_type == 'heart_rate':
-            chart = visualizer.plot_heart_rate_over_time()
-            return chart if chart else {"error": "暂无心率数据"}
-        elif chart_type == 'steps':
-            chart = visualizer.plot_daily_steps()
-            return chart if chart else {"error": "暂无步数数据"}
-        elif chart_type == 'sleep':
-            chart = visualizer.plot_sleep_duration()
-            return chart if chart else {"error": "暂无睡眠数据"}
-        elif chart_type == 'stress':
-            # 获取压力指标图表
-            stress_data = parser.get_stress_indicators()
-            if stress_data.empty or '压力指数' not in stress_data.columns:
-                return {"error": "暂无压力数据"}
-            chart = visualizer.plot_stress_indicators()
-            return chart if chart else {"error": "暂无压力数据"}
-        elif chart_type == 'ecg':
-            # 获取ECG数据并传入plot_ecg_summary方法
-            ecg_data = parser.get_ecg_data()
-            if ecg_data.empty:
-                return {"error": "暂无心电图数据"}
-            chart = visualizer.plot_ecg_summary(ecg_data)
-            return chart if chart else {"error": "暂无心电图数据"}
-        elif chart_type == 'dashboard':
-            chart = visualizer.create_health_dashboard()
-            return chart
-        else:
-            return {"error": "无效的图表类型"}
+        parser = initialize_parser()
+        if not parser:
+            return None
+        try:
+            store = build_viewport_store(parser)
+            save_viewport_store(directory, version, store)
+            return store
+        finally:
+            parser.clean_up()
+    
+    return result_cache.get_or_compute(version, 'viewport_samples', load)
+
+@bp.route('/series/<metric>', methods=('GET',))
+def get_series(metric):
+    """
+    获取视口范围内合适分辨率的序列（图表缩放/平移时调用）
+    
+    start/end为可见范围的本地时间，width为图表的像素宽度；按每像素时长选择原始样本或小时/天/周汇总，
+    返回紧凑的JSON（x为本地时间毫秒数、y为类型化数组）。样本来自上传时持久化的视口样本，不重新解析数据；
+    结果按(数据集版本, 指标, 视口)缓存在内存中，视口参数变化多，不写入磁盘。
+    """
+    if metric not in VIEWPORT_METRICS:
+        return {"error": "无效的指标"}
+    
+    start, error = _viewport_time('start')
+    if error:
+        return {"error": error}
+    end, error = _viewport_time('end')
+    if error:
+        return {"error": error}
+    if start is not None and end is not None and end <= start:
+        return {"error": "end必须晚于start"}
+    
+    width = request.args.get('width', DEFAULT_VIEWPORT_WIDTH, type=int)
+    if width is None or not MIN_VIEWPORT_WIDTH <= width <= MAX_VIEWPORT_WIDTH:
+        return {"error": f"width必须在{MIN_VIEWPORT_WIDTH}到{MAX_VIEWPORT_WIDTH}之间"}
+    
+    loaded = []
+    
+    def compute():
+        store = get_viewport_store()
+        if store is None:
+            return _serialize_chart({"error": "没有可用的数据"})
+        # 加载数据失败不缓存；范围内没有数据是确定的结果，照常缓存
+        loaded.append(True)
+        series = viewport_series(store, metric, start, end, width)
+        return _serialize_chart(series if series else {"error": "该范围内没有数据"})
+    
+    params = {'start': str(start), 'end': str(end), 'width': width}
+    try:
+        payload, etag = cached_payload(
+            get_dataset_version(), None, f'series-{metric}', compute, params, cache_if=lambda: bool(loaded)
+        )
+        return json_response(payload, etag)
     except Exception as e:
-        print(f"获取图表时出错: {e}")
+        print(f"获取视口序列时出错: {e}")
         import traceback
         traceback.print_exc()
-        return {"error": str(e)} 
\ No newline at end of file
+        return {"error": str(e)}
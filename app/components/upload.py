@@ -7,7 +7,16 @@ from werkzeug.utils import secure_filename
 import uuid
 import shutil
 from app.utils.health_parser import HealthDataParser
+from app.utils.summary import persist_health_summary
+from app.utils.cache import dataset_version, artifact_dir
+from app.utils.viewport import build_viewport_store, save_viewport_store
+from app.utils.lazy import lazy_module
+from app.components.dashboard import DEFAULT_DASHBOARD_DAYS
 import tempfile
+import traceback
+
+# 可视化模块在第一次上传时才导入，应用启动不需要它
+visualization = lazy_module('app.utils.visualization')
 
 bp = Blueprint('upload', __name__, url_prefix='/upload')
 
@@ -19,6 +28,25 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _persist_artifacts(parser):
+    """
+    在解析完成后构建分位数摘要、健康摘要、视口样本和默认天数的仪表板面板，与数据集一起持久化，失败时不影响上传
+    """
+    data_file_path = session.get('data_file_path')
+    data_dir_path = session.get('data_dir_path')
+    directory = artifact_dir(data_file_path, data_dir_path)
+    version = dataset_version(data_file_path, data_dir_path)
+    try:
+        parser.use_sketch_store(directory, version)
+        parser.prepare_quantile_sketches()
+        persist_health_summary(parser, data_file_path, data_dir_path)
+        save_viewport_store(directory, version, build_viewport_store(parser))
+        panels = visualization.HealthDataVisualizer(parser).build_dashboard_panels(DEFAULT_DASHBOARD_DAYS)
+        visualization.save_dashboard_panels(directory, version, DEFAULT_DASHBOARD_DAYS, panels)
+    except Exception as e:
+        print(f"保存健康摘要时出错: {str(e)}")
+        traceback.print_exc()
+
 @bp.route('', methods=('GET', 'POST'))
 def upload_file():
     """处理数据文件上传"""
@@ -40,13 +68,13 @@ def upload_file():
                 
                 # 处理文件
                 try:
-                    parser = HealthDataParser()
+                    parser = HealthDataParser(source_priority=current_app.config.get('SOURCE_PRIORITY'))
                     success = False
                     xml_path = None
                     
-                    # 如果是ZIP文件，提取XML
+                    # 如果是ZIP文件，提取XML（保存在上传目录中，数据集的派生结果随之保存）
                     if filename.endswith('.zip'):
-                        xml_path = parser.extract_from_zip(file_path)
+                        xml_path = parser.extract_from_zip(file_path, upload_dir)
                         if xml_path:
                             # 尝试解析XML文件
                             success = parser.parse_xml(xml_path)
@@ -91,6 +119,9 @@ def upload_file():
                         else:
                             flash('文件已解析，但未识别到标准的健康数据类型。')
                         
+                        # 构建分位数摘要和健康摘要并与数据集一起保存
+                        _persist_artifacts(parser)
+                        
                         # 释放解析器内存
                         parser.clean_up()
                         
@@ -126,7 +157,7 @@ def upload_file():
                     file.save(target_path)
                 
                 # 尝试解析目录
-                parser = HealthDataParser()
+                parser = HealthDataParser(source_priority=current_app.config.get('SOURCE_PRIORITY'))
                 success = parser.parse_directory(upload_dir)
                 
                 if success:
@@ -140,6 +171,9 @@ def upload_file():
                     else:
                         flash('目录已解析，但未识别到标准的健康数据类型。')
                     
+                    # 构建分位数摘要和健康摘要并与数据集一起保存
+                    _persist_artifacts(parser)
+                    
                     # 释放解析器内存
                     parser.clean_up()
                     
@@ -0,0 +1,177 @@
+import numpy as np
+
+from app.utils.timekeys import bucket_labels
+
+# MAD换算为正态分布标准差的系数
+MAD_SCALE = 1.4826
+# MAD为0时改用平均绝对偏差，对应的换算系数
+MEAN_AD_SCALE = 1.2533
+
+# 各时间粒度的默认检测参数：
+#   window: 基线使用的历史桶数
+#   period: 季节周期（按小时时只与此前若干天同一小时比较）
+#   min_periods: 计算基线所需的最少历史桶数
+DEFAULT_DETECTION_PARAMS = {
+    'day': {'window': 28, 'period': None, 'min_periods': 7},
+    'hour': {'window': 14, 'period': 24, 'min_periods': 7}
+}
+
+# 默认异常阈值（稳健z分数的绝对值）
+DEFAULT_THRESHOLD = 3.5
+
+
+def _sorted_median(block):
+    """对每行已排序的矩阵求行中位数"""
+    width = block.shape[1]
+    return (block[:, (width - 1) // 2] + block[:, width // 2]) / 2
+
+
+def rolling_robust_zscore(keys, values, window=28, period=None, min_periods=7):
+    """
+    滚动稳健z分数：每个桶与其此前window个桶的中位数和MAD比较
+
+    z = (x - 中位数) / (1.4826 * MAD)。基线只使用历史桶（不含当前桶），避免异常值掩盖自身。
+    指定period时按 key % period 分组，只与同一相位（如同一小时）的历史桶比较。
+
+    参数:
+        keys: 整数桶键（升序）
+        values: 每个桶的数值
+        window: 历史窗口长度
+        period: 季节周期，None表示不分组
+        min_periods: 计算基线所需的最少历史桶数
+
+    返回:
+        字典，包含 z、median（基线中位数）、scale（稳健标准差）数组，均与keys等长
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    n = keys.size
+    z = np.full(n, np.nan)
+    median = np.full(n, np.nan)
+    scale = np.full(n, np.nan)
+    if n == 0 or window < 1:
+        return {'z': z, 'median': median, 'scale': scale}
+
+    # 按(相位, 时间)排序，使同一分组的历史连续排列
+    phase = keys % period if period else np.zeros(n, dtype=np.int64)
+    order = np.lexsort((keys, phase))
+    sorted_values = values[order]
+    sorted_phase = phase[order]
+    new_group = np.concatenate(([True], sorted_phase[1:] != sorted_phase[:-1]))
+    group_starts = np.maximum.accumulate(np.where(new_group, np.arange(n), 0))
+
+    # 第i行为此前window个值（前面补NaN），即sorted_values[i-window:i]
+    padded = np.concatenate((np.full(window, np.nan), sorted_values))
+    history = np.lib.stride_tricks.sliding_window_view(padded, window)[:n]
+    position = np.arange(n) - group_starts
+    full = position >= window
+    partial = (position >= max(min_periods, 1)) & ~full
+
+    med = np.full(n, np.nan)
+    mad = np.full(n, np.nan)
+    mean_ad = np.full(n, np.nan)
+
+    # 大多数行历史完整：逐行排序后直接取中位数
+    if full.any():
+        block = np.sort(history[full], axis=1)
+        center = _sorted_median(block)
+        deviations = np.sort(np.abs(block - center[:, None]), axis=1)
+        med[full] = center
+        mad[full] = _sorted_median(deviations)
+        mean_ad[full] = deviations.mean(axis=1)
+
+    # 每组开头历史不足window的少数行：屏蔽跨组的值后用nanmedian
+    if partial.any():
+        block = history[partial].copy()
+        block[np.arange(window)[None, :] < (window - position[partial])[:, None]] = np.nan
+        center = np.nanmedian(block, axis=1)
+        deviations = np.abs(block - center[:, None])
+        med[partial] = center
+        mad[partial] = np.nanmedian(deviations, axis=1)
+        mean_ad[partial] = np.nanmean(deviations, axis=1)
+
+    robust_scale = MAD_SCALE * mad
+    fallback = robust_scale == 0
+    robust_scale[fallback] = MEAN_AD_SCALE * mean_ad[fallback]
+    robust_scale[robust_scale == 0] = np.nan
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sorted_z = (sorted_values - med) / robust_scale
+
+    z[order] = sorted_z
+    median[order] = med
+    scale[order] = robust_scale
+    return {'z': z, 'median': median, 'scale': scale}
+
+
+def detect_anomalies(keys, values, granularity='day', threshold=DEFAULT_THRESHOLD, **params):
+    """
+    在一条按时间桶汇总的序列上检测异常点
+
+    参数:
+        keys: 整数桶键（升序）
+        values: 每个桶的数值
+        granularity: 'day'或'hour'，决定默认检测参数和时间标签格式
+        threshold: 稳健z分数绝对值阈值
+        **params: 覆盖DEFAULT_DETECTION_PARAMS中的window、period、min_periods
+
+    返回:
+        异常点字典列表（time、value、baseline、score、direction）
+    """
+    settings = dict(DEFAULT_DETECTION_PARAMS[granularity])
+    settings.update(params)
+
+    keys = np.asarray(keys, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    result = rolling_robust_zscore(keys, values, **settings)
+
+    with np.errstate(invalid='ignore'):
+        flagged = np.flatnonzero(np.abs(result['z']) >= threshold)
+    if flagged.size == 0:
+        return []
+
+    labels = bucket_labels(keys[flagged], granularity)
+    return [
+        {
+            'time': str(label),
+            'value': round(float(values[i]), 4),
+            'baseline': round(float(result['median'][i]), 4),
+            'score': round(float(result['z'][i]), 2),
+            'direction': 'high' if result['z'][i] > 0 else 'low'
+        }
+        for label, i in zip(labels, flagged)
+    ]
+
+
+def detect_all_anomalies(parser, data_types=None, granularities=('day', 'hour'), threshold=DEFAULT_THRESHOLD):
+    """
+    对所有数值类型的每日、每小时汇总序列批量检测异常
+
+    参数:
+        parser: HealthDataParser实例
+        data_types: 要检测的类型列表，默认为全部类型
+        granularities: 时间粒度列表
+        threshold: 稳健z分数绝对值阈值
+
+    返回:
+        字典 {类型: {粒度: 异常点列表}}，没有异常的类型和粒度不包含在内
+    """
+    if data_types is None:
+        data_types = parser.get_all_data_types()
+
+    anomalies = {}
+    for data_type in data_types:
+        for granularity in granularities:
+            try:
+                series = parser.get_rollup_series(data_type, granularity)
+            except Exception as e:
+                print(f"获取{data_type}汇总数据时出错: {str(e)}")
+                continue
+            if series is None:
+                continue
+
+            points = detect_anomalies(series[0], series[1], granularity, threshold)
+            if points:
+                anomalies.setdefault(data_type, {})[granularity] = points
+
+    return anomalies
@@ -0,0 +1,323 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def dataset_version(data_file_path=None, data_dir_path=None):
+    """
+    计算数据集版本号
+
+    版本号由数据文件（或目录下所有文件）的路径、大小和修改时间得出，
+    重新导入或文件发生变化时版本号随之改变，可用作缓存键。
+
+    参数:
+        data_file_path: XML数据文件路径
+        data_dir_path: 数据目录路径
+
+    返回:
+        16位十六进制版本字符串，没有可用数据时返回None
+    """
+    digest = hashlib.sha1()
+
+    if data_file_path and os.path.exists(data_file_path):
+        stat = os.stat(data_file_path)
+        digest.update(f"{os.path.abspath(data_file_path)}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8'))
+    elif data_dir_path and os.path.exists(data_dir_path):
+        digest.update(os.path.abspath(data_dir_path).encode('utf-8'))
+        entries = []
+        for root, _, files in os.walk(data_dir_path):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append(f"{os.path.relpath(path, data_dir_path)}|{stat.st_size}|{stat.st_mtime_ns}")
+        for entry in sorted(entries):
+            digest.update(entry.encode('utf-8'))
+    else:
+        return None
+
+    return digest.hexdigest()[:16]
+
+
+def artifact_dir(data_file_path=None, data_dir_path=None):
+    """
+    数据集派生结果（异常检测、摘要等）的持久化目录
+
+    目录位于数据文件所在目录（或数据目录的上级目录）下，不在数据目录内部，
+    因此写入派生结果不会改变数据集版本号。
+
+    返回:
+        目录路径，没有可用数据时返回None
+    """
+    if data_file_path:
+        base = os.path.dirname(os.path.abspath(data_file_path))
+    elif data_dir_path:
+        base = os.path.dirname(os.path.abspath(data_dir_path))
+    else:
+        return None
+    return os.path.join(base, '.artifacts')
+
+
+def load_artifact(directory, name, version):
+    """
+    读取持久化的派生结果
+
+    参数:
+        directory: artifact_dir返回的目录
+        name: 结果名称
+        version: 数据集版本，只读取同一版本写入的结果
+
+    返回:
+        结果对象，不存在或读取失败时返回None
+    """
+    if not directory or version is None:
+        return None
+
+    path = os.path.join(directory, f"{name}-{version}.json")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_artifact(directory, name, version, value):
+    """
+    持久化派生结果（先写临时文件再替换，避免并发读取到不完整的文件）
+
+    返回:
+        是否写入成功
+    """
+    if not directory or version is None:
+        return False
+
+    return save_payload(directory, name, version, json.dumps(value, ensure_ascii=False))
+
+
+def load_arrays(directory, name, version):
+    """
+    读取持久化的数组集合（numpy的.npz文件，不使用pickle）
+
+    返回:
+        名称 -> 数组的字典，不存在或读取失败时返回None
+    """
+    if not directory or version is None:
+        return None
+
+    path = os.path.join(directory, f"{name}-{version}.npz")
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            return {key: arrays[key] for key in arrays.files}
+    except (OSError, ValueError):
+        return None
+
+
+def save_arrays(directory, name, version, arrays):
+    """
+    将数组集合持久化为.npz文件（先写临时文件再替换）
+
+    参数:
+        arrays: 名称 -> 数组的字典
+
+    返回:
+        是否写入成功
+    """
+    if not directory or version is None:
+        return False
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}-{version}.npz")
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, path)
+        return True
+    except OSError as e:
+        print(f"保存{name}结果时出错: {str(e)}")
+        return False
+
+
+def load_payload(directory, name, version):
+    """
+    读取持久化的已序列化结果（如图表JSON文本），不做反序列化
+
+    返回:
+        文本，不存在或读取失败时返回None
+    """
+    if not directory or version is None:
+        return None
+
+    path = os.path.join(directory, f"{name}-{version}.json")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def save_payload(directory, name, version, text):
+    """
+    持久化已序列化的结果文本（先写临时文件再替换，避免并发读取到不完整的文件）
+
+    返回:
+        是否写入成功
+    """
+    if not directory or version is None:
+        return False
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}-{version}.json")
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_path, path)
+        return True
+    except OSError as e:
+        print(f"保存{name}结果时出错: {str(e)}")
+        return False
+
+
+def params_digest(params=None):
+    """参数字典的短摘要，用于持久化文件名和ETag"""
+    text = json.dumps(sorted((params or {}).items()), ensure_ascii=False)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+class ResultCache:
+    """按数据集版本缓存计算结果的进程内LRU缓存"""
+
+    def __init__(self, max_entries=128):
+        """
+        初始化缓存
+
+        参数:
+            max_entries: 最多保留的结果数量，超过后淘汰最久未使用的结果
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(version, name, params=None):
+        """生成缓存键：(数据集版本, 结果名称, 排序后的参数)"""
+        return (version, name, tuple(sorted((params or {}).items())))
+
+    def get(self, version, name, params=None):
+        """获取缓存结果，不存在时返回None"""
+        key = self.make_key(version, name, params)
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def set(self, version, name, value, params=None):
+        """写入缓存结果"""
+        key = self.make_key(version, name, params)
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_or_compute(self, version, name, compute, params=None):
+        """
+        获取缓存结果，不存在时调用compute()计算并缓存
+
+        参数:
+            version: 数据集版本（为None时不缓存）
+            name: 结果名称
+            compute: 无参数的计算函数
+            params: 影响结果的参数字典
+
+        返回:
+            计算结果
+        """
+        if version is None:
+            return compute()
+
+        value = self.get(version, name, params)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.set(version, name, value, params)
+        return value
+
+
+# 全局结果缓存
+result_cache = ResultCache()
+
+
+def payload_etag(version, name, params=None):
+    """已缓存结果的强ETag（由数据集版本、结果名称和参数摘要组成）"""
+    return f"{version}-{name}-{params_digest(params)}"
+
+
+def peek_payload(version, directory, name, params=None):
+    """
+    只读取已缓存的序列化结果（进程内缓存或磁盘），不计算
+
+    返回:
+        (文本, 强ETag)，没有缓存时返回(None, None)
+    """
+    if version is None:
+        return None, None
+
+    text = result_cache.get(version, name, params)
+    if text is None:
+        text = load_payload(directory, f"{name}-{params_digest(params)}", version)
+        if text is None:
+            return None, None
+        result_cache.set(version, name, text, params)
+    return text, payload_etag(version, name, params)
+
+
+def store_payload(version, directory, name, text, params=None):
+    """
+    将序列化结果写入进程内缓存和磁盘（在请求之外生成的结果，如流式响应最终的图表）
+
+    返回:
+        强ETag，version为None时不缓存并返回None
+    """
+    if version is None:
+        return None
+    save_payload(directory, f"{name}-{params_digest(params)}", version, text)
+    result_cache.set(version, name, text, params)
+    return payload_etag(version, name, params)
+
+
+def cached_payload(version, directory, name, compute, params=None, cache_if=None):
+    """
+    获取已序列化的结果：先查进程内缓存，再查磁盘，都没有时调用compute()生成并写入两者
+
+    参数:
+        version: 数据集版本（为None时不缓存）
+        directory: artifact_dir返回的持久化目录
+        name: 结果名称
+        compute: 无参数函数，返回序列化后的文本
+        params: 影响结果的参数字典
+        cache_if: 可选的无参数函数，compute()之后调用，返回False时结果只用于本次请求（如仍有部分未完成）
+
+    返回:
+        (文本, 强ETag)；ETag由数据集版本、结果名称和参数摘要组成，数据集变化后自动改变；
+        未缓存的结果没有ETag
+    """
+    if version is None:
+        return compute(), None
+
+    text, etag = peek_payload(version, directory, name, params)
+    if text is not None:
+        return text, etag
+
+    text = compute()
+    if text is None or (cache_if is not None and not cache_if()):
+        return text, None
+    return text, store_payload(version, directory, name, text, params)
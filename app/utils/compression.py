@@ -0,0 +1,189 @@
+import gzip
+import zlib
+
+from flask import request
+
+from app.utils.cache import ResultCache
+
+try:
+    import brotli  # 可选依赖，安装后支持br编码
+except ImportError:
+    brotli = None
+
+# 需要压缩的响应类型
+COMPRESSIBLE_MIMETYPES = (
+    'application/json', 'application/x-ndjson', 'text/html', 'text/plain',
+    'text/css', 'text/javascript', 'application/javascript'
+)
+# 小于该字节数的响应不压缩（压缩收益抵不上开销）
+MIN_COMPRESS_SIZE = 1024
+# 大于该字节数的响应分块流式压缩，不在内存中生成完整的压缩副本
+STREAM_COMPRESS_SIZE = 1024 * 1024
+# 流式压缩时每次送入压缩器的字节数
+STREAM_CHUNK_SIZE = 256 * 1024
+# 按请求压缩的级别（gzip为1-9，br为0-11）
+COMPRESSION_LEVELS = {'gzip': 6, 'br': 5}
+# 带强ETag的缓存结果只压缩一次，使用更高的级别
+PRECOMPRESS_LEVELS = {'gzip': 9, 'br': 9}
+
+# 带强ETag的响应压缩后的内容：(ETag, 编码, 响应类型) -> 压缩后的字节
+compressed_cache = ResultCache(max_entries=64)
+
+
+def supported_encodings():
+    """服务器支持的内容编码，按优先顺序"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding():
+    """
+    按请求的Accept-Encoding（含q值）选择内容编码
+
+    返回:
+        'br'、'gzip'，客户端不接受任何支持的编码时返回None
+    """
+    return request.accept_encodings.best_match(supported_encodings())
+
+
+def compress(data, encoding, level=None):
+    """
+    一次性压缩字节串
+
+    参数:
+        data: 原始字节
+        encoding: 'gzip'或'br'
+        level: 压缩级别，默认为COMPRESSION_LEVELS中的值
+    """
+    level = COMPRESSION_LEVELS[encoding] if level is None else level
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class StreamCompressor:
+    """增量压缩器：每次送入的数据都立即刷新输出，流式响应的每一块都能及时到达客户端"""
+
+    def __init__(self, encoding, level=None):
+        """
+        初始化压缩器
+
+        参数:
+            encoding: 'gzip'或'br'
+            level: 压缩级别，默认为COMPRESSION_LEVELS中的值
+        """
+        level = COMPRESSION_LEVELS[encoding] if level is None else level
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            # wbits=31为带gzip头和尾的deflate流
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, chunk):
+        """压缩一块数据并刷新，返回可以立即发送的字节"""
+        if self.encoding == 'br':
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        """结束压缩流，返回剩余的字节"""
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def _compress_stream(chunks, encoding):
+    """逐块压缩可迭代对象中的数据（字符串按UTF-8编码），跳过压缩后为空的块"""
+    compressor = StreamCompressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if not chunk:
+            continue
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def _split(data, size=STREAM_CHUNK_SIZE):
+    """将字节串切分为固定大小的块"""
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+
+def _weak_etag(response):
+    """
+    将强ETag改为弱ETag（压缩后的表示与原文字节不同，不再满足强验证器的语义）
+
+    If-None-Match使用弱比较，浏览器带回W/"..."时视图中的条件请求仍然返回304。
+
+    返回:
+        原来的强ETag，没有强ETag时返回None
+    """
+    etag, weak = response.get_etag()
+    if etag is None or weak:
+        return None
+    response.set_etag(etag, weak=True)
+    return etag
+
+
+def compress_response(response):
+    """
+    按Accept-Encoding压缩响应（after_request钩子）
+
+    只处理可压缩类型的成功响应；已编码、直接传输文件和小于MIN_COMPRESS_SIZE的响应保持原样。
+    流式响应（生成器）逐块压缩并刷新；大于STREAM_COMPRESS_SIZE的响应分块流式压缩；
+    带强ETag的响应（数据集版本对应的缓存结果）以更高级别压缩一次后缓存压缩结果。
+    """
+    if response.status_code == 304:
+        # 304没有正文和类型，ETag与同一请求会得到的（压缩后的）200响应保持一致
+        if request.endpoint != 'static' and negotiate_encoding() is not None:
+            response.vary.add('Accept-Encoding')
+            _weak_etag(response)
+        return response
+
+    if (not 200 <= response.status_code < 300 or response.status_code in (204, 206)
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers
+            or response.direct_passthrough):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    # 协商出编码时一律使用弱ETag（不论正文是否足够大而被压缩），与对应的304一致
+    etag = _weak_etag(response)
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return response
+
+        if etag is not None:
+            # 同一ETag可能对应不同的表示（如JSON和NDJSON），缓存键包含响应类型
+            representation = {'mimetype': response.mimetype}
+            body = compressed_cache.get(etag, encoding, representation)
+            if body is None:
+                body = compress(data, encoding, PRECOMPRESS_LEVELS[encoding])
+                compressed_cache.set(etag, encoding, body, representation)
+            response.set_data(body)
+        elif len(data) > STREAM_COMPRESS_SIZE:
+            response.response = _compress_stream(_split(data), encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            response.set_data(compress(data, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_compression(app):
+    """在应用上注册响应压缩（app.config['COMPRESS_RESPONSES']为False时不注册）"""
+    if app.config['COMPRESS_RESPONSES']:
+        app.after_request(compress_response)
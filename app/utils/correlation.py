@@ -0,0 +1,219 @@
+import numpy as np
+from app.utils.lazy import lazy_module
+
+pd = lazy_module('pandas')
+
+
+def _pairwise_sums(X):
+    """
+    计算列两两之间在共同非缺失行上的计数与各阶和
+
+    返回:
+        (n, sx, sxx, sxy)，均为M×M矩阵，其中sx[i, j]为列i在列i、j都有值的行上的和
+    """
+    mask = ~np.isnan(X)
+    M = mask.astype(np.float64)
+    X0 = np.where(mask, X, 0.0)
+
+    n = M.T @ M
+    sx = X0.T @ M
+    sxx = (X0 * X0).T @ M
+    sxy = X0.T @ X0
+    return n, sx, sxx, sxy
+
+
+def pearson_matrix(X, min_periods=3):
+    """
+    计算带缺失值矩阵各列两两之间的皮尔逊相关系数（成对删除缺失值，一次矩阵运算完成）
+
+    参数:
+        X: 行×列的float数组，缺失值为NaN
+        min_periods: 计算相关系数所需的最少共同样本数
+
+    返回:
+        (相关系数矩阵, 共同样本数矩阵)
+    """
+    X = np.asarray(X, dtype=np.float64)
+
+    # 先按列中心化，减小大数值时的舍入误差（不影响相关系数）
+    with np.errstate(invalid='ignore'):
+        X = X - np.nanmean(X, axis=0)
+
+    n, sx, sxx, sxy = _pairwise_sums(X)
+
+    numerator = n * sxy - sx * sx.T
+    var_i = n * sxx - sx * sx
+    var_j = var_i.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = numerator / np.sqrt(var_i * var_j)
+
+    invalid = (n < min_periods) | (var_i <= 0) | (var_j <= 0)
+    r[invalid] = np.nan
+    r = np.clip(r, -1.0, 1.0)
+
+    return r, n.astype(np.int64)
+
+
+def _column_ranks(X):
+    """各列在自身非缺失值上的秩（并列取平均秩），缺失值仍为NaN"""
+    return pd.DataFrame(X).rank(axis=0, method='average').to_numpy()
+
+
+def spearman_matrix(X, min_periods=3):
+    """
+    计算各列两两之间的斯皮尔曼相关系数（成对删除缺失值，与逐对求秩的结果一致）
+
+    先对每列在自身所有非缺失值上求秩，用一次成对皮尔逊矩阵运算得到所有列对的结果；
+    共同非缺失行与两列各自的非缺失行不一致的列对，再在共同行上重新求秩计算。
+    没有缺失值时不需要重新求秩。
+
+    参数:
+        X: 行×列的float数组，缺失值为NaN
+        min_periods: 最少共同样本数
+
+    返回:
+        (相关系数矩阵, 共同样本数矩阵)
+    """
+    X = np.asarray(X, dtype=np.float64)
+    mask = ~np.isnan(X)
+    r, n = pearson_matrix(_column_ranks(X), min_periods=min_periods)
+
+    counts = mask.sum(axis=0)
+    for i in range(X.shape[1]):
+        for j in range(i + 1, X.shape[1]):
+            # 共同行就是两列各自的全部非缺失行时，整列的秩即为成对的秩
+            if n[i, j] < min_periods or n[i, j] == counts[i] == counts[j]:
+                continue
+            common = mask[:, i] & mask[:, j]
+            pair_r, _ = pearson_matrix(_column_ranks(X[common][:, [i, j]]), min_periods=min_periods)
+            r[i, j] = r[j, i] = pair_r[0, 1]
+
+    return r, n
+
+
+def correlation_pvalues(r, n):
+    """
+    相关系数的双侧显著性检验p值（t分布，自由度n-2）
+
+    参数:
+        r: 相关系数数组
+        n: 对应的样本数数组
+
+    返回:
+        与r形状相同的p值数组，无法计算的位置为NaN
+    """
+    from scipy import stats
+
+    r = np.asarray(r, dtype=np.float64)
+    df = np.asarray(n, dtype=np.float64) - 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = r * np.sqrt(df / np.clip(1.0 - r * r, 1e-300, None))
+        p = 2 * stats.t.sf(np.abs(t), df)
+    p[~np.isfinite(r) | (df <= 0)] = np.nan
+    return np.clip(p, 0.0, 1.0)
+
+
+def matrix_to_list(matrix, digits=4):
+    """将矩阵转换为可JSON序列化的嵌套列表，NaN转换为None"""
+    matrix = np.round(np.asarray(matrix, dtype=np.float64), digits)
+    return [[None if np.isnan(value) else float(value) for value in row] for row in matrix]
+
+
+def _fft_lagged_sums(a, b, max_lag, size):
+    """
+    用FFT计算 S(k) = Σ_t a[t]·b[t+k]，k取-max_lag..max_lag
+
+    参数:
+        a, b: 等长数组
+        max_lag: 最大滞后
+        size: FFT长度（不小于2n，避免循环卷积回绕）
+
+    返回:
+        长度为2*max_lag+1的数组，依次对应滞后-max_lag..max_lag
+    """
+    circular = np.fft.irfft(np.conj(np.fft.rfft(a, size)) * np.fft.rfft(b, size), size)
+    return np.concatenate((circular[size - max_lag:], circular[:max_lag + 1]))
+
+
+def lagged_cross_correlation(x, y, max_lag, min_periods=3):
+    """
+    计算两条对齐序列在每个滞后上的皮尔逊相关系数（FFT实现，O(n log n)）
+
+    滞后k表示比较x[t]与y[t+k]，k>0即x领先y。缺失值（NaN）在每个滞后上成对删除，
+    各滞后的计数和各阶和均通过FFT互相关一次得到。
+
+    参数:
+        x, y: 同一规则时间网格上的等长序列，缺失为NaN
+        max_lag: 最大滞后（正负对称）
+        min_periods: 每个滞后所需的最少成对样本数
+
+    返回:
+        字典，包含 lags、r、n、p_value 数组
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    length = x.size
+    max_lag = int(max(0, min(max_lag, length - 1)))
+
+    mx = ~np.isnan(x)
+    my = ~np.isnan(y)
+
+    # 中心化减小舍入误差
+    x0 = np.where(mx, x - np.nanmean(x), 0.0) if mx.any() else np.zeros(length)
+    y0 = np.where(my, y - np.nanmean(y), 0.0) if my.any() else np.zeros(length)
+    mx = mx.astype(np.float64)
+    my = my.astype(np.float64)
+
+    size = 1 << int(np.ceil(np.log2(max(2 * length, 2))))
+    n = np.rint(_fft_lagged_sums(mx, my, max_lag, size))
+    sx = _fft_lagged_sums(x0, my, max_lag, size)
+    sy = _fft_lagged_sums(mx, y0, max_lag, size)
+    sxx = _fft_lagged_sums(x0 * x0, my, max_lag, size)
+    syy = _fft_lagged_sums(mx, y0 * y0, max_lag, size)
+    sxy = _fft_lagged_sums(x0, y0, max_lag, size)
+
+    var_x = n * sxx - sx * sx
+    var_y = n * syy - sy * sy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = (n * sxy - sx * sy) / np.sqrt(var_x * var_y)
+
+    # FFT舍入误差可能使方差出现极小的正负值，按相对阈值判定为常数序列
+    scale = np.maximum(n * sxx, 1e-300)
+    invalid = (n < min_periods) | (var_x <= 1e-9 * scale) | (var_y <= 1e-9 * np.maximum(n * syy, 1e-300))
+    r[invalid] = np.nan
+    r = np.clip(r, -1.0, 1.0)
+
+    return {
+        'lags': np.arange(-max_lag, max_lag + 1),
+        'r': r,
+        'n': n.astype(np.int64),
+        'p_value': correlation_pvalues(r, n)
+    }
+
+
+def peak_lag(result):
+    """
+    找出相关系数绝对值最大的滞后，并给出多重比较（Bonferroni）校正后的p值
+
+    参数:
+        result: lagged_cross_correlation的返回值
+
+    返回:
+        字典（lag、r、n、p_value、p_value_adjusted），没有有效滞后时返回None
+    """
+    r = result['r']
+    valid = ~np.isnan(r)
+    if not valid.any():
+        return None
+
+    i = int(np.nanargmax(np.abs(r)))
+    p_value = float(result['p_value'][i])
+    tested = int(valid.sum())
+    return {
+        'lag': int(result['lags'][i]),
+        'r': float(r[i]),
+        'n': int(result['n'][i]),
+        'p_value': p_value,
+        'p_value_adjusted': min(1.0, p_value * tested),
+        'lags_tested': tested
+    }
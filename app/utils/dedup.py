@@ -0,0 +1,137 @@
+import numpy as np
+
+# 默认数据源优先级（按顺序匹配数据源名称，不区分大小写），与健康App一致：手表优先于手机
+DEFAULT_SOURCE_PRIORITY = ['Watch', 'iPhone']
+
+
+def rank_sources(source_names, priority=None):
+    """
+    根据数据源优先级为每条样本分配优先级序号
+
+    参数:
+        source_names: 每条样本的数据源名称序列
+        priority: 数据源名称关键字列表，越靠前优先级越高；未匹配的数据源排在最后
+
+    返回:
+        int32数组，0表示最高优先级；每个不同的数据源都有自己唯一的序号
+    """
+    if priority is None:
+        priority = DEFAULT_SOURCE_PRIORITY
+
+    names = np.asarray([str(name) if name is not None else '' for name in source_names], dtype=object)
+    if names.size == 0:
+        return np.empty(0, dtype=np.int32)
+
+    uniques, inverse = np.unique(names, return_inverse=True)
+
+    # 每个数据源匹配到的第一个关键字位置
+    keywords = [str(keyword).lower() for keyword in priority]
+    matched = []
+    for name in uniques:
+        lowered = name.lower()
+        position = len(keywords)
+        for i, keyword in enumerate(keywords):
+            if keyword and keyword in lowered:
+                position = i
+                break
+        matched.append(position)
+
+    # 同一关键字下按名称排序，保证每个数据源的序号唯一且稳定
+    order = sorted(range(len(uniques)), key=lambda i: (matched[i], uniques[i]))
+    unique_ranks = np.empty(len(uniques), dtype=np.int32)
+    unique_ranks[order] = np.arange(len(uniques), dtype=np.int32)
+
+    return unique_ranks[inverse]
+
+
+def _merge_intervals(starts, ends):
+    """将区间排序并合并为互不重叠的区间（sort-merge）"""
+    if starts.size == 0:
+        return starts, ends
+
+    order = np.argsort(starts, kind='mergesort')
+    starts = starts[order]
+    ends = ends[order]
+
+    # 运行中的最大结束时间；开始时间超过之前最大结束时间的位置即为新区间的起点
+    running_end = np.maximum.accumulate(ends)
+    new_group = np.empty(starts.size, dtype=bool)
+    new_group[0] = True
+    new_group[1:] = starts[1:] > running_end[:-1]
+
+    first = np.flatnonzero(new_group)
+    last = np.append(first[1:] - 1, starts.size - 1)
+
+    return starts[first], running_end[last]
+
+
+def _covered_length(cov_starts, cov_ends, starts, ends):
+    """计算每个区间[start, end)被已合并覆盖区间覆盖的长度"""
+    lengths = cov_ends - cov_starts
+    cumulative = np.concatenate(([0.0], np.cumsum(lengths)))
+
+    def covered_until(t):
+        # t之前被覆盖的总长度
+        i = np.searchsorted(cov_starts, t, side='right') - 1
+        safe = np.clip(i, 0, None)
+        partial = np.clip(t - cov_starts[safe], 0, lengths[safe])
+        return np.where(i < 0, 0.0, cumulative[safe] + partial)
+
+    return covered_until(ends) - covered_until(starts)
+
+
+def _point_covered(cov_starts, cov_ends, points):
+    """判断时间点是否落在已合并的覆盖区间内"""
+    i = np.searchsorted(cov_starts, points, side='right') - 1
+    safe = np.clip(i, 0, None)
+    return (i >= 0) & (points < cov_ends[safe])
+
+
+def deduplicate_intervals(starts, ends, values, ranks):
+    """
+    按数据源优先级消除重叠累计样本（步数、距离等）的重复计数
+
+    从最高优先级开始逐级处理：每一级的样本只保留未被更高优先级样本覆盖的部分，
+    部分重叠的样本按未覆盖时长的比例折算数值。
+
+    参数:
+        starts: 样本开始时间（数值，如UTC秒）
+        ends: 样本结束时间，与starts等长
+        values: 样本数值
+        ranks: 每条样本的优先级序号（见rank_sources），0为最高
+
+    返回:
+        去重后的数值数组（float64），完全被覆盖的样本数值为0
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.maximum(np.asarray(ends, dtype=np.float64), starts)
+    values = np.asarray(values, dtype=np.float64)
+    ranks = np.asarray(ranks)
+
+    adjusted = values.copy()
+    cov_starts = np.empty(0, dtype=np.float64)
+    cov_ends = np.empty(0, dtype=np.float64)
+
+    for rank in np.unique(ranks):
+        idx = np.flatnonzero(ranks == rank)
+        s = starts[idx]
+        e = ends[idx]
+
+        if cov_starts.size:
+            lengths = e - s
+            has_length = lengths > 0
+            covered = _covered_length(cov_starts, cov_ends, s, e)
+            fraction = np.where(
+                has_length,
+                covered / np.where(has_length, lengths, 1.0),
+                _point_covered(cov_starts, cov_ends, s).astype(np.float64)
+            )
+            adjusted[idx] *= 1.0 - np.clip(fraction, 0.0, 1.0)
+
+        # 将本级样本并入覆盖区间
+        cov_starts, cov_ends = _merge_intervals(
+            np.concatenate((cov_starts, s)),
+            np.concatenate((cov_ends, e))
+        )
+
+    return adjusted
@@ -0,0 +1,122 @@
+import numpy as np
+
+from app.utils.kernels import segment_bounds
+
+# 折线图每条曲线默认的最大点数
+DEFAULT_MAX_POINTS = 2000
+# 支持的降采样方法
+DOWNSAMPLING_METHODS = ('lttb', 'minmax')
+
+
+def lttb(x, y, n_out):
+    """
+    最大三角形三桶算法（Largest-Triangle-Three-Buckets）
+
+    首尾点保留，中间的点按x顺序均分为n_out-2个桶，每个桶选出与上一个已选点、
+    下一个桶的均值点构成的三角形面积最大的点。峰值和谷值形成的三角形面积大，因此会被保留。
+    各桶的均值一次向量化计算，逐桶循环内只做numpy运算。
+
+    参数:
+        x: 升序的数值横坐标（如时间戳秒数）
+        y: 纵坐标，不能包含NaN
+        n_out: 输出点数
+
+    返回:
+        选中点的下标数组（升序）
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = x.size
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])
+
+    # 中间点的桶边界（桶i为[edges[i], edges[i+1])）
+    edges = np.floor(np.linspace(1, n - 1, n_out - 1)).astype(np.int64)
+    edges[-1] = n - 1
+
+    # 每个桶的均值点，最后补上末点作为最后一个桶的“下一个桶”
+    counts = np.diff(edges)
+    sum_x = np.add.reduceat(x[:-1], edges[:-1]) if counts.size else np.empty(0)
+    sum_y = np.add.reduceat(y[:-1], edges[:-1]) if counts.size else np.empty(0)
+    avg_x = np.append(sum_x / counts, x[-1])
+    avg_y = np.append(sum_y / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        ax, ay = x[previous], y[previous]
+        cx, cy = avg_x[i + 1], avg_y[i + 1]
+        # 三角形面积的两倍（省略常数因子不影响比较）
+        areas = np.abs((ax - cx) * (y[start:end] - ay) - (ax - x[start:end]) * (cy - ay))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+
+    return selected
+
+
+def minmax(x, y, n_out):
+    """
+    按像素列取最小/最大值的降采样
+
+    将x范围均分为n_out//2列，每列保留最小值和最大值所在的点（以及全局首尾点），
+    保证任意缩放比例下极值都可见。列号随x单调，只需分段归约，不需要排序。
+
+    参数:
+        x: 升序的数值横坐标
+        y: 纵坐标，不能包含NaN
+        n_out: 最大输出点数
+
+    返回:
+        选中点的下标数组（升序）
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = x.size
+    if n_out >= n:
+        return np.arange(n)
+
+    columns = max(1, (n_out - 2) // 2)
+    span = x[-1] - x[0]
+    if span > 0:
+        bins = np.minimum(((x - x[0]) * columns / span).astype(np.int64), columns - 1)
+    else:
+        bins = np.zeros(n, dtype=np.int64)
+
+    # x升序，列号也升序：按列分段归约出极值，再取每列第一个等于极值的点
+    _, starts, counts = segment_bounds(bins)
+    column_of = np.repeat(np.arange(starts.size), counts)
+    extremes = [np.array([0, n - 1])]
+    for reduce in (np.minimum, np.maximum):
+        hits = np.flatnonzero(y == reduce.reduceat(y, starts)[column_of])
+        _, first = np.unique(column_of[hits], return_index=True)
+        extremes.append(hits[first])
+    return np.unique(np.concatenate(extremes))
+
+
+def downsample(x, y, max_points=DEFAULT_MAX_POINTS, method='lttb'):
+    """
+    将一条折线降采样到至多max_points个点，返回选中点的下标
+
+    参数:
+        x: 升序的横坐标（数值或datetime64，datetime64按纳秒数计算）
+        y: 纵坐标，不能包含NaN
+        max_points: 最大点数
+        method: 'lttb'（保持形状）或'minmax'（每个像素列保留极值）
+
+    返回:
+        下标数组（升序）
+    """
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype(np.int64)
+
+    if method == 'lttb':
+        return lttb(x, y, max_points)
+    if method == 'minmax':
+        return minmax(x, y, max_points)
+    raise ValueError(f"不支持的降采样方法: {method}")
@@ -0,0 +1,209 @@
+import base64
+import datetime
+import functools
+import json
+import math
+import sys
+
+import numpy as np
+from jinja2.utils import htmlsafe_json_dumps
+
+# numpy类型 -> plotly.js类型化数组的dtype代码（plotly.js 2.28+支持{dtype, bdata}编码）
+TYPED_ARRAY_DTYPES = {
+    'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+    'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8'
+}
+
+# 与make_subplots默认一致的子图间距（总间距分摊到行数、列数）
+DEFAULT_VERTICAL_SPACING = 0.3
+DEFAULT_HORIZONTAL_SPACING = 0.2
+
+
+@functools.lru_cache(maxsize=1)
+def default_template():
+    """当前plotly默认模板的字典形式（只生成一次，保持与plotly.express图表相同的外观）"""
+    import plotly.io as pio
+    return pio.templates[pio.templates.default].to_plotly_json()
+
+
+def typed_array(values):
+    """
+    将数值数组编码为plotly.js的类型化数组（base64编码的小端二进制）
+
+    int64/bool等plotly.js不支持的类型在可表示时转换为int32，否则转换为float64；
+    多维数组（如热力图的z）附带shape。
+    """
+    array = np.asarray(values)
+    name = array.dtype.name
+    if name not in TYPED_ARRAY_DTYPES:
+        if array.dtype.kind in 'iub' and (array.size == 0 or (array.min() >= -2**31 and array.max() < 2**31)):
+            array = array.astype(np.int32)
+        else:
+            array = array.astype(np.float64)
+        name = array.dtype.name
+
+    array = np.ascontiguousarray(array)
+    if sys.byteorder != 'little':
+        array = array.byteswap()
+
+    spec = {'dtype': TYPED_ARRAY_DTYPES[name], 'bdata': base64.b64encode(array.tobytes()).decode('ascii')}
+    if array.ndim > 1:
+        spec['shape'] = ', '.join(str(size) for size in array.shape)
+    return spec
+
+
+def _encode_value(value):
+    """json.dumps的default钩子：处理numpy数组、numpy标量、日期和pandas对象"""
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in 'iufb':
+            return typed_array(value)
+        if value.dtype.kind == 'M':
+            # 日期时间以ISO字符串输出（向量化转换）
+            return np.datetime_as_string(value).tolist()
+        return value.tolist()
+    if isinstance(value, np.generic):
+        item = value.item()
+        return None if isinstance(item, float) and not math.isfinite(item) else item
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if hasattr(value, 'to_numpy'):
+        return _encode_value(value.to_numpy())
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def encode_figure(figure):
+    """
+    将由字典和numpy数组组成的图表规格一次性序列化为JSON文本
+
+    数值数组以类型化数组输出，不经过逐元素的列表转换；输出转义了<、>、&和单引号，
+    可以直接作为JSON响应，也可以嵌入页面的<script>中。
+    """
+    return str(htmlsafe_json_dumps(figure, default=_encode_value, separators=(',', ':')))
+
+
+def _decode_value(value):
+    """json.loads的object_hook：将类型化数组还原为numpy数组"""
+    if 'bdata' in value and 'dtype' in value and set(value) <= {'bdata', 'dtype', 'shape'}:
+        array = np.frombuffer(base64.b64decode(value['bdata']), dtype=np.dtype('<' + value['dtype']))
+        if 'shape' in value:
+            array = array.reshape([int(size) for size in value['shape'].split(',')])
+        return array
+    return value
+
+
+def decode_figure(text):
+    """解析encode_figure输出的JSON文本，类型化数组还原为numpy数组（日期仍为ISO字符串）"""
+    return json.loads(text, object_hook=_decode_value)
+
+
+def figure(data, layout):
+    """组装图表字典（附带默认模板）"""
+    return {'data': data, 'layout': {'template': default_template(), **layout}}
+
+
+def hrect(y0, y1, color, text, position):
+    """
+    水平区间背景及其标注（与plotly的add_hrect相同的结构）
+
+    参数:
+        y0, y1: 区间上下界
+        color: 填充颜色
+        text: 标注文字
+        position: 标注位置，'top right'、'top left'或'bottom left'
+
+    返回:
+        (shape字典, annotation字典)
+    """
+    shape = {
+        'type': 'rect', 'xref': 'x domain', 'yref': 'y',
+        'x0': 0, 'x1': 1, 'y0': y0, 'y1': y1,
+        'fillcolor': color, 'opacity': 0.1, 'layer': 'below', 'line': {'width': 0}
+    }
+    vertical, horizontal = position.split()
+    annotation = {
+        'text': text, 'showarrow': False,
+        'xref': 'x domain', 'yref': 'y',
+        'x': 1 if horizontal == 'right' else 0, 'xanchor': horizontal,
+        'y': y1 if vertical == 'top' else y0, 'yanchor': vertical
+    }
+    return shape, annotation
+
+
+def hline(y, color, text, dash='dash'):
+    """
+    水平参考线及其右上角标注（与plotly的add_hline相同的结构）
+
+    返回:
+        (shape字典, annotation字典)
+    """
+    shape = {
+        'type': 'line', 'xref': 'x domain', 'yref': 'y',
+        'x0': 0, 'x1': 1, 'y0': y, 'y1': y,
+        'line': {'color': color, 'dash': dash}
+    }
+    annotation = {
+        'text': text, 'showarrow': False, 'xref': 'x domain', 'yref': 'y',
+        'x': 1, 'xanchor': 'right', 'y': y, 'yanchor': 'bottom'
+    }
+    return shape, annotation
+
+
+def subplot_grid(rows, cols, titles=(), vertical_spacing=None, horizontal_spacing=None, row_heights=None):
+    """
+    计算网格子图的坐标轴布局（与make_subplots相同的域划分，但不构造和校验Figure对象）
+
+    子图按行优先编号，第1个使用x/y轴，第n个使用xn/yn轴。
+
+    参数:
+        rows, cols: 行数和列数
+        titles: 各子图标题（行优先，空字符串表示无标题）
+        vertical_spacing, horizontal_spacing: 子图间距（占整个图的比例），默认与make_subplots相同
+        row_heights: 各行的相对高度（自上而下），默认等高
+
+    返回:
+        (布局字典，包含各坐标轴和标题标注, 每个子图的坐标轴后缀列表)
+    """
+    if vertical_spacing is None:
+        vertical_spacing = DEFAULT_VERTICAL_SPACING / rows
+    if horizontal_spacing is None:
+        horizontal_spacing = DEFAULT_HORIZONTAL_SPACING / cols
+
+    width = (1 - horizontal_spacing * (cols - 1)) / cols
+    available = 1 - vertical_spacing * (rows - 1)
+    row_heights = [1] * rows if row_heights is None else row_heights
+    heights = [available * h / sum(row_heights) for h in row_heights]
+
+    layout = {'annotations': []}
+    suffixes = []
+    for row in range(rows):
+        height = heights[row]
+        y1 = 1 - sum(heights[:row]) - row * vertical_spacing
+        for col in range(cols):
+            index = row * cols + col + 1
+            suffix = '' if index == 1 else str(index)
+            suffixes.append(suffix)
+
+            x0 = col * (width + horizontal_spacing)
+            layout[f'xaxis{suffix}'] = {'anchor': f'y{suffix}', 'domain': [x0, x0 + width]}
+            layout[f'yaxis{suffix}'] = {'anchor': f'x{suffix}', 'domain': [max(y1 - height, 0), y1]}
+
+            title = titles[index - 1] if index - 1 < len(titles) else ''
+            if title:
+                layout['annotations'].append({
+                    'text': title, 'showarrow': False, 'font': {'size': 16},
+                    'xref': 'paper', 'yref': 'paper', 'x': x0 + width / 2, 'y': y1,
+                    'xanchor': 'center', 'yanchor': 'bottom'
+                })
+    return layout, suffixes
+
+
+def cell_domain(layout, suffix):
+    """
+    将网格中的一个子图改为不使用坐标轴的图表（如饼图）：移除该子图的坐标轴
+
+    返回:
+        该子图区域对应的trace domain字典
+    """
+    xaxis = layout.pop(f'xaxis{suffix}')
+    yaxis = layout.pop(f'yaxis{suffix}')
+    return {'x': xaxis['domain'], 'y': yaxis['domain']}
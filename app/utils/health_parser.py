@@ -1,5 +1,4 @@
 import os
-import pandas as pd
 import numpy as np
 import zipfile
 import xml.etree.ElementTree as ET
@@ -9,16 +8,79 @@ from datetime import datetime, timezone
 import shutil
 import csv
 import traceback
+from itertools import compress
+from app.utils.dedup import DEFAULT_SOURCE_PRIORITY, rank_sources, deduplicate_intervals
+from app.utils.kernels import segment_stats
+from app.utils.timekeys import (
+    parse_timestamps, days_to_iso, days_to_dates, bucket_keys, GRANULARITIES, timestamp_to_utc_seconds,
+    prefilter_since
+)
+from app.utils.running_stats import RunningStats, merge_stats
+from app.utils.sketches import QuantileSketches, load_sketches, save_sketches
+from app.utils.profiles import weekday_profile
+from app.utils.lazy import lazy_module
+
+# pandas在首次使用时才导入（缩短应用启动时间）
+pd = lazy_module('pandas')
+
+# 累计型数据的类型关键字（按时间桶求和而不是求平均）
+CUMULATIVE_TYPE_KEYWORDS = [
+    'StepCount', 'Distance', 'EnergyBurned', 'FlightsClimbed',
+    'AppleExerciseTime', 'AppleStandTime', 'steps', 'distance'
+]
+
+# 心率类型
+HEART_RATE_TYPES = [
+    'HKQuantityTypeIdentifierHeartRate',
+    'com.apple.health.type.quantity.heartrate',
+    'HeartRate'
+]
+
+# 步数类型
+STEP_COUNT_TYPES = [
+    'HKQuantityTypeIdentifierStepCount',
+    'com.apple.health.type.quantity.steps',
+    'StepCount'
+]
+
+# 睡眠分析类型（按持续时间汇总）
+SLEEP_TYPES = [
+    'HKCategoryTypeIdentifierSleepAnalysis',
+    'com.apple.health.type.category.sleep',
+    'SleepAnalysis'
+]
+
+# 导入时为每个测量型类型构建分位数摘要的时间粒度
+SKETCH_GRANULARITIES = ('day', 'hour')
+
+
+def is_cumulative_type(data_type):
+    """判断数据类型是否为累计型（步数、距离、能量等）"""
+    return any(keyword in data_type for keyword in CUMULATIVE_TYPE_KEYWORDS) or data_type in SLEEP_TYPES
+
 
 class HealthDataParser:
     """Apple健康数据解析类"""
     
-    def __init__(self):
-        """初始化解析器"""
+    def __init__(self, source_priority=None):
+        """
+        初始化解析器
+        
+        参数:
+            source_priority: 累计型数据（步数、距离）去重时的数据源优先级关键字列表，
+                             默认为DEFAULT_SOURCE_PRIORITY（手表优先于手机）
+        """
         self.records = []  # 所有健康记录
         self.record_types = {}  # 记录类型映射
         self.xml_root = None  # XML根元素
         self.temp_dirs = []  # 临时目录列表，用于清理
+        self.source_priority = source_priority or DEFAULT_SOURCE_PRIORITY  # 数据源优先级
+        self.sample_cache = {}  # 按类型缓存的列式样本（含本地日编号）
+        self.cumulative_cache = {}  # 去重后的累计型数据缓存
+        self.rollup_cache = {}  # 按时间桶汇总的统计缓存
+        self.running_stats = {}  # 解析时逐条更新的各类型在线统计（类型 -> RunningStats）
+        self.sketch_cache = {}  # 按时间桶构建的分位数摘要缓存
+        self.sketch_store = None  # 分位数摘要的持久化位置(目录, 数据集版本)，见use_sketch_store
     
     def clean_up(self):
         """清理临时文件和目录"""
@@ -27,21 +89,25 @@ class HealthDataParser:
                 shutil.rmtree(temp_dir)
         self.temp_dirs = []
     
-    def extract_from_zip(self, zip_path):
+    def extract_from_zip(self, zip_path, extract_dir=None):
         """
         从ZIP文件中提取Apple健康导出的XML文件
         
         参数:
             zip_path: ZIP文件路径
+            extract_dir: 提取到的目录，默认为临时目录（clean_up时删除）
             
         返回:
             提取的XML文件路径或None（如果未找到）
         """
         try:
-            # 创建临时目录
-            import tempfile
-            extract_dir = tempfile.mkdtemp()
-            self.temp_dirs.append(extract_dir)
+            if extract_dir is None:
+                # 创建临时目录
+                import tempfile
+                extract_dir = tempfile.mkdtemp()
+                self.temp_dirs.append(extract_dir)
+            else:
+                os.makedirs(extract_dir, exist_ok=True)
             
             # 提取ZIP文件
             with zipfile.ZipFile(zip_path, 'r') as zip_ref:
@@ -78,6 +144,7 @@ class HealthDataParser:
             # 解析XML文件
             # 注意：Apple健康导出的XML文件可能非常大，使用迭代解析
             print(f"开始解析XML文件: {xml_path}")
+            stats = {}
             
             # 使用迭代器解析大型XML文件
             for event, elem in ET.iterparse(xml_path, events=('end',)):
@@ -92,10 +159,12 @@ class HealthDataParser:
                         if record_type not in self.record_types:
                             self.record_types[record_type] = []
                         self.record_types[record_type].append(record)
+                        self._accumulate(stats, record_type, record)
                 
                 # 清除元素以节省内存
                 elem.clear()
             
+            merge_stats(self.running_stats, stats)
             print(f"XML解析完成，共获取{len(self.records)}条记录，{len(self.record_types)}种类型")
             return len(self.records) > 0
         except Exception as e:
@@ -154,6 +223,7 @@ class HealthDataParser:
                 try:
                     with open(json_file, 'r', encoding='utf-8') as f:
                         data = json.load(f)
+                        stats = {}
                         
                         # 检查是否是健康记录JSON格式
                         if isinstance(data, list):
@@ -167,6 +237,9 @@ class HealthDataParser:
                                         if record_type not in self.record_types:
                                             self.record_types[record_type] = []
                                         self.record_types[record_type].append(record)
+                                        self._accumulate(stats, record_type, record)
+                        
+                        merge_stats(self.running_stats, stats)
                 except Exception as e:
                     print(f"解析JSON文件 {json_file} 时出错: {str(e)}")
                     continue
@@ -209,6 +282,7 @@ class HealthDataParser:
                     if has_health_columns:
                         # 转换为字典记录列表
                         records = df.to_dict('records')
+                        stats = {}
                         
                         for record in records:
                             # 确保记录有type字段
@@ -221,6 +295,9 @@ class HealthDataParser:
                                     if record_type not in self.record_types:
                                         self.record_types[record_type] = []
                                     self.record_types[record_type].append(record)
+                                    self._accumulate(stats, record_type, record)
+                        
+                        merge_stats(self.running_stats, stats)
                 except Exception as e:
                     print(f"解析CSV文件 {csv_file} 时出错: {str(e)}")
                     continue
@@ -231,6 +308,51 @@ class HealthDataParser:
             traceback.print_exc()
             return False
     
+    def _accumulate(self, stats, record_type, record):
+        """
+        在解析循环中用一条记录更新对应类型的在线统计
+        
+        参数:
+            stats: 类型 -> RunningStats 字典（当前文件的局部累加器）
+            record_type: 记录类型
+            record: 记录字典
+        """
+        accumulator = stats.get(record_type)
+        if accumulator is None:
+            accumulator = stats[record_type] = RunningStats()
+        
+        value = next((record[f] for f in ('value', 'Value', '值', '数值') if record.get(f)), None)
+        try:
+            value = float(value) if value is not None else None
+        except (TypeError, ValueError):
+            value = None
+        if value is not None and not np.isfinite(value):
+            value = None
+        
+        start = next((record[f] for f in ('startDate', 'endDate', 'date', '日期', 'Start', 'End') if record.get(f)), None)
+        end = record.get('endDate') or record.get('End')
+        accumulator.update(
+            value,
+            timestamp_to_utc_seconds(start),
+            timestamp_to_utc_seconds(end) if end else None
+        )
+    
+    def get_running_stats(self, type_names):
+        """
+        获取解析时累积的在线统计（O(1)，不构造DataFrame）
+        
+        参数:
+            type_names: 类型字符串列表（同一指标的多个别名），各别名的统计会合并
+            
+        返回:
+            RunningStats，没有任何记录时返回None
+        """
+        merged = None
+        for type_name in type_names:
+            if type_name in self.running_stats:
+                merged = (merged or RunningStats()).merge(self.running_stats[type_name])
+        return merged
+    
     def get_all_data_types(self):
         """获取所有可用的数据类型"""
         return list(self.record_types.keys())
@@ -261,11 +383,16 @@ class HealthDataParser:
             # 将记录列表转换为 DataFrame
             df = pd.DataFrame(records)
             
-            # 确保日期列是 datetime 类型
+            # 日期列统一解析为记录本地的墙钟时间
             for col in df.columns:
                 if col.lower() in ['startdate', 'enddate', 'date', '日期', 'start', 'end']:
                     try:
-                        df[col] = pd.to_datetime(df[col], errors='coerce')
+                        parsed = parse_timestamps(df[col].tolist())
+                        df[col] = parsed['local'].astype('datetime64[ns]')
+                        # 以开始时间的本地日编号和当日分钟数作为聚合键
+                        if col.lower() in ['startdate', 'date', '日期', 'start'] and 'local_day' not in df.columns:
+                            df['local_day'] = parsed['local_day']
+                            df['minute'] = parsed['minute']
                     except:
                         pass
             
@@ -367,147 +494,462 @@ class HealthDataParser:
         
         return value
     
-    def get_step_count_data(self):
+    def get_samples(self, type_names, numeric=True, since_day=None):
         """
-        获取步数数据
+        获取指定类型的样本（列式），每条样本都带有根据其自身UTC偏移计算的本地日编号和当日分钟数
+        
+        时间解析在首次获取时一次性向量化完成，结果按类型缓存，后续所有按日聚合都基于整数键local_day。
+        给出since_day时，窗口条件在解析之前先按日期字符串前缀粗筛记录，时间解析和数值转换只处理窗口内的记录，
+        解析后再按local_day精确过滤；已缓存完整历史时直接从中截取。
         
+        参数:
+            type_names: 类型字符串列表（同一指标的多个别名）
+            numeric: 是否将value转换为数值并丢弃无法转换的样本
+            since_day: 只保留本地日编号不早于该值的样本，None表示全部历史
+            
         返回:
-            包含步数数据的DataFrame
+            DataFrame，列包括：
+            ['startDate', 'endDate', 'startUtc', 'endUtc', 'local_day', 'minute', 'value', 'sourceName']
+            其中startDate/endDate为记录本地的墙钟时间，startUtc/endUtc为UTC时间
         """
-        try:
-            # 步数相关的类型
-            step_types = [
-                'HKQuantityTypeIdentifierStepCount',
-                'com.apple.health.type.quantity.steps',
-                'StepCount'
-            ]
+        cache_key = (tuple(type_names), numeric, since_day)
+        if cache_key in self.sample_cache:
+            return self.sample_cache[cache_key].copy()
+        
+        full_key = (tuple(type_names), numeric, None)
+        if since_day is not None and full_key in self.sample_cache:
+            full = self.sample_cache[full_key]
+            return full[full['local_day'] >= since_day].reset_index(drop=True)
+        
+        # 收集所有记录
+        records = []
+        for type_name in type_names:
+            if type_name in self.record_types:
+                records.extend(self.record_types[type_name])
+        
+        if not records:
+            return pd.DataFrame()
+        
+        # 按与_extract_date/_extract_value相同的字段顺序提取原始值
+        start_fields = ['startDate', 'endDate', 'date', '日期', 'Start', 'End']
+        value_fields = ['value', 'Value', '值', '数值']
+        start_raw = [next((record[f] for f in start_fields if record.get(f)), None) for record in records]
+        
+        # 窗口谓词下推：解析时间和转换数值之前，先按日期字符串前缀去掉一定在窗口之外的记录
+        if since_day is not None:
+            in_window = prefilter_since(start_raw, since_day)
+            if not in_window.all():
+                records = list(compress(records, in_window))
+                start_raw = list(compress(start_raw, in_window))
+        
+        end_raw = [record.get('endDate') or record.get('End') for record in records]
+        values = [next((record[f] for f in value_fields if record.get(f)), None) for record in records]
+        sources = [record.get('sourceName') or record.get('source') or '' for record in records]
+        
+        # 向量化解析时间
+        start = parse_timestamps(start_raw)
+        end = parse_timestamps(end_raw)
+        
+        df = pd.DataFrame({
+            'startDate': start['local'].astype('datetime64[ns]'),
+            'endDate': end['local'].astype('datetime64[ns]'),
+            'startUtc': start['utc'].astype('datetime64[ns]'),
+            'endUtc': end['utc'].astype('datetime64[ns]'),
+            'local_day': start['local_day'],
+            'minute': start['minute'],
+            'value': pd.to_numeric(pd.Series(values, dtype=object), errors='coerce') if numeric else values,
+            'sourceName': sources
+        })
+        
+        # 丢弃时间无效（以及数值无效）的样本，以及窗口外的样本
+        keep = start['valid']
+        if since_day is not None:
+            keep = keep & (start['local_day'] >= since_day)
+        if numeric:
+            keep = keep & df['value'].notna().to_numpy()
+        df = df[keep]
+        
+        # 按UTC时间排序
+        df = df.sort_values('startUtc', kind='mergesort').reset_index(drop=True)
+        
+        self.sample_cache[cache_key] = df
+        return df.copy()
+    
+    def _attach_local_day(self, df, column):
+        """
+        将原始时间字符串列解析为本地墙钟时间，并添加local_day和minute列
+        
+        参数:
+            df: DataFrame
+            column: 原始时间字符串所在的列名
             
-            # 收集所有步数记录
-            step_records = []
-            for type_name in step_types:
-                if type_name in self.record_types:
-                    step_records.extend(self.record_types[type_name])
+        返回:
+            去除了无效时间记录的DataFrame
+        """
+        parsed = parse_timestamps(df[column].tolist())
+        df[column] = parsed['local'].astype('datetime64[ns]')
+        df['local_day'] = parsed['local_day']
+        df['minute'] = parsed['minute']
+        return df[parsed['valid']]
+    
+    def _get_cumulative_data(self, type_names, since_day=None):
+        """
+        获取累计型数据（步数、距离等），并按数据源优先级去除重叠样本
+        
+        参数:
+            type_names: 该数据的类型字符串列表
+            since_day: 只处理本地日编号不早于该值的样本（去重也只在窗口内进行）
             
-            if not step_records:
-                return pd.DataFrame()
+        返回:
+            去重后的样本DataFrame（列同get_samples）
+        """
+        cache_key = (tuple(type_names), since_day)
+        if cache_key in self.cumulative_cache:
+            return self.cumulative_cache[cache_key].copy()
+        
+        full_key = (tuple(type_names), None)
+        if since_day is not None and full_key in self.cumulative_cache:
+            full = self.cumulative_cache[full_key]
+            return full[full['local_day'] >= since_day].reset_index(drop=True)
+        
+        df = self.get_samples(type_names, since_day=since_day)
+        if df.empty:
+            return df
+        
+        # 按数据源优先级去除重叠样本
+        df = self._deduplicate_cumulative(df)
+        
+        self.cumulative_cache[cache_key] = df
+        return df.copy()
+    
+    def _deduplicate_cumulative(self, df):
+        """
+        按数据源优先级消除重叠的累计样本，部分重叠的样本按比例折算
+        
+        参数:
+            df: get_samples返回的DataFrame
             
-            # 提取每条记录的日期和步数值
-            data = []
-            for record in step_records:
-                date = self._extract_date(record)
-                value = self._extract_value(record)
-                
-                if date is not None and value is not None:
-                    try:
-                        value = float(value)
-                        data.append({
-                            'startDate': date,
-                            'value': value
-                        })
-                    except:
-                        continue
+        返回:
+            去重后的DataFrame（完全被覆盖的样本被移除）
+        """
+        starts = df['startUtc'].to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+        ends = df['endUtc'].fillna(df['startUtc']).to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+        values = df['value'].to_numpy(dtype=float)
+        
+        ranks = rank_sources(df['sourceName'].to_numpy(), self.source_priority)
+        adjusted = deduplicate_intervals(starts, ends, values, ranks)
+        
+        df = df.assign(value=adjusted)
+        
+        # 移除被更高优先级数据源完全覆盖的样本
+        removed = (adjusted == 0) & (values != 0)
+        if removed.any():
+            print(f"数据源去重：移除了 {int(removed.sum())} 条被完全覆盖的样本")
+            df = df[~removed].reset_index(drop=True)
+        
+        return df
+    
+    def _daily_sum(self, samples, column, label):
+        """按本地日编号对样本求和，返回['日期', label]两列的DataFrame"""
+        daily = segment_stats(samples['local_day'].to_numpy(), samples[column].to_numpy(dtype=float))
+        return pd.DataFrame({
+            '日期': days_to_iso(daily['key']),  # 转换日期为字符串，便于JSON序列化
+            label: daily['sum']
+        })
+    
+    def _get_bucket_samples(self, data_type, since_day=None):
+        """
+        获取用于按时间汇总的样本及其数值列
+        
+        累计型数据使用去重后的样本，睡眠分析使用每段入睡状态记录的持续时间（小时）。
+        
+        参数:
+            data_type: 类型字符串，或同一数据的类型别名元组（合并所有别名的样本，累计型在别名之间去重）
+            since_day: 只获取本地日编号不早于该值的样本
+        
+        返回:
+            (带local_day和minute列的DataFrame, 数值列名)
+        """
+        type_names = [data_type] if isinstance(data_type, str) else list(data_type)
+        if any(type_name in SLEEP_TYPES for type_name in type_names):
+            return self._filter_sleep_states(self.get_sleep_analysis_data(since_day)), 'duration'
+        if is_cumulative_type(type_names[0]):
+            return self._get_cumulative_data(type_names, since_day), 'value'
+        return self.get_samples(type_names, since_day=since_day), 'value'
+    
+    def get_rollup(self, data_type, granularity='day'):
+        """
+        获取指定类型按时间桶汇总的统计（基于整数桶键的分段归约）
+        
+        累计型数据使用去重后的样本，睡眠分析使用每段入睡状态记录的持续时间（小时）。
+        
+        参数:
+            data_type: 类型字符串，或类型别名元组（如tuple(HEART_RATE_TYPES)，合并所有别名）
+            granularity: 时间粒度，'day'按本地日汇总，'hour'按本地小时汇总
             
-            if not data:
-                return pd.DataFrame()
+        返回:
+            segment_stats返回的字典（key为整数桶键，见timekeys.bucket_keys），没有数值数据时返回None
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"不支持的时间粒度: {granularity}")
+        
+        cache_key = (data_type, granularity)
+        if cache_key in self.rollup_cache:
+            return self.rollup_cache[cache_key]
+        
+        samples, column = self._get_bucket_samples(data_type)
+        
+        rollup = None
+        if not samples.empty:
+            keys = bucket_keys(samples['local_day'].to_numpy(), samples['minute'].to_numpy(), granularity)
+            rollup = segment_stats(keys, samples[column].to_numpy(dtype=float))
+            if rollup['key'].size == 0:
+                rollup = None
+        
+        self.rollup_cache[cache_key] = rollup
+        return rollup
+    
+    def get_rollup_series(self, data_type, granularity='day', agg=None):
+        """
+        获取指定类型按时间桶聚合的序列
+        
+        参数:
+            data_type: 类型字符串
+            granularity: 时间粒度
+            agg: 聚合方式（'sum'、'mean'、'min'、'max'、'count'等），默认累计型求和、其余求平均
             
-            # 创建DataFrame
-            df = pd.DataFrame(data)
+        返回:
+            (桶键数组, 数值数组)，没有数据时返回None
+        """
+        rollup = self.get_rollup(data_type, granularity)
+        if rollup is None:
+            return None
+        
+        if agg is None:
+            agg = 'sum' if is_cumulative_type(data_type) else 'mean'
+        if agg not in rollup or agg == 'key':
+            raise ValueError(f"不支持的聚合方式: {agg}")
+        
+        return rollup['key'], np.asarray(rollup[agg], dtype=float)
+
+    def get_range_samples(self, data_type, start=None, end=None):
+        """
+        获取本地时间范围[start, end)内用于按时间汇总的样本（起始日下推到样本加载，只解析范围内的记录）
+
+        参数:
+            data_type: 类型字符串
+            start: 范围起点的本地墙钟时间（datetime64），None表示不限制
+            end: 范围终点的本地墙钟时间（datetime64，不含），None表示不限制
+
+        返回:
+            (按本地时间排序的DataFrame, 数值列名)，数值列同_get_bucket_samples
+        """
+        since_day = None if start is None else int(np.datetime64(start, 'D').astype(np.int64))
+        samples, column = self._get_bucket_samples(data_type, since_day)
+        if samples.empty:
+            return samples, column
+
+        local = samples['startDate'].to_numpy(dtype='datetime64[ns]')
+        keep = ~np.isnat(local) & ~np.isnan(samples[column].to_numpy(dtype=float))
+        if start is not None:
+            keep &= local >= np.datetime64(start, 'ns')
+        if end is not None:
+            keep &= local < np.datetime64(end, 'ns')
+
+        samples = samples[keep].sort_values('startDate', kind='mergesort').reset_index(drop=True)
+        return samples, column
+
+    def get_weekday_profile(self, data_type, slot_minutes=60, since_day=None):
+        """
+        获取指定类型 星期×当日时段 的作息分布网格（见profiles.weekday_profile）
+        
+        参数:
+            data_type: 类型字符串
+            slot_minutes: 时段长度（分钟），60为7×24网格，15为7×96网格
+            since_day: 只统计本地日编号不早于该值的样本，None表示全部历史
             
-            # 确保日期是datetime类型
-            df['startDate'] = pd.to_datetime(df['startDate'])
+        返回:
+            weekday_profile返回的字典，没有数值数据时返回None
+        """
+        cache_key = (data_type, 'weekday_profile', slot_minutes, since_day)
+        if cache_key in self.rollup_cache:
+            return self.rollup_cache[cache_key]
+        
+        profile = None
+        samples, column = self._get_bucket_samples(data_type, since_day)
+        if not samples.empty:
+            profile = weekday_profile(
+                samples['local_day'].to_numpy(),
+                samples['minute'].to_numpy(),
+                samples[column].to_numpy(dtype=float),
+                slot_minutes
+            )
+            if profile['count'].sum() == 0:
+                profile = None
+        
+        self.rollup_cache[cache_key] = profile
+        return profile
+    
+    def use_sketch_store(self, directory, version):
+        """
+        设置分位数摘要的持久化位置（artifact_dir和数据集版本）
+
+        设置后第一次需要摘要时先读取已持久化的摘要；还没有持久化时为所有测量型类型构建摘要并保存，
+        同一数据集之后的请求不再重新构建。
+        """
+        self.sketch_store = (directory, version)
+
+    def prepare_quantile_sketches(self):
+        """
+        载入或构建所有测量型类型的分位数摘要（导入时调用，摘要随数据集持久化）
+
+        返回:
+            (类型, 时间粒度) -> QuantileSketches或None的字典
+        """
+        directory, version = self.sketch_store or (None, None)
+        sketches = load_sketches(directory, version)
+        if sketches is None:
+            sketches = {}
+            for data_type in self.record_types:
+                if is_cumulative_type(data_type):
+                    continue
+                for granularity in SKETCH_GRANULARITIES:
+                    sketches[(data_type, granularity)] = self._build_quantile_sketches(data_type, granularity)
+            save_sketches(directory, version, sketches)
+        
+        self.sketch_cache.update(sketches)
+        # 已持久化的摘要覆盖全部类型，之后只从缓存读取
+        self.sketch_store = None
+        return sketches
+
+    def _build_quantile_sketches(self, data_type, granularity):
+        """由样本构建单个类型的分位数摘要，没有数值数据时返回None"""
+        samples = self.get_samples([data_type])
+        if samples.empty:
+            return None
+        keys = bucket_keys(samples['local_day'].to_numpy(), samples['minute'].to_numpy(), granularity)
+        sketches = QuantileSketches.build(keys, samples['value'].to_numpy(dtype=float))
+        return sketches if sketches.keys.size else None
+
+    def get_quantile_sketches(self, data_type, granularity='day'):
+        """
+        获取指定类型按时间桶构建的可合并分位数摘要（见sketches.QuantileSketches）
+        
+        只适用于测量型数据（心率、血氧等）；累计型数据的单条样本分位数没有意义，返回None。
+        
+        参数:
+            data_type: 类型字符串
+            granularity: 时间粒度，'day'或'hour'
             
-            # 按日期排序
-            df = df.sort_values('startDate')
+        返回:
+            QuantileSketches，没有数值数据时返回None
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"不支持的时间粒度: {granularity}")
+        if is_cumulative_type(data_type):
+            return None
+        
+        cache_key = (data_type, granularity)
+        if cache_key not in self.sketch_cache and self.sketch_store is not None:
+            self.prepare_quantile_sketches()
+        if cache_key in self.sketch_cache:
+            return self.sketch_cache[cache_key]
+        
+        sketches = self._build_quantile_sketches(data_type, granularity)
+        self.sketch_cache[cache_key] = sketches
+        return sketches
+    
+    def get_step_count_data(self, since_day=None):
+        """
+        获取步数数据（已按数据源优先级去重）
+        
+        参数:
+            since_day: 只获取本地日编号不早于该值的数据，None表示全部历史
             
-            return df
+        返回:
+            包含步数数据的DataFrame
+        """
+        try:
+            return self._get_cumulative_data(STEP_COUNT_TYPES, since_day)
         except Exception as e:
             print(f"获取步数数据时出错: {str(e)}")
             traceback.print_exc()
             return pd.DataFrame()
     
-    def get_daily_step_count(self):
+    def get_distance_data(self):
+        """
+        获取步行+跑步距离数据（已按数据源优先级去重）
+        
+        返回:
+            包含距离数据的DataFrame
+        """
+        try:
+            # 距离相关的类型
+            distance_types = [
+                'HKQuantityTypeIdentifierDistanceWalkingRunning',
+                'com.apple.health.type.quantity.distance',
+                'DistanceWalkingRunning'
+            ]
+            
+            return self._get_cumulative_data(distance_types)
+        except Exception as e:
+            print(f"获取距离数据时出错: {str(e)}")
+            traceback.print_exc()
+            return pd.DataFrame()
+    
+    def get_daily_step_count(self, since_day=None):
         """
         获取每日步数总和
         
+        参数:
+            since_day: 只统计本地日编号不早于该值的数据，None表示全部历史
+            
         返回:
             包含每日步数的DataFrame
         """
         try:
-            steps_data = self.get_step_count_data()
+            steps_data = self.get_step_count_data(since_day)
             if steps_data.empty:
                 return pd.DataFrame()
             
-            # 提取日期部分
-            steps_data['日期'] = steps_data['startDate'].dt.date
-            
-            # 按日期分组并求和
-            daily_steps = steps_data.groupby('日期')['value'].sum().reset_index()
-            
-            # 重命名列
-            daily_steps.columns = ['日期', '步数']
-            
-            # 转换日期为字符串，便于JSON序列化
-            daily_steps['日期'] = daily_steps['日期'].astype(str)
-            
-            return daily_steps
+            # 按本地日编号分组求和
+            return self._daily_sum(steps_data, 'value', '步数')
         except Exception as e:
             print(f"获取每日步数时出错: {str(e)}")
             traceback.print_exc()
             return pd.DataFrame()
     
-    def get_heart_rate_data(self):
+    def get_daily_distance(self):
         """
-        获取心率数据
+        获取每日步行+跑步距离总和
         
         返回:
-            包含心率数据的DataFrame
+            包含每日距离的DataFrame
         """
         try:
-            # 心率相关的类型
-            hr_types = [
-                'HKQuantityTypeIdentifierHeartRate',
-                'com.apple.health.type.quantity.heartrate',
-                'HeartRate'
-            ]
-            
-            # 收集所有心率记录
-            hr_records = []
-            for type_name in hr_types:
-                if type_name in self.record_types:
-                    hr_records.extend(self.record_types[type_name])
-            
-            if not hr_records:
+            distance_data = self.get_distance_data()
+            if distance_data.empty:
                 return pd.DataFrame()
             
-            # 提取每条记录的日期和心率值
-            data = []
-            for record in hr_records:
-                date = self._extract_date(record)
-                value = self._extract_value(record)
-                
-                if date is not None and value is not None:
-                    try:
-                        value = float(value)
-                        data.append({
-                            'startDate': date,
-                            'value': value
-                        })
-                    except:
-                        continue
-            
-            if not data:
-                return pd.DataFrame()
-            
-            # 创建DataFrame
-            df = pd.DataFrame(data)
-            
-            # 确保日期是datetime类型
-            df['startDate'] = pd.to_datetime(df['startDate'])
-            
-            # 按日期排序
-            df = df.sort_values('startDate')
+            # 按本地日编号分组求和
+            return self._daily_sum(distance_data, 'value', '距离')
+        except Exception as e:
+            print(f"获取每日距离时出错: {str(e)}")
+            traceback.print_exc()
+            return pd.DataFrame()
+    
+    def get_heart_rate_data(self, since_day=None):
+        """
+        获取心率数据
+        
+        参数:
+            since_day: 只获取本地日编号不早于该值的数据，None表示全部历史
             
-            return df
+        返回:
+            包含心率数据的DataFrame
+        """
+        try:
+            return self.get_samples(HEART_RATE_TYPES, since_day=since_day)
         except Exception as e:
             print(f"获取心率数据时出错: {str(e)}")
             traceback.print_exc()
@@ -521,105 +963,66 @@ class HealthDataParser:
             包含心率统计的字典
         """
         try:
-            hr_data = self.get_heart_rate_data()
-            if hr_data.empty:
+            # 直接读取解析时累积的在线统计
+            hr_stats = self.get_running_stats(HEART_RATE_TYPES)
+            if hr_stats is None or hr_stats.count == 0:
                 return None
             
-            hr_data['value'] = pd.to_numeric(hr_data['value'], errors='coerce')
-            
-            # 计算统计值
-            avg_hr = hr_data['value'].mean()
-            max_hr = hr_data['value'].max()
-            min_hr = hr_data['value'].min()
-            
             # 返回统计数据
             return {
-                '平均心率': avg_hr,
-                '最高心率': max_hr,
-                '最低心率': min_hr
+                '平均心率': hr_stats.mean,
+                '最高心率': hr_stats.max,
+                '最低心率': hr_stats.min
             }
         except Exception as e:
             print(f"获取心率统计时出错: {str(e)}")
             traceback.print_exc()
             return None
     
-    def get_sleep_analysis_data(self):
+    def get_heart_rate_percentiles(self):
         """
-        获取睡眠分析数据
+        获取心率的P5/P50/P95（合并所有心率类型别名的每日分位数摘要得到）
         
         返回:
-            包含睡眠数据的DataFrame
+            包含心率分位数的字典，没有心率数据时返回None
         """
         try:
-            # 睡眠相关的类型
-            sleep_types = [
-                'HKCategoryTypeIdentifierSleepAnalysis',
-                'com.apple.health.type.category.sleep',
-                'SleepAnalysis'
-            ]
-            
-            # 收集所有睡眠记录
-            sleep_records = []
-            for type_name in sleep_types:
-                if type_name in self.record_types:
-                    sleep_records.extend(self.record_types[type_name])
+            sketches = QuantileSketches.merge(self.get_quantile_sketches(t) for t in HEART_RATE_TYPES)
+            if sketches is None:
+                return None
             
-            if not sleep_records:
-                return pd.DataFrame()
+            values, count = sketches.range_quantiles([0.05, 0.5, 0.95])
+            if count == 0:
+                return None
             
-            # 提取每条记录的日期、持续时间和睡眠状态
-            data = []
-            for record in sleep_records:
-                start_date = self._extract_date(record)
-                
-                # 尝试获取结束日期
-                end_date = None
-                if 'endDate' in record and record['endDate']:
-                    try:
-                        end_date = self._safe_date_conversion(record['endDate'])
-                    except:
-                        pass
-                
-                # 如果没有结束日期，尝试使用其他字段
-                if end_date is None and 'End' in record and record['End']:
-                    try:
-                        end_date = self._safe_date_conversion(record['End'])
-                    except:
-                        pass
-                
-                # 计算持续时间
-                duration = None
-                if end_date is not None:
-                    duration = (end_date - start_date).total_seconds() / 3600  # 小时
-                
-                # 尝试获取睡眠状态
-                value = None
-                if 'value' in record and record['value']:
-                    value = record['value']
-                elif 'Value' in record and record['Value']:
-                    value = record['Value']
-                
-                if start_date is not None and (duration is not None or value is not None):
-                    data.append({
-                        'startDate': start_date,
-                        'endDate': end_date,
-                        'duration': duration,
-                        'value': value
-                    })
+            return {
+                'P5心率': float(values[0]),
+                '心率中位数': float(values[1]),
+                'P95心率': float(values[2])
+            }
+        except Exception as e:
+            print(f"获取心率分位数时出错: {str(e)}")
+            traceback.print_exc()
+            return None
+    
+    def get_sleep_analysis_data(self, since_day=None):
+        """
+        获取睡眠分析数据
+        
+        参数:
+            since_day: 只获取本地日编号（入睡日期）不早于该值的数据，None表示全部历史
             
-            if not data:
+        返回:
+            包含睡眠数据的DataFrame
+        """
+        try:
+            # 睡眠状态是分类值，保留原始字符串
+            df = self.get_samples(SLEEP_TYPES, numeric=False, since_day=since_day)
+            if df.empty:
                 return pd.DataFrame()
             
-            # 创建DataFrame
-            df = pd.DataFrame(data)
-            
-            # 确保日期是datetime类型
-            df['startDate'] = pd.to_datetime(df['startDate'])
-            if 'endDate' in df.columns:
-                df['endDate'] = pd.to_datetime(df['endDate'])
-            
-            # 按开始日期排序
-            df = df.sort_values('startDate')
+            # 按UTC时间计算持续时间（小时），跨越夏令时切换时依然准确
+            df['duration'] = (df['endUtc'] - df['startUtc']).dt.total_seconds() / 3600
             
             return df
         except Exception as e:
@@ -627,126 +1030,87 @@ class HealthDataParser:
             traceback.print_exc()
             return pd.DataFrame()
     
-    def get_sleep_duration_daily(self):
+    def _filter_sleep_states(self, sleep_data):
+        """仅保留入睡状态的睡眠记录（如果有状态信息），过滤后没有数据时保留全部记录"""
+        if sleep_data.empty or 'value' not in sleep_data.columns:
+            return sleep_data
+        
+        # 尝试过滤睡眠状态
+        try:
+            sleep_states = ['asleep', 'inBed', '入睡', '睡眠']
+            mask = sleep_data['value'].str.lower().isin([state.lower() for state in sleep_states])
+            filtered_sleep_data = sleep_data[mask]
+            
+            # 如果过滤后没有数据，则使用所有数据
+            if filtered_sleep_data.empty:
+                filtered_sleep_data = sleep_data
+        except:
+            filtered_sleep_data = sleep_data
+        
+        return filtered_sleep_data
+    
+    def get_sleep_duration_daily(self, since_day=None):
         """
         获取每日睡眠时长
         
+        参数:
+            since_day: 只统计本地日编号不早于该值的数据，None表示全部历史
+            
         返回:
             包含每日睡眠时长的DataFrame
         """
         try:
-            sleep_data = self.get_sleep_analysis_data()
+            sleep_data = self.get_sleep_analysis_data(since_day)
             if sleep_data.empty:
                 return pd.DataFrame()
             
-            # 仅保留入睡状态的记录（如果有状态信息）
-            if 'value' in sleep_data.columns:
-                # 尝试过滤睡眠状态
-                try:
-                    sleep_states = ['asleep', 'inBed', '入睡', '睡眠']
-                    mask = sleep_data['value'].str.lower().isin([state.lower() for state in sleep_states])
-                    filtered_sleep_data = sleep_data[mask]
-                    
-                    # 如果过滤后没有数据，则使用所有数据
-                    if filtered_sleep_data.empty:
-                        filtered_sleep_data = sleep_data
-                except:
-                    filtered_sleep_data = sleep_data
-            else:
-                filtered_sleep_data = sleep_data
+            filtered_sleep_data = self._filter_sleep_states(sleep_data)
             
-            # 提取日期部分
-            filtered_sleep_data['日期'] = filtered_sleep_data['startDate'].dt.date
+            if filtered_sleep_data['duration'].isna().all():
+                return pd.DataFrame()
             
-            # 按日期分组并计算总睡眠时长
-            if 'duration' in filtered_sleep_data.columns and not filtered_sleep_data['duration'].isna().all():
-                # 如果有持续时间列，直接使用
-                daily_sleep = filtered_sleep_data.groupby('日期')['duration'].sum().reset_index()
-            else:
-                # 否则，尝试使用开始和结束时间计算
-                if 'endDate' in filtered_sleep_data.columns:
-                    filtered_sleep_data['duration'] = (
-                        filtered_sleep_data['endDate'] - filtered_sleep_data['startDate']
-                    ).dt.total_seconds() / 3600  # 小时
-                    daily_sleep = filtered_sleep_data.groupby('日期')['duration'].sum().reset_index()
-                else:
-                    return pd.DataFrame()
-            
-            # 重命名列
-            daily_sleep.columns = ['日期', '睡眠时长(小时)']
-            
-            # 转换日期为字符串，便于JSON序列化
-            daily_sleep['日期'] = daily_sleep['日期'].astype(str)
-            
-            return daily_sleep
+            # 按入睡时的本地日编号分组计算总睡眠时长
+            return self._daily_sum(filtered_sleep_data, 'duration', '睡眠时长(小时)')
         except Exception as e:
             print(f"获取每日睡眠时长时出错: {str(e)}")
             traceback.print_exc()
             return pd.DataFrame()
     
-    def get_stress_indicators(self):
+    def get_stress_indicators(self, since_day=None):
         """
         获取压力指标数据
         
+        参数:
+            since_day: 只统计本地日编号不早于该值的数据，None表示全部历史
+            
         返回:
             包含压力指标的DataFrame
         """
         try:
             # 获取心率变异性数据
-            hr_data = self.get_heart_rate_data()
+            hr_data = self.get_heart_rate_data(since_day)
             if hr_data.empty:
                 # 返回包含必要列的空DataFrame
                 return pd.DataFrame(columns=['日期', '心率波动', '心率范围', '平均心率', '压力指数', 'startDate'])
             
-            # 确保数值类型
-            hr_data['value'] = pd.to_numeric(hr_data['value'], errors='coerce')
-            # 过滤掉NaN值
-            hr_data = hr_data.dropna(subset=['value'])
+            # 按本地日编号单次分段归约，计算每天的心率标准差、范围和均值
+            daily = segment_stats(hr_data['local_day'].to_numpy(), hr_data['value'].to_numpy(dtype=float))
             
-            if hr_data.empty:
+            if daily['key'].size == 0:
                 # 返回包含必要列的空DataFrame
                 return pd.DataFrame(columns=['日期', '心率波动', '心率范围', '平均心率', '压力指数', 'startDate'])
             
-            # 提取日期部分
-            hr_data['日期'] = hr_data['startDate'].dt.date
+            # 计算压力指数（标准差和心率范围的综合指标），并限制在1-10范围内
+            stress_index = np.clip((daily['std'] * 0.6 + daily['range'] * 0.4) / 10.0, 1, 10)
             
-            # 计算每天的心率标准差和范围作为压力指标
-            stress_data = hr_data.groupby('日期').agg(
-                心率波动=('value', 'std'),
-                心率范围=('value', lambda x: x.max() - x.min()),
-                平均心率=('value', 'mean')
-            ).reset_index()
-            
-            # 填充可能的NaN值
-            stress_data = stress_data.fillna(0)
-            
-            # 确保所有数值列是float类型
-            for col in ['心率波动', '心率范围', '平均心率']:
-                stress_data[col] = pd.to_numeric(stress_data[col], errors='coerce').fillna(0).astype(float)
-            
-            # 计算压力指数（标准差和心率范围的综合指标）
-            stress_data['压力指数'] = (
-                stress_data['心率波动'] * 0.6 + stress_data['心率范围'] * 0.4
-            ) / 10.0
-            
-            # 确保压力指数是float类型
-            stress_data['压力指数'] = pd.to_numeric(stress_data['压力指数'], errors='coerce').fillna(0).astype(float)
-            
-            # 确保压力指数在1-10范围内
-            stress_data['压力指数'] = np.clip(stress_data['压力指数'], 1, 10)
-            
-            # 存储日期原始值
-            stress_data['startDate'] = stress_data['日期']
-            
-            # 转换日期为字符串，便于JSON序列化
-            stress_data['日期'] = stress_data['日期'].astype(str)
-            
-            # 按日期排序
-            stress_data = stress_data.sort_values('日期')
-            
-            # 最终再次确认所有数值列是float类型
-            for col in ['心率波动', '心率范围', '平均心率', '压力指数']:
-                stress_data[col] = pd.to_numeric(stress_data[col], errors='coerce').fillna(0).astype(float)
+            stress_data = pd.DataFrame({
+                '日期': days_to_iso(daily['key']),  # 转换日期为字符串，便于JSON序列化
+                '心率波动': daily['std'],
+                '心率范围': daily['range'],
+                '平均心率': daily['mean'],
+                '压力指数': stress_index,
+                'startDate': days_to_dates(daily['key'])  # 存储日期原始值
+            })
             
             return stress_data
         except Exception as e:
@@ -755,12 +1119,16 @@ class HealthDataParser:
             # 返回包含必要列的空DataFrame
             return pd.DataFrame(columns=['日期', '心率波动', '心率范围', '平均心率', '压力指数', 'startDate'])
     
-    def get_ecg_data(self):
+    def get_ecg_data(self, since_day=None):
         """
         获取ECG/心电图数据。
         会先检查是否有 electrocardiograms 目录中的 CSV 文件数据，
         如果没有，再尝试从XML中提取ECG数据。
         
+        参数:
+            since_day: 只获取本地日编号不早于该值的记录，None表示全部历史
+            （XML记录在解析日期之前按日期字符串粗筛；CSV的日期在文件内容中，读取后再过滤）
+        
         返回:
             包含ECG数据的DataFrame，列包括：
             ['filename', 'date', 'classification', 'device', 'sampling_rate', 'signal', 'length']
@@ -772,6 +1140,8 @@ class HealthDataParser:
             # 如果从CSV读取到了数据，直接返回
             if not ecg_df.empty:
                 print(f"从CSV文件中读取到 {len(ecg_df)} 条ECG记录")
+                if since_day is not None:
+                    ecg_df = ecg_df[ecg_df['local_day'] >= since_day]
                 return ecg_df
                 
             print("未找到ECG CSV文件，尝试从XML中提取数据...")
@@ -789,6 +1159,11 @@ class HealthDataParser:
                 if type_name in self.record_types:
                     ecg_records.extend(self.record_types[type_name])
             
+            if since_day is not None and ecg_records:
+                # 解析日期之前先按日期字符串前缀去掉窗口之外的记录
+                dates = [record.get('startDate') or record.get('date') or record.get('Start') for record in ecg_records]
+                ecg_records = list(compress(ecg_records, prefilter_since(dates, since_day)))
+            
             if not ecg_records:
                 print("XML中没有找到ECG数据")
                 return pd.DataFrame()
@@ -796,7 +1171,7 @@ class HealthDataParser:
             # 提取每条记录的日期和ECG数据
             data = []
             for record in ecg_records:
-                date = self._extract_date(record)
+                date = record.get('startDate') or record.get('date') or record.get('Start')
                 
                 # 尝试获取分类值或波形数据
                 classification = None
@@ -834,8 +1209,10 @@ class HealthDataParser:
             # 创建DataFrame
             df = pd.DataFrame(data)
             
-            # 确保日期是datetime类型
-            df['date'] = pd.to_datetime(df['date'])
+            # 按记录自身时区解析日期，并计算本地日编号
+            df = self._attach_local_day(df, 'date')
+            if since_day is not None:
+                df = df[df['local_day'] >= since_day]
             
             # 按日期排序
             df = df.sort_values('date')
@@ -948,21 +1325,11 @@ class HealthDataParser:
                     device = None
                     sampling_rate = None
                     
-                    # 尝试提取日期
+                    # 尝试提取日期（原始字符串，示例: "2025-04-02 11:38:52 -0400"），统一在最后解析
                     date_keys = ['記錄日期', '记录日期', 'Date']
                     for key in date_keys:
-                        if key in metadata:
-                            try:
-                                # 尝试解析各种可能的日期格式
-                                date_str = metadata[key]
-                                # 处理可能包含时区的日期字符串
-                                if ' -' in date_str or ' +' in date_str:
-                                    # 示例: "2025-04-02 11:38:52 -0400"
-                                    date = pd.to_datetime(date_str, errors='coerce')
-                                else:
-                                    date = pd.to_datetime(date_str, errors='coerce')
-                            except:
-                                pass
+                        if key in metadata and metadata[key]:
+                            date = metadata[key]
                     
                     # 尝试提取分类
                     class_keys = ['分類', '分类', 'Classification']
@@ -1016,6 +1383,9 @@ class HealthDataParser:
             # 创建DataFrame
             df = pd.DataFrame(ecg_data)
             
+            # 按记录自身时区解析日期，并计算本地日编号
+            df = self._attach_local_day(df, 'date')
+            
             # 按日期排序
             df = df.sort_values('date')
             
@@ -0,0 +1,152 @@
+import numpy as np
+
+
+def _window_sums(values, window):
+    """
+    用累积和计算每个位置结尾的长度为window的窗口和
+
+    返回:
+        与values等长的数组，前window-1个位置为NaN
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(values.size, np.nan)
+    if window < 1 or values.size < window:
+        return result
+
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    result[window - 1:] = cumulative[window:] - cumulative[:-window]
+    return result
+
+
+def rolling_mean(values, window):
+    """
+    简单移动平均（SMA），O(n)
+
+    参数:
+        values: 按时间排序的数值数组
+        window: 窗口长度
+
+    返回:
+        与values等长的数组，前window-1个位置为NaN
+    """
+    return _window_sums(values, window) / window
+
+
+def rolling_std(values, window):
+    """
+    滚动总体标准差（与布林带的定义一致，除以window）
+
+    先按全局均值中心化再累加平方和，减小大数值时平方和相减的精度损失。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return np.empty(0, dtype=np.float64)
+
+    centered = values - values.mean()
+    mean = _window_sums(centered, window) / window
+    mean_square = _window_sums(centered * centered, window) / window
+    return np.sqrt(np.clip(mean_square - mean * mean, 0.0, None))
+
+
+def bollinger_bands(values, window=20, multiplier=2.0):
+    """
+    布林带
+
+    返回:
+        (中轨, 上轨, 下轨)，均与values等长
+    """
+    middle = rolling_mean(values, window)
+    std = rolling_std(values, window)
+    return middle, middle + multiplier * std, middle - multiplier * std
+
+
+def rsi(values, period=14):
+    """
+    相对强弱指数（RSI），使用最近period次变化的平均涨幅和平均跌幅
+
+    返回:
+        与values等长的数组（0-100），前period个位置为NaN；窗口内没有变化时为50
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(values.size, np.nan)
+    if values.size <= period:
+        return result
+
+    changes = np.diff(values)
+    gains = _window_sums(np.clip(changes, 0.0, None), period)
+    losses = _window_sums(np.clip(-changes, 0.0, None), period)
+    total = gains + losses
+    with np.errstate(invalid='ignore', divide='ignore'):
+        index = 100.0 * gains / total
+    index[total == 0] = 50.0
+
+    # changes[i]对应values[i+1]
+    result[1:] = index
+    return result
+
+
+def atr(high, low, close, period=14):
+    """
+    平均真实范围（ATR），首个值为前period个真实范围的平均，之后按Wilder平滑递推
+
+    参数:
+        high, low, close: 每个时间桶的最高值、最低值和代表值（等长数组）
+        period: 平滑周期
+
+    返回:
+        与close等长的数组，前period-1个位置为NaN
+    """
+    from scipy.signal import lfilter
+
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    result = np.full(close.size, np.nan)
+    if close.size < period or period < 1:
+        return result
+
+    true_range = high - low
+    if close.size > 1:
+        previous = close[:-1]
+        true_range[1:] = np.maximum.reduce([
+            high[1:] - low[1:],
+            np.abs(high[1:] - previous),
+            np.abs(low[1:] - previous)
+        ])
+
+    # ATR[i] = (ATR[i-1]*(period-1) + TR[i]) / period，一阶IIR滤波一次完成递推
+    first = true_range[:period].mean()
+    result[period - 1] = first
+    if close.size > period:
+        decay = (period - 1) / period
+        result[period:], _ = lfilter([1.0 / period], [1.0, -decay], true_range[period:], zi=[decay * first])
+    return result
+
+
+def compute_indicators(close, high=None, low=None, sma_windows=(7, 14, 30),
+                       rsi_period=14, band_window=20, band_multiplier=2.0, atr_period=14):
+    """
+    一次计算全部技术指标
+
+    参数:
+        close: 每个时间桶的代表值（按时间排序）
+        high, low: 每个时间桶的最高值、最低值，缺省时与close相同
+        sma_windows: 移动平均线窗口列表
+        rsi_period: RSI周期
+        band_window, band_multiplier: 布林带窗口和标准差倍数
+        atr_period: ATR周期
+
+    返回:
+        字典，包含 sma（窗口 -> 数组）、bollinger、rsi、atr
+    """
+    close = np.asarray(close, dtype=np.float64)
+    high = close if high is None else high
+    low = close if low is None else low
+
+    middle, upper, lower = bollinger_bands(close, band_window, band_multiplier)
+    return {
+        'sma': {window: rolling_mean(close, window) for window in sma_windows},
+        'bollinger': {'middle': middle, 'upper': upper, 'lower': lower},
+        'rsi': rsi(close, rsi_period),
+        'atr': atr(high, low, close, atr_period)
+    }
@@ -0,0 +1,78 @@
+import numpy as np
+
+
+def segment_bounds(keys):
+    """
+    计算已排序键数组中每个分段的起始位置
+
+    参数:
+        keys: 已按键排序的一维数组
+
+    返回:
+        (唯一键数组, 每段起始下标数组, 每段样本数数组)
+    """
+    keys = np.asarray(keys)
+    if keys.size == 0:
+        return keys, np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+    counts = np.diff(np.append(starts, keys.size))
+    return keys[starts], starts, counts
+
+
+def segment_stats(keys, values, assume_sorted=False):
+    """
+    按键分段计算统计量（reduceat分段归约，单次遍历，无Python逐组回调）
+
+    参数:
+        keys: 分组键（如日期编号），与values等长
+        values: 数值数组，NaN会被忽略
+        assume_sorted: keys是否已排序，未排序时会先做稳定排序
+
+    返回:
+        字典，包含 key、count、sum、mean、std（样本标准差，单样本为0）、min、max、range 数组
+    """
+    keys = np.asarray(keys)
+    values = np.asarray(values, dtype=np.float64)
+
+    # 过滤NaN值
+    valid = ~np.isnan(values)
+    if not valid.all():
+        keys = keys[valid]
+        values = values[valid]
+
+    if not assume_sorted and keys.size:
+        order = np.argsort(keys, kind='mergesort')
+        keys = keys[order]
+        values = values[order]
+
+    unique_keys, starts, counts = segment_bounds(keys)
+    if unique_keys.size == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return {
+            'key': unique_keys, 'count': counts, 'sum': empty, 'mean': empty,
+            'std': empty, 'min': empty, 'max': empty, 'range': empty
+        }
+
+    sums = np.add.reduceat(values, starts)
+    means = sums / counts
+    mins = np.minimum.reduceat(values, starts)
+    maxs = np.maximum.reduceat(values, starts)
+
+    # 两遍法计算方差，避免大数值时平方和相减的精度损失
+    deviations = values - np.repeat(means, counts)
+    squared = np.add.reduceat(deviations * deviations, starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.sqrt(squared / (counts - 1))
+    std[counts < 2] = 0.0
+
+    return {
+        'key': unique_keys,
+        'count': counts,
+        'sum': sums,
+        'mean': means,
+        'std': std,
+        'min': mins,
+        'max': maxs,
+        'range': maxs - mins
+    }
@@ -0,0 +1,39 @@
+import importlib
+
+
+class LazyModule:
+    """
+    模块代理：首次访问属性时才导入真正的模块
+
+    用于pandas、plotly等导入耗时较长、但启动阶段（创建应用、注册蓝图、显示上传页）用不到的依赖，
+    使`import app`和create_app()不必为它们付出导入时间。导入后的模块同样登记在sys.modules中，
+    与普通import得到的是同一个模块对象。
+    """
+
+    def __init__(self, name):
+        """
+        初始化代理
+
+        参数:
+            name: 模块的完整名称，如'pandas'、'plotly.graph_objects'
+        """
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        """导入并返回真正的模块"""
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = '已导入' if self._module is not None else '未导入'
+        return f"<LazyModule {self._name}（{state}）>"
+
+
+def lazy_module(name):
+    """返回模块的延迟导入代理，用法与`import name as alias`相同: pd = lazy_module('pandas')"""
+    return LazyModule(name)
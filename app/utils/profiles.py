@@ -0,0 +1,72 @@
+import numpy as np
+
+# 一天的分钟数
+MINUTES_PER_DAY = 1440
+# 星期标签（周一为0）
+WEEKDAY_LABELS = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+
+
+def weekday_codes(local_day):
+    """由本地日编号计算星期编码（周一为0，1970-01-01是周四）"""
+    return (np.asarray(local_day, dtype=np.int64) + 3) % 7
+
+
+def slot_labels(slot_minutes=60):
+    """一天内各时段的起始时间标签（'HH:MM'）"""
+    starts = np.arange(0, MINUTES_PER_DAY, slot_minutes)
+    return [f"{start // 60:02d}:{start % 60:02d}" for start in starts]
+
+
+def weekday_profile(local_day, minute, values, slot_minutes=60):
+    """
+    计算 星期×当日时段 的作息分布网格
+
+    每个样本由本地日编号和当日分钟数直接得到网格单元编号，
+    计数与求和各用一次np.bincount加权累加完成，不做逐组的groupby。
+
+    参数:
+        local_day: 本地日编号数组
+        minute: 本地当日分钟数数组
+        values: 样本数值，NaN会被忽略
+        slot_minutes: 时段长度（分钟），须整除1440，如60得到7×24网格，15得到7×96网格
+
+    返回:
+        字典，包含:
+            count: 7×时段数 的样本数网格
+            sum: 样本值之和网格
+            mean: 样本均值网格（没有样本的单元为NaN）
+            days: 长度为7的数组，数据中每个星期几出现的天数
+            daily_mean: sum除以对应星期几的天数，即该时段平均每天的累计量（适用于步数等累计型数据）
+            slot_minutes: 时段长度
+    """
+    if slot_minutes < 1 or MINUTES_PER_DAY % slot_minutes:
+        raise ValueError(f"时段长度必须整除1440分钟: {slot_minutes}")
+
+    slots = MINUTES_PER_DAY // slot_minutes
+    days = np.asarray(local_day, dtype=np.int64)
+    minute = np.asarray(minute, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+
+    valid = ~np.isnan(values) & (minute >= 0) & (minute < MINUTES_PER_DAY)
+    days, minute, values = days[valid], minute[valid], values[valid]
+
+    cells = weekday_codes(days) * slots + minute // slot_minutes
+    size = 7 * slots
+    count = np.bincount(cells, minlength=size).reshape(7, slots)
+    total = np.bincount(cells, weights=values, minlength=size).reshape(7, slots)
+
+    # 每个星期几在数据中出现的天数
+    day_counts = np.bincount(weekday_codes(np.unique(days)), minlength=7)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, total / count, np.nan)
+        daily_mean = np.where(day_counts[:, None] > 0, total / day_counts[:, None], np.nan)
+
+    return {
+        'count': count,
+        'sum': total,
+        'mean': mean,
+        'days': day_counts,
+        'daily_mean': daily_mean,
+        'slot_minutes': slot_minutes
+    }
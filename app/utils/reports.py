@@ -0,0 +1,393 @@
+import functools
+import glob
+import os
+import time
+import traceback
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app.utils.health_parser import HealthDataParser
+from app.utils.summary import build_health_summary, load_health_summary
+from app.utils.cache import dataset_version, artifact_dir
+from app.utils.lazy import lazy_module
+
+# 绘图依赖只在渲染进程中导入
+visualization = lazy_module('app.utils.visualization')
+
+# 支持的报告格式：png为每个数据集两张图片，pdf为每个数据集一个两页的文件
+REPORT_FORMATS = ('png', 'pdf')
+# 中文字体候选（按顺序使用第一个已安装的字体）
+CJK_FONTS = ['Noto Sans CJK SC', 'Source Han Sans SC', 'SimHei', 'Microsoft YaHei',
+             'PingFang SC', 'WenQuanYi Micro Hei', 'Arial Unicode MS']
+# 图片分辨率
+REPORT_DPI = 120
+
+
+@functools.lru_cache(maxsize=1)
+def _configure_matplotlib():
+    """在当前进程中以无界面的Agg后端初始化matplotlib（每个进程只执行一次）"""
+    import matplotlib
+    matplotlib.use('Agg')
+    matplotlib.rcParams['font.sans-serif'] = CJK_FONTS + matplotlib.rcParams['font.sans-serif']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    # 没有安装中文字体时只是显示为方框，不必为每个字符输出警告
+    warnings.filterwarnings('ignore', message='Glyph .* missing from')
+    return matplotlib
+
+
+def load_dataset(upload_dir, source_priority=None):
+    """
+    加载一个上传目录中的健康数据（与上传时的解析方式一致）
+
+    依次尝试目录下的XML文件、ZIP压缩包中的export.xml，最后按导出文件夹解析整个目录。
+
+    参数:
+        upload_dir: 上传目录（UPLOAD_FOLDER/<数据集ID>）
+        source_priority: 步数/距离去重的数据源优先级
+
+    返回:
+        (解析器, 数据文件路径, 数据目录路径)，无法解析时解析器为None
+    """
+    parser = HealthDataParser(source_priority=source_priority)
+
+    for xml_path in sorted(glob.glob(os.path.join(upload_dir, '*.xml'))):
+        if parser.parse_xml(xml_path):
+            return parser, xml_path, None
+
+    for zip_path in sorted(glob.glob(os.path.join(upload_dir, '*.zip'))):
+        xml_path = parser.extract_from_zip(zip_path)
+        if xml_path and parser.parse_xml(xml_path):
+            # 解压出的XML在临时目录中，数据集版本按上传目录计算
+            return parser, None, upload_dir
+
+    if parser.parse_directory(upload_dir):
+        return parser, None, upload_dir
+
+    parser.clean_up()
+    return None, None, None
+
+
+def locate_dataset(upload_dir):
+    """
+    不解析数据，按load_dataset的查找顺序确定上传目录中数据集的路径（用于读取持久化的派生结果）
+
+    返回:
+        (数据文件路径, 数据目录路径)
+    """
+    xml_paths = sorted(glob.glob(os.path.join(upload_dir, '*.xml')))
+    if xml_paths:
+        return xml_paths[0], None
+    return None, upload_dir
+
+
+def _trace_x(values):
+    """横坐标为日期字符串时转换为datetime64，其他情况（如分类标签）原样返回"""
+    array = np.asarray(values)
+    if array.dtype.kind in 'USO':
+        try:
+            return array.astype('datetime64[s]')
+        except (ValueError, TypeError):
+            return array.astype(str)
+    return array
+
+
+def _draw_chart(ax, chart, title):
+    """
+    在matplotlib坐标轴上绘制仪表板面板的图表字典
+
+    支持面板中用到的柱状图、折线/散点图和饼图（与网页仪表板一致，饼图画成柱状图），
+    以及水平参考线、水平区间背景和它们的标注。
+
+    返回:
+        横坐标是否为日期
+    """
+    has_dates = False
+    for trace in chart.get('data', []):
+        kind = trace.get('type', 'scatter')
+        color = (trace.get('marker') or {}).get('color') or (trace.get('line') or {}).get('color')
+        if not isinstance(color, str):
+            color = None
+
+        if kind == 'pie':
+            labels = trace.get('labels')
+            values = trace.get('values')
+            if labels is not None and values is not None and len(labels) > 0:
+                ax.bar(np.asarray(labels).astype(str), np.asarray(values, dtype=float))
+            continue
+
+        x = _trace_x(trace.get('x', []))
+        has_dates = has_dates or np.issubdtype(x.dtype, np.datetime64)
+        y = np.asarray(trace.get('y', []), dtype=float)
+        if kind == 'bar':
+            ax.bar(x, y, color=color, width=0.8)
+        elif kind == 'scatter':
+            mode = trace.get('mode', 'lines')
+            ax.plot(x, y, color=color, linewidth=1,
+                    linestyle='-' if 'lines' in mode else 'none',
+                    marker='o' if 'markers' in mode else None, markersize=3)
+
+    layout = chart.get('layout', {})
+    for shape in layout.get('shapes', []):
+        if shape.get('type') == 'line':
+            line = shape.get('line', {})
+            ax.axhline(shape['y0'], color=line.get('color', 'gray'),
+                       linestyle='--' if line.get('dash') else '-', linewidth=1)
+        elif shape.get('type') == 'rect':
+            ax.axhspan(shape['y0'], shape['y1'], color=shape.get('fillcolor', 'gray'),
+                       alpha=shape.get('opacity', 0.1), linewidth=0)
+    for annotation in layout.get('annotations', []):
+        if annotation.get('xref') == 'x domain':
+            ax.text(annotation['x'], annotation['y'], annotation['text'], fontsize=8,
+                    ha=annotation.get('xanchor', 'center'), va=annotation.get('yanchor', 'bottom'),
+                    transform=ax.get_yaxis_transform())
+
+    ax.set_title(title)
+    y_title = ((layout.get('yaxis') or {}).get('title') or {}).get('text')
+    if y_title:
+        ax.set_ylabel(y_title)
+    ax.grid(True, axis='y', alpha=0.3)
+    return has_dates
+
+
+def render_dashboard_figure(panels, days=30):
+    """
+    绘制仪表板的静态版本（2×2网格：步数、心率、睡眠、ECG）
+
+    参数:
+        panels: HealthDataVisualizer.build_dashboard_panels的结果
+        days: 数据天数，用于标题
+
+    返回:
+        matplotlib Figure
+    """
+    _configure_matplotlib()
+    from matplotlib.figure import Figure
+    import matplotlib.dates as mdates
+
+    fig = Figure(figsize=(14, 9), layout='constrained')
+    axes = fig.subplots(2, 2)
+    for panel, ax in zip(visualization.DASHBOARD_PANELS, axes.flat):
+        title = visualization.DASHBOARD_TITLES[panel]
+        if panel not in panels:
+            ax.set_title(title)
+            ax.text(0.5, 0.5, '暂无数据', ha='center', va='center', color='gray', transform=ax.transAxes)
+            ax.set_axis_off()
+            continue
+        if _draw_chart(ax, panels[panel], title):
+            locator = mdates.AutoDateLocator()
+            ax.xaxis.set_major_locator(locator)
+            ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+
+    fig.suptitle(f"健康数据摘要（最近{days}天）", fontsize=16)
+    return fig
+
+
+def _summary_bars(ax, labels, values, title, reference=None, limit=None):
+    """摘要中的水平条形图，reference为目标线（如每日1万步）"""
+    positions = np.arange(len(labels))
+    ax.barh(positions, values, color='#1f77b4', alpha=0.8)
+    ax.set_yticks(positions, labels)
+    ax.invert_yaxis()
+    for position, value in zip(positions, values):
+        ax.text(value, position, f" {value:,.1f}" if value < 100 else f" {value:,.0f}", va='center', fontsize=9)
+    if reference is not None:
+        ax.axvline(reference, color='red', linestyle='--', linewidth=1)
+    if limit is not None:
+        ax.set_xlim(*limit)
+    ax.set_title(title)
+    ax.grid(True, axis='x', alpha=0.3)
+
+
+def render_summary_figure(summary):
+    """
+    绘制健康摘要页的静态版本（心率、步数、睡眠、压力四个部分，附ECG记录数）
+
+    参数:
+        summary: build_health_summary或load_health_summary返回的摘要字典
+
+    返回:
+        matplotlib Figure
+    """
+    _configure_matplotlib()
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(12, 8), layout='constrained')
+    (hr_ax, steps_ax), (sleep_ax, stress_ax) = fig.subplots(2, 2)
+
+    heart_rate = summary.get('heart_rate')
+    if heart_rate:
+        items = [('最低', 'min'), ('P5', 'p5'), ('中位数', 'median'), ('平均', 'average'), ('P95', 'p95'), ('最高', 'max')]
+        items = [(label, float(heart_rate[key])) for label, key in items if heart_rate.get(key) is not None]
+        _summary_bars(hr_ax, [label for label, _ in items], [value for _, value in items],
+                      f"心率 bpm（{heart_rate['status']}）")
+    else:
+        hr_ax.set_axis_off()
+
+    steps = summary.get('steps')
+    if steps:
+        _summary_bars(steps_ax, ['平均每日步数'], [float(steps['average'])],
+                      f"步数（{steps['activity_level']}）", reference=10000)
+    else:
+        steps_ax.set_axis_off()
+
+    sleep = summary.get('sleep')
+    if sleep:
+        _summary_bars(sleep_ax, ['平均睡眠时长(小时)'], [float(sleep['average'])],
+                      f"睡眠（{sleep['status']}）", reference=8, limit=(0, 12))
+    else:
+        sleep_ax.set_axis_off()
+
+    stress = summary.get('stress')
+    if stress:
+        _summary_bars(stress_ax, ['平均压力指数'], [float(stress['average'])],
+                      f"压力（{stress['level']}）", limit=(0, 10))
+    else:
+        stress_ax.set_axis_off()
+
+    title = "健康摘要"
+    if summary.get('ecg'):
+        title += f"（ECG记录数: {summary['ecg']['count']}）"
+    fig.suptitle(title, fontsize=16)
+    return fig
+
+
+def render_dataset(upload_root, dataset_id, output_dir, fmt='png', days=30, source_priority=None):
+    """
+    渲染一个数据集的静态报告（仪表板 + 健康摘要），可在进程池的子进程中执行
+
+    参数:
+        upload_root: 上传根目录（UPLOAD_FOLDER）
+        dataset_id: 数据集ID（上传目录名）
+        output_dir: 报告输出目录
+        fmt: 'png'输出<ID>/dashboard.png和<ID>/summary.png，'pdf'输出<ID>.pdf
+        days: 仪表板显示最近多少天的数据
+        source_priority: 步数/距离去重的数据源优先级
+
+    返回:
+        字典，包含 dataset_id、status（'ok'/'error'）、files、seconds，出错时还有error
+    """
+    start = time.perf_counter()
+    result = {'dataset_id': dataset_id, 'status': 'error', 'files': []}
+    parser = None
+    try:
+        upload_dir = os.path.join(upload_root, dataset_id)
+        if dataset_id in ('', '.', '..') or os.path.basename(dataset_id) != dataset_id or not os.path.isdir(upload_dir):
+            raise ValueError(f"数据集不存在: {dataset_id}")
+
+        # 优先使用上传时持久化的摘要和仪表板面板，都有时不解析数据
+        data_file_path, data_dir_path = locate_dataset(upload_dir)
+        summary = load_health_summary(data_file_path, data_dir_path)
+        panels = visualization.load_dashboard_panels(
+            artifact_dir(data_file_path, data_dir_path), dataset_version(data_file_path, data_dir_path), days
+        )
+
+        if summary is None or panels is None:
+            parser, data_file_path, data_dir_path = load_dataset(upload_dir, source_priority)
+            if parser is None:
+                raise ValueError(f"无法解析数据集: {dataset_id}")
+            if summary is None:
+                summary = build_health_summary(parser)
+            if panels is None:
+                panels = visualization.HealthDataVisualizer(parser).build_dashboard_panels(days)
+                # 同一天内再次生成报告时直接使用
+                visualization.save_dashboard_panels(
+                    artifact_dir(data_file_path, data_dir_path), dataset_version(data_file_path, data_dir_path),
+                    days, panels
+                )
+        figures = [('dashboard', render_dashboard_figure(panels, days)), ('summary', render_summary_figure(summary))]
+
+        if fmt == 'pdf':
+            from matplotlib.backends.backend_pdf import PdfPages
+            os.makedirs(output_dir, exist_ok=True)
+            path = os.path.join(output_dir, f"{dataset_id}.pdf")
+            with PdfPages(path) as pdf:
+                for _, fig in figures:
+                    pdf.savefig(fig)
+            result['files'].append(path)
+        else:
+            target_dir = os.path.join(output_dir, dataset_id)
+            os.makedirs(target_dir, exist_ok=True)
+            for name, fig in figures:
+                path = os.path.join(target_dir, f"{name}.png")
+                fig.savefig(path, dpi=REPORT_DPI)
+                result['files'].append(path)
+
+        result['status'] = 'ok'
+    except Exception as e:
+        print(f"渲染数据集 {dataset_id} 的报告时出错: {str(e)}")
+        traceback.print_exc()
+        result['error'] = str(e)
+    finally:
+        if parser is not None:
+            parser.clean_up()
+
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def render_reports(upload_root, dataset_ids, output_dir, fmt='png', days=30, max_workers=None, source_priority=None):
+    """
+    批量渲染多个数据集的报告，数据集之间在进程池中并行（每个进程独立解析和绘图）
+
+    参数:
+        max_workers: 进程池大小，默认为CPU核数；只有一个数据集或一个进程时在当前进程中执行
+        其余参数同render_dataset
+
+    返回:
+        各数据集的结果字典列表（与dataset_ids顺序一致）
+    """
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"不支持的报告格式: {fmt}")
+
+    count = len(dataset_ids)
+    workers = min(max_workers or os.cpu_count() or 1, count)
+    if workers <= 1:
+        return [render_dataset(upload_root, dataset_id, output_dir, fmt, days, source_priority) for dataset_id in dataset_ids]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            render_dataset,
+            [upload_root] * count, dataset_ids, [output_dir] * count,
+            [fmt] * count, [days] * count, [source_priority] * count
+        ))
+
+
+@click.command('render-reports')
+@click.argument('dataset_ids', nargs=-1)
+@click.option('--all', 'render_all', is_flag=True, help='渲染上传目录中的所有数据集')
+@click.option('--output', '-o', default='reports', show_default=True, type=click.Path(file_okay=False), help='报告输出目录')
+@click.option('--format', 'fmt', type=click.Choice(REPORT_FORMATS), default='png', show_default=True, help='报告格式')
+@click.option('--days', default=30, show_default=True, type=click.IntRange(1, 3650), help='仪表板显示最近多少天的数据')
+@click.option('--workers', default=None, type=click.IntRange(1), help='进程数，默认为CPU核数')
+@with_appcontext
+def render_reports_command(dataset_ids, render_all, output, fmt, days, workers):
+    """用matplotlib批量渲染数据集（上传目录ID）的仪表板和健康摘要报告"""
+    upload_root = current_app.config['UPLOAD_FOLDER']
+    dataset_ids = list(dataset_ids)
+    if render_all:
+        dataset_ids += sorted(
+            name for name in os.listdir(upload_root)
+            if not name.startswith('.') and os.path.isdir(os.path.join(upload_root, name)) and name not in dataset_ids
+        ) if os.path.isdir(upload_root) else []
+    if not dataset_ids:
+        raise click.UsageError('请指定数据集ID，或使用--all渲染所有数据集')
+
+    results = render_reports(
+        upload_root, dataset_ids, output, fmt, days, workers, current_app.config.get('SOURCE_PRIORITY')
+    )
+
+    failed = 0
+    for result in results:
+        if result['status'] == 'ok':
+            click.echo(f"{result['dataset_id']}: {', '.join(result['files'])}（{result['seconds']:.2f}秒）")
+        else:
+            failed += 1
+            click.echo(f"{result['dataset_id']}: 失败 - {result.get('error')}", err=True)
+    click.echo(f"完成 {len(results) - failed}/{len(results)} 个数据集")
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,224 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# 每个批次中重采样矩阵的最大元素数（控制内存占用）
+MAX_BATCH_ELEMENTS = 4_000_000
+# 样本数达到该值时，自助法的批次分发到进程池并行计算
+PARALLEL_MIN_SAMPLES = 2000
+
+# 所有请求共用的进程池（首次并行计算时创建，避免每次请求都启动子进程）
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool():
+    """返回模块级的进程池，首次调用时创建（大小为CPU核数）"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+        return _process_pool
+
+
+def default_block_length(n):
+    """移动块自助法的默认块长（约为n的立方根）"""
+    return max(1, int(round(n ** (1.0 / 3.0))))
+
+
+def block_bootstrap_indices(n, n_resamples, block_length, rng):
+    """
+    生成循环移动块自助法的重采样下标矩阵
+
+    每个重采样由随机起点的连续块首尾相接组成（超出末尾时回绕），保留序列的短程自相关。
+
+    参数:
+        n: 样本数
+        n_resamples: 重采样次数
+        block_length: 块长，为1时退化为普通自助法
+        rng: numpy随机数生成器
+
+    返回:
+        n_resamples×n的下标矩阵
+    """
+    blocks = -(-n // block_length)
+    starts = rng.integers(0, n, size=(n_resamples, blocks))
+    indices = (starts[:, :, None] + np.arange(block_length)) % n
+    return indices.reshape(n_resamples, blocks * block_length)[:, :n]
+
+
+def _row_ranks(matrix):
+    """逐行求秩（并列取平均秩，1起），整个矩阵一次排序完成"""
+    rows, cols = matrix.shape
+    order = np.argsort(matrix, axis=1, kind='stable')
+    flat = np.take_along_axis(matrix, order, axis=1).ravel()
+
+    # 每行内相等值组成一段，段内取平均秩
+    position = np.tile(np.arange(cols), rows)
+    new_tie = np.ones(flat.size, dtype=bool)
+    new_tie[1:] = (flat[1:] != flat[:-1]) | (position[1:] == 0)
+    starts = np.flatnonzero(new_tie)
+    counts = np.diff(np.append(starts, flat.size))
+    average = position[starts] + (counts + 1) / 2.0
+
+    ranks = np.empty((rows, cols), dtype=np.float64)
+    np.put_along_axis(ranks, order, np.repeat(average, counts).reshape(rows, cols), axis=1)
+    return ranks
+
+
+def _row_correlation(a, b):
+    """逐行计算两矩阵对应行的皮尔逊相关系数"""
+    a = a - a.mean(axis=1, keepdims=True)
+    b = b - b.mean(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.sum(a * b, axis=1) / np.sqrt(np.sum(a * a, axis=1) * np.sum(b * b, axis=1))
+
+
+def _row_slope(a, b):
+    """逐行计算b对a的最小二乘回归斜率"""
+    a = a - a.mean(axis=1, keepdims=True)
+    b = b - b.mean(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.sum(a * b, axis=1) / np.sum(a * a, axis=1)
+
+
+def _bootstrap_batch(x, y, n_resamples, block_length, seed):
+    """
+    计算一个批次的自助法统计量（可在子进程中执行）
+
+    返回:
+        3×n_resamples数组，依次为皮尔逊相关系数、斯皮尔曼相关系数和回归斜率
+    """
+    rng = np.random.default_rng(seed)
+    indices = block_bootstrap_indices(x.size, n_resamples, block_length, rng)
+    xs = x[indices]
+    ys = y[indices]
+    return np.vstack((
+        _row_correlation(xs, ys),
+        _row_correlation(_row_ranks(xs), _row_ranks(ys)),
+        _row_slope(xs, ys)
+    ))
+
+
+def bootstrap_correlation_ci(x, y, n_resamples=2000, confidence=0.95, block_length=None, seed=0, max_workers=None):
+    """
+    用移动块自助法计算皮尔逊相关系数、斯皮尔曼相关系数和回归斜率的百分位置信区间
+
+    重采样以下标矩阵的形式成批生成，每批的统计量都是逐行的向量化计算；
+    样本数较大时各批次分发到进程池并行计算。每批使用由seed派生的独立随机种子，
+    因此结果与是否并行无关、可以复现。
+
+    参数:
+        x, y: 等长的数值序列（按时间排序）
+        n_resamples: 重采样次数
+        confidence: 置信水平
+        block_length: 块长，默认为n的立方根；为1时是普通自助法
+        seed: 随机种子
+        max_workers: 最多并行的批次数，默认为CPU核数；为1时不使用进程池
+
+    返回:
+        字典，包含 pearson、spearman、slope 的 low/high，以及所用参数
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = x.size
+    if block_length is None:
+        block_length = default_block_length(n)
+    block_length = int(min(max(block_length, 1), max(n, 1)))
+
+    # 按内存上限切分批次
+    batch_size = max(1, min(n_resamples, MAX_BATCH_ELEMENTS // max(n, 1)))
+    sizes = [batch_size] * (n_resamples // batch_size)
+    if n_resamples % batch_size:
+        sizes.append(n_resamples % batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    workers = min(max_workers or os.cpu_count() or 1, len(sizes))
+    if n >= PARALLEL_MIN_SAMPLES and workers > 1:
+        # 批次按workers个一组提交到共用进程池，单个请求最多占用workers个进程
+        executor = _get_process_pool()
+        batches = []
+        for start in range(0, len(sizes), workers):
+            futures = [
+                executor.submit(_bootstrap_batch, x, y, size, block_length, s)
+                for size, s in zip(sizes[start:start + workers], seeds[start:start + workers])
+            ]
+            batches.extend(future.result() for future in futures)
+    else:
+        batches = [_bootstrap_batch(x, y, size, block_length, s) for size, s in zip(sizes, seeds)]
+
+    replicates = np.hstack(batches)
+    alpha = (1.0 - confidence) / 2.0
+
+    result = {
+        'method': 'moving_block_bootstrap',
+        'n_resamples': int(n_resamples),
+        'block_length': block_length,
+        'confidence': confidence,
+        'seed': seed
+    }
+    for name, values in zip(('pearson', 'spearman', 'slope'), replicates):
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            result[name] = {'low': None, 'high': None}
+            continue
+        low, high = np.quantile(values, [alpha, 1.0 - alpha])
+        result[name] = {'low': round(float(low), 4), 'high': round(float(high), 4)}
+    return result
+
+
+def permutation_test(x, y, n_permutations=10000, seed=0, method='pearson'):
+    """
+    置换检验：打乱y的顺序n_permutations次，得到相关系数在无关联假设下的经验分布
+
+    x、y先标准化，于是每批置换的相关系数就是一次矩阵-向量乘积；
+    批次大小按MAX_BATCH_ELEMENTS限制，长序列时内存占用有界。
+
+    参数:
+        x, y: 等长的数值序列
+        n_permutations: 置换次数
+        seed: 随机种子（固定种子保证结果可复现）
+        method: 'pearson'或'spearman'（斯皮尔曼在秩上做同样的检验）
+
+    返回:
+        字典，包含 statistic（观测相关系数）、p_value（双侧经验p值）及所用参数
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if method == 'spearman':
+        x = _row_ranks(x[None, :])[0]
+        y = _row_ranks(y[None, :])[0]
+    elif method != 'pearson':
+        raise ValueError(f"不支持的相关方法: {method}")
+
+    n = x.size
+    result = {'method': method, 'n_permutations': int(n_permutations), 'seed': seed,
+              'statistic': None, 'p_value': None}
+    sx = x.std()
+    sy = y.std()
+    if n < 3 or sx == 0 or sy == 0:
+        return result
+
+    xz = (x - x.mean()) / sx
+    yz = (y - y.mean()) / sy
+    observed = float(xz @ yz / n)
+
+    rng = np.random.default_rng(seed)
+    batch_size = max(1, min(n_permutations, MAX_BATCH_ELEMENTS // n))
+    extreme = 0
+    remaining = n_permutations
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        # 每行是0..n-1的一个随机排列
+        permutations = rng.permuted(np.broadcast_to(np.arange(n), (size, n)), axis=1)
+        correlations = yz[permutations] @ xz / n
+        extreme += int(np.count_nonzero(np.abs(correlations) >= abs(observed) - 1e-12))
+        remaining -= size
+
+    result['statistic'] = round(observed, 4)
+    # 加1校正，保证p值不为0
+    result['p_value'] = round((extreme + 1) / (n_permutations + 1), 6)
+    result['min_p_value'] = round(1 / (n_permutations + 1), 6)
+    return result
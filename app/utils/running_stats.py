@@ -0,0 +1,116 @@
+import math
+
+import numpy as np
+
+
+class RunningStats:
+    """
+    可合并的在线统计累加器（Welford算法）
+
+    在解析循环中逐条更新，不需要保留样本；不同文件或不同解析任务得到的累加器
+    可以用merge合并，结果与对全部样本一次计算相同。
+    """
+
+    __slots__ = ('records', 'count', 'mean', 'm2', 'min', 'max', 'first', 'last')
+
+    def __init__(self):
+        self.records = 0  # 记录总数（含非数值记录，如睡眠分类）
+        self.count = 0  # 数值样本数
+        self.mean = 0.0
+        self.m2 = 0.0  # 与均值之差的平方和
+        self.min = math.inf
+        self.max = -math.inf
+        self.first = None  # 最早时间（UTC秒）
+        self.last = None  # 最晚时间（UTC秒）
+
+    def update(self, value=None, start=None, end=None):
+        """
+        加入一条记录
+
+        参数:
+            value: 数值（None表示非数值记录，只计入记录数和时间范围）
+            start: 记录开始时间（UTC秒）
+            end: 记录结束时间（UTC秒），缺省时使用start
+        """
+        self.records += 1
+
+        if value is not None:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+
+        if start is not None:
+            if self.first is None or start < self.first:
+                self.first = start
+            end = start if end is None else end
+            if self.last is None or end > self.last:
+                self.last = end
+
+    def merge(self, other):
+        """合并另一个累加器（Chan等人的并行方差公式），返回self"""
+        if other.count:
+            total = self.count + other.count
+            delta = other.mean - self.mean
+            self.m2 += other.m2 + delta * delta * self.count * other.count / total
+            self.mean += delta * other.count / total
+            self.count = total
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+
+        self.records += other.records
+        if other.first is not None and (self.first is None or other.first < self.first):
+            self.first = other.first
+        if other.last is not None and (self.last is None or other.last > self.last):
+            self.last = other.last
+        return self
+
+    @property
+    def variance(self):
+        """样本方差（ddof=1），样本不足时为NaN"""
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        """样本标准差"""
+        return math.sqrt(self.variance) if self.count > 1 else math.nan
+
+    def to_dict(self):
+        """转换为可JSON序列化的字典（时间为ISO格式UTC字符串）"""
+        def iso(seconds):
+            return None if seconds is None else str(np.datetime64(int(seconds), 's'))
+
+        has_values = self.count > 0
+        return {
+            'records': self.records,
+            'count': self.count,
+            'mean': self.mean if has_values else None,
+            'std': self.std if self.count > 1 else None,
+            'min': self.min if has_values else None,
+            'max': self.max if has_values else None,
+            'first': iso(self.first),
+            'last': iso(self.last)
+        }
+
+
+def merge_stats(target, source):
+    """
+    将按类型分组的累加器字典source合并到target中
+
+    参数:
+        target: 类型 -> RunningStats 字典（就地修改）
+        source: 类型 -> RunningStats 字典
+
+    返回:
+        target
+    """
+    for key, stats in source.items():
+        if key in target:
+            target[key].merge(stats)
+        else:
+            target[key] = RunningStats().merge(stats)
+    return target
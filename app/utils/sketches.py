@@ -0,0 +1,278 @@
+import numpy as np
+
+from app.utils.kernels import segment_bounds
+from app.utils.cache import load_arrays, save_arrays
+
+# 每个分组（如每天）保留的质心数上限
+DEFAULT_SKETCH_SIZE = 200
+# 持久化摘要的结果名称
+SKETCH_ARTIFACT = 'quantile_sketches'
+# 摘要中的数组
+_SKETCH_FIELDS = ('keys', 'offsets', 'values', 'weights')
+
+
+def rank_errors(counts, k):
+    """
+    每个n个样本的单组摘要的最大秩误差：最大分箱为ceil(n/k)个样本，质心取箱内居中的样本，
+    误差不超过半个分箱；n不超过k时摘要是精确的
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    return np.where(counts <= k, 0, -(-counts // k) // 2)
+
+
+def _csr_quantiles(offsets, values, weights, qs):
+    """
+    在按分组连续存放、组内按数值排序的质心上批量查询分位数
+
+    参数:
+        offsets: 每组在values中的起始位置（长度为组数+1）
+        values: 质心数值（组内升序）
+        weights: 质心权重（代表的样本数）
+        qs: 分位数数组（0-1）
+
+    返回:
+        组数×分位数的矩阵
+    """
+    qs = np.asarray(qs, dtype=np.float64)
+    groups = offsets.size - 1
+    result = np.full((groups, qs.size), np.nan)
+    if groups == 0 or values.size == 0:
+        return result
+
+    cumulative = np.cumsum(weights)
+    base = np.concatenate(([0], cumulative))[offsets[:-1]]
+    totals = np.concatenate(([0], cumulative))[offsets[1:]] - base
+
+    # 目标秩（0起），找到累计权重首次超过目标秩的质心
+    ranks = np.floor(qs[None, :] * np.maximum(totals[:, None] - 1, 0))
+    positions = np.searchsorted(cumulative, base[:, None] + ranks, side='right')
+    positions = np.minimum(positions, offsets[1:, None] - 1)
+
+    valid = totals > 0
+    result[valid] = values[positions[valid]]
+    return result
+
+
+class QuantileSketches:
+    """
+    按整数键（如本地日编号、本地小时编号）分组的可合并分位数摘要
+
+    每组样本按数值排序后切成至多k个等深分箱，每箱只保留秩居中的样本作为质心、
+    以箱内样本数作为权重。构建过程对所有分组一次向量化完成。
+
+    误差界: 单组n个样本时，任一分位数的秩误差不超过 ceil(n/k)/2；
+    合并多个组时直接拼接质心（不再压缩），秩误差不超过各组误差之和，
+    即约 N/(2k) + 组数/2（N为合并后的样本总数）。样本数不超过k的组是精确的。
+    """
+
+    def __init__(self, keys, offsets, values, weights, k, errors=None):
+        self.keys = keys  # 升序的唯一分组键
+        self.offsets = offsets  # 每组质心的起始位置（长度为组数+1）
+        self.values = values  # 质心数值（组内升序）
+        self.weights = weights  # 质心权重
+        self.k = k
+        self.errors = errors  # 每组的秩误差上限，None表示由样本数和k计算（见merge）
+
+    @classmethod
+    def build(cls, keys, values, k=DEFAULT_SKETCH_SIZE):
+        """
+        由样本构建每个键的摘要
+
+        参数:
+            keys: 每个样本的整数分组键
+            values: 样本数值，NaN会被忽略
+            k: 每组最多保留的质心数
+
+        返回:
+            QuantileSketches
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        keys = keys[valid]
+        values = values[valid]
+
+        # 按(键, 数值)排序
+        order = np.lexsort((values, keys))
+        keys = keys[order]
+        values = values[order]
+
+        unique_keys, starts, counts = segment_bounds(keys)
+        if unique_keys.size == 0:
+            empty = np.empty(0, dtype=np.float64)
+            return cls(unique_keys, np.zeros(1, dtype=np.int64), empty, np.empty(0, dtype=np.int64), k)
+
+        # 每个样本在组内的秩及所属等深分箱
+        group_counts = np.repeat(counts, counts)
+        ranks = np.arange(keys.size) - np.repeat(starts, counts)
+        bins = ranks * np.minimum(group_counts, k) // group_counts
+
+        # (键, 分箱)为一个质心，取箱内秩居中的样本
+        box_keys = np.repeat(np.arange(unique_keys.size), counts) * k + bins
+        _, box_starts, box_counts = segment_bounds(box_keys)
+        centroid_values = values[box_starts + box_counts // 2]
+
+        centroid_groups = box_keys[box_starts] // k
+        offsets = np.searchsorted(centroid_groups, np.arange(unique_keys.size + 1))
+
+        return cls(unique_keys, offsets.astype(np.int64), centroid_values, box_counts.astype(np.int64), k)
+
+    @classmethod
+    def merge(cls, sketches):
+        """
+        合并多个摘要（如同一指标的多个类型别名）：同一键的质心直接拼接，不再压缩
+
+        合并后每组的秩误差上限为各摘要该键误差之和，rank_error_bound仍然成立。
+
+        参数:
+            sketches: QuantileSketches序列，None会被跳过
+
+        返回:
+            QuantileSketches，没有可合并的摘要时返回None
+        """
+        sketches = [sketch for sketch in sketches if sketch is not None]
+        if len(sketches) <= 1:
+            return sketches[0] if sketches else None
+
+        keys = np.concatenate([np.repeat(sketch.keys, np.diff(sketch.offsets)) for sketch in sketches])
+        values = np.concatenate([sketch.values for sketch in sketches])
+        weights = np.concatenate([sketch.weights for sketch in sketches])
+        order = np.lexsort((values, keys))
+        keys = keys[order]
+
+        unique_keys, starts, _ = segment_bounds(keys)
+        errors = np.zeros(unique_keys.size, dtype=np.int64)
+        for sketch in sketches:
+            errors[np.searchsorted(unique_keys, sketch.keys)] += sketch.group_errors()
+
+        offsets = np.append(starts, keys.size).astype(np.int64)
+        k = max(sketch.k for sketch in sketches)
+        return cls(unique_keys, offsets, values[order], weights[order].astype(np.int64), k, errors)
+
+    @property
+    def counts(self):
+        """每组的样本数"""
+        return np.add.reduceat(self.weights, self.offsets[:-1]) if self.keys.size else np.empty(0, dtype=np.int64)
+
+    def quantiles(self, qs):
+        """
+        每个键各自的分位数
+
+        返回:
+            (键数组, 键数×分位数矩阵)
+        """
+        return self.keys, _csr_quantiles(self.offsets, self.values, self.weights, qs)
+
+    def grouped_quantiles(self, groups, qs):
+        """
+        先按groups合并各键的摘要，再查询每个合并组的分位数
+
+        参数:
+            groups: 与self.keys等长的整数组号（如 key % 24 得到一天中的小时）
+            qs: 分位数数组
+
+        返回:
+            (唯一组号数组, 组数×分位数矩阵, 每组样本数)
+        """
+        groups = np.asarray(groups, dtype=np.int64)
+        sizes = np.diff(self.offsets)
+        centroid_groups = np.repeat(groups, sizes)
+
+        order = np.lexsort((self.values, centroid_groups))
+        centroid_groups = centroid_groups[order]
+        unique_groups, starts, _ = segment_bounds(centroid_groups)
+        offsets = np.append(starts, centroid_groups.size).astype(np.int64)
+
+        weights = self.weights[order]
+        matrix = _csr_quantiles(offsets, self.values[order], weights, qs)
+        totals = np.add.reduceat(weights, starts) if starts.size else np.empty(0, dtype=np.int64)
+        return unique_groups, matrix, totals
+
+    def range_quantiles(self, qs, start=None, end=None):
+        """
+        合并[start, end]范围内所有键的摘要并查询分位数
+
+        返回:
+            (分位数数组, 样本数)；范围内没有数据时分位数为NaN、样本数为0
+        """
+        selected = np.ones(self.keys.size, dtype=bool)
+        if start is not None:
+            selected &= self.keys >= start
+        if end is not None:
+            selected &= self.keys <= end
+
+        groups = np.where(selected, 0, 1)
+        unique_groups, matrix, totals = self.grouped_quantiles(groups, qs)
+        if unique_groups.size == 0 or unique_groups[0] != 0:
+            return np.full(len(qs), np.nan), 0
+        return matrix[0], int(totals[0])
+
+    def rank_error_bound(self, mask=None):
+        """
+        合并所选键的摘要后分位数查询的最大秩误差（样本个数）
+
+        参数:
+            mask: 与self.keys等长的布尔数组，缺省为全部键
+        """
+        errors = self.group_errors()
+        if mask is not None:
+            errors = errors[mask]
+        return int(errors.sum())
+
+    def group_errors(self):
+        """每组查询分位数的最大秩误差（样本个数）"""
+        return self.errors if self.errors is not None else rank_errors(self.counts, self.k)
+
+    def to_arrays(self):
+        """摘要的数组形式（用于持久化），k作为单元素数组保存"""
+        arrays = {field: getattr(self, field) for field in _SKETCH_FIELDS}
+        arrays['k'] = np.array([self.k], dtype=np.int64)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """由to_arrays的结果恢复摘要"""
+        return cls(*(arrays[field] for field in _SKETCH_FIELDS), int(arrays['k'][0]))
+
+
+def save_sketches(directory, version, sketches):
+    """
+    将多个摘要持久化为一个.npz文件（与数据集的其他派生结果放在一起）
+
+    参数:
+        directory: artifact_dir返回的目录
+        version: 数据集版本
+        sketches: (类型, 时间粒度) -> QuantileSketches或None（None表示该类型没有数值数据）
+
+    返回:
+        是否写入成功
+    """
+    arrays = {}
+    index = []
+    for position, ((data_type, granularity), sketch) in enumerate(sketches.items()):
+        index.append(f"{data_type}\t{granularity}\t{int(sketch is not None)}")
+        if sketch is not None:
+            for field, array in sketch.to_arrays().items():
+                arrays[f"{position}_{field}"] = array
+    arrays['index'] = np.array(index, dtype=str)
+    return save_arrays(directory, SKETCH_ARTIFACT, version, arrays)
+
+
+def load_sketches(directory, version):
+    """
+    读取save_sketches保存的摘要
+
+    返回:
+        (类型, 时间粒度) -> QuantileSketches或None的字典，尚未保存或数据已变化时返回None
+    """
+    arrays = load_arrays(directory, SKETCH_ARTIFACT, version)
+    if arrays is None or 'index' not in arrays:
+        return None
+
+    sketches = {}
+    for position, entry in enumerate(arrays['index'].tolist()):
+        data_type, granularity, present = entry.split('\t')
+        sketches[(data_type, granularity)] = QuantileSketches.from_arrays({
+            field: arrays[f"{position}_{field}"] for field in _SKETCH_FIELDS + ('k',)
+        }) if present == '1' else None
+    return sketches
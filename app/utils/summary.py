@@ -0,0 +1,172 @@
+import numpy as np
+
+from app.utils.health_parser import HEART_RATE_TYPES, STEP_COUNT_TYPES, SLEEP_TYPES
+from app.utils.cache import dataset_version, artifact_dir, load_artifact, save_artifact
+
+# 持久化摘要的结果名称
+SUMMARY_ARTIFACT = 'health_summary'
+# 摘要的格式版本，增加字段后递增，读取到旧格式的摘要时重新计算
+SUMMARY_FORMAT = 2
+# 压力等级的阈值：低于LOW为低压力，高于HIGH为高压力，其余为中等压力
+LOW_STRESS_THRESHOLD = 5
+HIGH_STRESS_THRESHOLD = 10
+
+
+def _daily_rollup(parser, type_names):
+    """合并所有类型别名的每日汇总（与get_daily_step_count、get_stress_indicators读取的样本相同）"""
+    return parser.get_rollup(tuple(type_names), 'day')
+
+
+def _heart_rate_section(parser):
+    """心率：解析时累积的在线统计 + 每日分位数摘要合并得到的分位数"""
+    stats = parser.get_heart_rate_stats()
+    if not stats:
+        return None
+
+    mean_hr = float(stats['平均心率'])
+    hr_status = "正常"
+    if mean_hr > 100:
+        hr_status = "偏高"
+    elif mean_hr < 60:
+        hr_status = "偏低"
+
+    section = {
+        'average': mean_hr,
+        'max': float(stats['最高心率']),
+        'min': float(stats['最低心率']),
+        'status': hr_status
+    }
+
+    percentiles = parser.get_heart_rate_percentiles()
+    if percentiles:
+        section.update({
+            'p5': percentiles['P5心率'],
+            'median': percentiles['心率中位数'],
+            'p95': percentiles['P95心率']
+        })
+    return section
+
+
+def _steps_section(rollup):
+    """步数：每日总步数（去重后）的合计、平均值和最高/最低值"""
+    if rollup is None:
+        return None
+
+    avg_steps = float(np.mean(rollup['sum']))
+    activity_level = "低活动量"
+    if avg_steps >= 10000:
+        activity_level = "高活动量"
+    elif avg_steps >= 7500:
+        activity_level = "中高活动量"
+    elif avg_steps >= 5000:
+        activity_level = "中等活动量"
+
+    return {
+        'average': avg_steps,
+        'total': float(np.sum(rollup['sum'])),
+        'max': float(np.max(rollup['sum'])),
+        'min': float(np.min(rollup['sum'])),
+        'activity_level': activity_level
+    }
+
+
+def _sleep_section(rollup):
+    """睡眠：每日入睡时长之和的平均值和最长/最短值"""
+    if rollup is None:
+        return None
+
+    avg_sleep = float(np.mean(rollup['sum']))
+    sleep_status = "正常"
+    if avg_sleep < 6:
+        sleep_status = "睡眠不足"
+    elif avg_sleep > 9:
+        sleep_status = "睡眠过多"
+
+    return {
+        'average': avg_sleep,
+        'max': float(np.max(rollup['sum'])),
+        'min': float(np.min(rollup['sum'])),
+        'status': sleep_status
+    }
+
+
+def _stress_section(rollup):
+    """压力：由每日心率标准差和范围计算的压力指数（与get_stress_indicators相同的公式）的平均值"""
+    if rollup is None:
+        return None
+
+    stress_index = np.clip((rollup['std'] * 0.6 + rollup['range'] * 0.4) / 10.0, 1, 10)
+    avg_stress = float(np.mean(stress_index))
+    stress_level = "中等压力"
+    if avg_stress > HIGH_STRESS_THRESHOLD:
+        stress_level = "高压力"
+    elif avg_stress < LOW_STRESS_THRESHOLD:
+        stress_level = "低压力"
+
+    return {
+        'average': avg_stress,
+        'level': stress_level
+    }
+
+
+def build_health_summary(parser):
+    """
+    一次遍历计算健康摘要的所有部分
+
+    除心电图外，各部分都只读取解析器的在线统计和每日汇总（每个类型只汇总一次），
+    不再为每一部分单独扫描原始记录。
+
+    参数:
+        parser: 已加载数据的HealthDataParser实例
+
+    返回:
+        摘要字典（heart_rate、steps、sleep、stress、ecg，没有数据的部分不包含；以及data_types）
+    """
+    heart_rate_rollup = _daily_rollup(parser, HEART_RATE_TYPES)
+    sections = {
+        'heart_rate': _heart_rate_section(parser),
+        'steps': _steps_section(_daily_rollup(parser, STEP_COUNT_TYPES)),
+        'sleep': _sleep_section(_daily_rollup(parser, SLEEP_TYPES)),
+        'stress': _stress_section(heart_rate_rollup)
+    }
+
+    ecg_data = parser.get_ecg_data()
+    if not ecg_data.empty:
+        sections['ecg'] = {
+            'count': int(len(ecg_data)),
+            'status': '已记录'
+        }
+
+    summary = {name: section for name, section in sections.items() if section}
+    # 可用数据类型列表随摘要一起保存，仪表板页面不需要解析数据就能显示
+    summary['data_types'] = parser.get_all_data_types()
+    summary['format'] = SUMMARY_FORMAT
+    return summary
+
+
+def load_health_summary(data_file_path=None, data_dir_path=None):
+    """
+    读取与数据集一起持久化的健康摘要
+
+    返回:
+        摘要字典，尚未生成或数据已变化时返回None
+    """
+    version = dataset_version(data_file_path, data_dir_path)
+    summary = load_artifact(artifact_dir(data_file_path, data_dir_path), SUMMARY_ARTIFACT, version)
+    # 早期格式保存的摘要缺少部分字段，按尚未生成处理
+    if summary is not None and summary.get('format') != SUMMARY_FORMAT:
+        return None
+    return summary
+
+
+def persist_health_summary(parser, data_file_path=None, data_dir_path=None):
+    """
+    计算健康摘要并与数据集一起持久化（上传解析完成后调用）
+
+    返回:
+        摘要字典
+    """
+    summary = build_health_summary(parser)
+    version = dataset_version(data_file_path, data_dir_path)
+    save_artifact(artifact_dir(data_file_path, data_dir_path), SUMMARY_ARTIFACT, version, summary)
+    return summary
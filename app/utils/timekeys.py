@@ -0,0 +1,274 @@
+import datetime
+
+import numpy as np
+from app.utils.lazy import lazy_module
+
+pd = lazy_module('pandas')
+
+# 无效日期对应的本地日编号
+INVALID_DAY = np.iinfo(np.int32).min
+
+# Apple健康导出的时间格式: "2024-01-01 08:00:00 -0500"
+_APPLE_TIMESTAMP_LENGTH = 25
+_SEPARATORS = {4: '-', 7: '-', 10: ' ', 13: ':', 16: ':', 19: ' '}
+_DIGIT_POSITIONS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18, 21, 22, 23, 24]
+
+
+def _strict_apple_rows(codes, lengths):
+    """判断每一行是否严格符合Apple健康导出的时间格式"""
+    strict = lengths == _APPLE_TIMESTAMP_LENGTH
+    for position, char in _SEPARATORS.items():
+        strict &= codes[:, position] == ord(char)
+    strict &= (codes[:, 20] == ord('+')) | (codes[:, 20] == ord('-'))
+    digits = codes[:, _DIGIT_POSITIONS]
+    strict &= ((digits >= ord('0')) & (digits <= ord('9'))).all(axis=1)
+    return strict
+
+
+def _parse_single(text):
+    """
+    逐条解析非标准格式的时间字符串（如ISO 8601、带Z后缀或不带时区的时间）
+
+    返回:
+        (本地墙钟时间的秒数, UTC偏移分钟数)，无法解析时返回None
+    """
+    try:
+        ts = pd.Timestamp(text)
+    except Exception:
+        return None
+    if ts is pd.NaT:
+        return None
+
+    offset = ts.utcoffset()
+    offset_minutes = int(offset.total_seconds() // 60) if offset is not None else 0
+    if ts.tzinfo is not None:
+        ts = ts.tz_localize(None)
+    return ts.value // 10**9, offset_minutes
+
+
+def parse_timestamps(values):
+    """
+    向量化解析时间字符串，按每条记录自身的UTC偏移计算本地日编号和当日分钟数
+
+    Apple健康导出格式的记录直接在字符编码数组上解析；其他格式的记录逐条回退解析。
+    不带时区信息的时间视为本地墙钟时间（偏移记为0）。
+
+    参数:
+        values: 时间字符串序列（None或空值视为无效）
+
+    返回:
+        字典，包含:
+            local: 本地墙钟时间（datetime64[s]，无效为NaT）
+            utc: UTC时间（datetime64[s]，无效为NaT）
+            offset: UTC偏移分钟数（int16）
+            local_day: 本地日编号，即自1970-01-01起的天数（int32，无效为INVALID_DAY）
+            minute: 本地当日分钟数0-1439（int16，无效为-1）
+            valid: 是否解析成功（bool）
+    """
+    strings = ['' if value is None or (isinstance(value, float) and value != value) else str(value) for value in values]
+    n = len(strings)
+
+    local_seconds = np.zeros(n, dtype=np.int64)
+    offsets = np.zeros(n, dtype=np.int64)
+    valid = np.zeros(n, dtype=bool)
+
+    if n:
+        text = np.array(strings, dtype=str)
+        width = text.dtype.itemsize // 4
+        if width >= _APPLE_TIMESTAMP_LENGTH:
+            codes = text.view(np.uint32).reshape(n, width)
+            lengths = (codes != 0).sum(axis=1)
+            strict = _strict_apple_rows(codes, lengths)
+        else:
+            strict = np.zeros(n, dtype=bool)
+
+        if strict.any():
+            rows = np.flatnonzero(strict)
+            try:
+                # 前19个字符为本地墙钟时间，由numpy在C层解析
+                wall = text[rows].astype('U19').astype('datetime64[s]').astype(np.int64)
+                sub = codes[rows]
+                digits = sub[:, 21:25].astype(np.int64) - ord('0')
+                sign = np.where(sub[:, 20] == ord('-'), -1, 1)
+                local_seconds[rows] = wall
+                offsets[rows] = sign * ((digits[:, 0] * 10 + digits[:, 1]) * 60 + digits[:, 2] * 10 + digits[:, 3])
+                valid[rows] = True
+            except ValueError:
+                # 存在非法日期（如月份越界），整体改为逐条解析
+                strict[:] = False
+
+        for i in np.flatnonzero(~strict):
+            if not strings[i]:
+                continue
+            parsed = _parse_single(strings[i])
+            if parsed is not None:
+                local_seconds[i], offsets[i] = parsed
+                valid[i] = True
+
+    local_day = np.where(valid, local_seconds // 86400, INVALID_DAY).astype(np.int32)
+    minute = np.where(valid, (local_seconds % 86400) // 60, -1).astype(np.int16)
+
+    local = local_seconds.astype('datetime64[s]')
+    utc = (local_seconds - offsets * 60).astype('datetime64[s]')
+    local[~valid] = np.datetime64('NaT')
+    utc[~valid] = np.datetime64('NaT')
+
+    return {
+        'local': local,
+        'utc': utc,
+        'offset': offsets.astype(np.int16),
+        'local_day': local_day,
+        'minute': minute,
+        'valid': valid
+    }
+
+
+def days_to_iso(days):
+    """将本地日编号转换为'YYYY-MM-DD'字符串数组"""
+    return np.asarray(days, dtype=np.int64).astype('datetime64[D]').astype(str)
+
+
+def days_to_dates(days):
+    """将本地日编号转换为datetime.date对象数组"""
+    return np.asarray(days, dtype=np.int64).astype('datetime64[D]').astype(object)
+
+
+def date_to_day(date):
+    """将日期（date、Timestamp或字符串）转换为本地日编号"""
+    return int(np.datetime64(pd.Timestamp(date).date(), 'D').astype(np.int64))
+
+
+def window_start_day(days, today=None):
+    """
+    “最近days天”窗口的起始本地日编号（与按pd.Timestamp.now() - days的日期截取一致）
+
+    参数:
+        days: 天数，为None时表示不限制
+        today: 当天日期，默认为今天
+
+    返回:
+        起始本地日编号，days为None时返回None
+    """
+    if days is None:
+        return None
+    today = np.datetime64(today or datetime.date.today(), 'D')
+    return int((today - np.timedelta64(int(days), 'D')).astype(np.int64))
+
+
+def prefilter_since(values, since_day):
+    """
+    在解析时间之前按字符串前缀粗筛时间窗口
+
+    以'YYYY-MM-DD'开头的时间字符串（Apple导出格式和ISO 8601）前10个字符就是记录的本地日期，
+    直接与窗口起始日期做字典序比较即可；其他格式无法判断，一律保留，由解析后的local_day精确过滤。
+
+    参数:
+        values: 原始时间字符串序列
+        since_day: 窗口起始本地日编号
+
+    返回:
+        布尔数组，False表示该记录一定在窗口之外
+    """
+    n = len(values)
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+
+    prefix = np.array(['' if value is None else str(value) for value in values], dtype='U10')
+    codes = prefix.view(np.uint32).reshape(n, 10)
+    digits = codes[:, [0, 1, 2, 3, 5, 6, 8, 9]]
+    dated = (codes[:, 4] == ord('-')) & (codes[:, 7] == ord('-')) & ((digits >= ord('0')) & (digits <= ord('9'))).all(axis=1)
+    return ~dated | (prefix >= days_to_iso([since_day])[0])
+
+
+# 支持的时间粒度
+GRANULARITIES = ('hour', 'day', 'week')
+# 各时间粒度的单位名称
+GRANULARITY_UNITS = {'hour': '小时', 'day': '天', 'week': '周'}
+
+
+def bucket_keys(local_day, minute, granularity='day'):
+    """
+    由本地日编号和当日分钟数计算整数时间桶键
+
+    参数:
+        local_day: 本地日编号数组
+        minute: 本地当日分钟数数组
+        granularity: 'day'（键为本地日编号）、'hour'（键为自1970-01-01起的本地小时数）
+            或'week'（键为周编号，每周从周一开始；1970-01-01是周四，第0周从1969-12-29开始）
+
+    返回:
+        int64桶键数组
+    """
+    days = np.asarray(local_day, dtype=np.int64)
+    if granularity == 'day':
+        return days
+    if granularity == 'hour':
+        return days * 24 + np.asarray(minute, dtype=np.int64) // 60
+    if granularity == 'week':
+        return (days + 3) // 7
+    raise ValueError(f"不支持的时间粒度: {granularity}")
+
+
+def bucket_starts(keys, granularity='day'):
+    """将整数时间桶键转换为桶起点的本地时间（datetime64[s]，按周为该周周一0点）"""
+    keys = np.asarray(keys, dtype=np.int64)
+    if granularity == 'day':
+        return keys.astype('datetime64[D]').astype('datetime64[s]')
+    if granularity == 'hour':
+        return keys.astype('datetime64[h]').astype('datetime64[s]')
+    if granularity == 'week':
+        return (keys * 7 - 3).astype('datetime64[D]').astype('datetime64[s]')
+    raise ValueError(f"不支持的时间粒度: {granularity}")
+
+
+def bucket_labels(keys, granularity='day'):
+    """
+    将整数时间桶键转换为ISO格式字符串
+    （按日为'YYYY-MM-DD'，按小时为'YYYY-MM-DDTHH:MM'，按周为该周周一的'YYYY-MM-DD'）
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    if granularity == 'day':
+        return days_to_iso(keys)
+    if granularity == 'hour':
+        return np.datetime_as_string(keys.astype('datetime64[h]'), unit='m')
+    if granularity == 'week':
+        return days_to_iso(keys * 7 - 3)
+    raise ValueError(f"不支持的时间粒度: {granularity}")
+
+
+def _days_from_civil(year, month, day):
+    """公历日期转换为自1970-01-01起的天数（Howard Hinnant算法）"""
+    year -= month <= 2
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def timestamp_to_utc_seconds(text):
+    """
+    逐条将时间字符串转换为UTC秒数（解析循环中使用，不构造数组）
+
+    Apple健康导出格式直接切片解析，其他格式回退到pandas解析。
+
+    返回:
+        int秒数，无法解析时返回None
+    """
+    if not text or not isinstance(text, str):
+        return None
+
+    if len(text) == _APPLE_TIMESTAMP_LENGTH and text[20] in '+-':
+        try:
+            days = _days_from_civil(int(text[0:4]), int(text[5:7]), int(text[8:10]))
+            seconds = days * 86400 + int(text[11:13]) * 3600 + int(text[14:16]) * 60 + int(text[17:19])
+            offset = int(text[21:23]) * 60 + int(text[23:25])
+            return seconds - (offset if text[20] == '+' else -offset) * 60
+        except ValueError:
+            pass
+
+    parsed = _parse_single(text)
+    if parsed is None:
+        return None
+    local_seconds, offset_minutes = parsed
+    return local_seconds - offset_minutes * 60
@@ -0,0 +1,112 @@
+import numpy as np
+
+from app.utils.kernels import segment_stats
+from app.utils.timekeys import bucket_keys, bucket_starts, GRANULARITIES
+from app.utils.downsampling import downsample
+from app.utils.health_parser import is_cumulative_type, SLEEP_TYPES, HEART_RATE_TYPES, STEP_COUNT_TYPES
+from app.utils.cache import load_arrays, save_arrays
+
+# 视口取数支持的指标（类型别名列表，使用第一个有数据的类型）
+VIEWPORT_METRICS = {'heart_rate': HEART_RATE_TYPES, 'steps': STEP_COUNT_TYPES, 'sleep': SLEEP_TYPES}
+# 各时间粒度一个桶的秒数
+BUCKET_SECONDS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+# 持久化视口样本的结果名称
+VIEWPORT_ARTIFACT = 'viewport_samples'
+
+
+def build_viewport_store(parser):
+    """
+    提取各视口指标按本地时间排序的样本列（每个指标只保留视口取数需要的四列）
+
+    参数:
+        parser: 已加载数据的HealthDataParser
+
+    返回:
+        数组字典：'{指标}_local'（本地墙钟时间的秒数）、'{指标}_value'、'{指标}_day'（本地日编号）、
+        '{指标}_minute'（当日分钟数）和'{指标}_cumulative'；没有数据的指标不包含在内
+    """
+    store = {}
+    for metric, type_names in VIEWPORT_METRICS.items():
+        data_type = next((t for t in type_names if t in parser.record_types), None)
+        if data_type is None:
+            continue
+        samples, column = parser.get_range_samples(data_type)
+        if samples.empty:
+            continue
+        store[f'{metric}_local'] = samples['startDate'].to_numpy(dtype='datetime64[s]').astype(np.int64)
+        store[f'{metric}_value'] = samples[column].to_numpy(dtype=float)
+        store[f'{metric}_day'] = samples['local_day'].to_numpy(dtype=np.int64)
+        store[f'{metric}_minute'] = samples['minute'].to_numpy(dtype=np.int64)
+        store[f'{metric}_cumulative'] = np.array([is_cumulative_type(data_type)])
+    return store
+
+
+def save_viewport_store(directory, version, store):
+    """将build_viewport_store的结果与数据集的其他派生结果一起持久化"""
+    return save_arrays(directory, VIEWPORT_ARTIFACT, version, store)
+
+
+def load_viewport_store(directory, version):
+    """读取持久化的视口样本，尚未保存或数据已变化时返回None"""
+    return load_arrays(directory, VIEWPORT_ARTIFACT, version)
+
+
+def viewport_series(store, metric, start=None, end=None, width=1000):
+    """
+    按视口（可见时间范围和像素宽度）返回合适分辨率的序列，缩放/平移时只取可见部分的数据
+
+    样本按本地时间排序，可见范围用二分查找截取。测量型数据（如心率）每像素不到一小时或样本不多时
+    返回范围内的原始样本（按像素列做minmax降采样，保留极值）；其余情况选择桶宽不小于每像素时长的
+    最细粒度（小时、天或周），在范围内的样本上分桶汇总，累计型数据求和、其余求平均，
+    桶数仍超过像素数时再做LTTB降采样。
+
+    参数:
+        store: build_viewport_store或load_viewport_store返回的数组字典
+        metric: VIEWPORT_METRICS中的指标名
+        start: 可见范围起点的本地时间（datetime64），None表示不限制
+        end: 可见范围终点的本地时间（datetime64，不含），None表示不限制
+        width: 视口的像素宽度
+
+    返回:
+        字典，包含metric、resolution（'raw'或时间粒度）、aggregation、
+        x（本地墙钟时间的毫秒数，plotly日期轴直接使用）、y和count（范围内的样本数）；没有数据时返回None
+    """
+    if f'{metric}_local' not in store:
+        return None
+
+    seconds = store[f'{metric}_local']
+    lo = 0 if start is None else int(np.searchsorted(seconds, np.datetime64(start, 's').astype(np.int64), 'left'))
+    hi = seconds.size if end is None else int(np.searchsorted(seconds, np.datetime64(end, 's').astype(np.int64), 'left'))
+    if hi <= lo:
+        return None
+
+    local = seconds[lo:hi].astype('datetime64[s]')
+    values = store[f'{metric}_value'][lo:hi]
+    first = local[0] if start is None else np.datetime64(start, 's')
+    last = local[-1] if end is None else np.datetime64(end, 's')
+    seconds_per_pixel = max(float((last - first) / np.timedelta64(1, 's')), 1.0) / width
+    cumulative = bool(store[f'{metric}_cumulative'][0])
+
+    if not cumulative and (seconds_per_pixel < BUCKET_SECONDS['hour'] or values.size <= 2 * width):
+        # 每个像素列保留最小值和最大值（样本不多于两倍像素数时原样返回）
+        selected = downsample(local, values, 2 * width, 'minmax')
+        x, y = local[selected], values[selected]
+        resolution, aggregation = 'raw', None
+    else:
+        resolution = next((g for g in GRANULARITIES if BUCKET_SECONDS[g] >= seconds_per_pixel), GRANULARITIES[-1])
+        aggregation = 'sum' if cumulative else 'mean'
+        keys = bucket_keys(store[f'{metric}_day'][lo:hi], store[f'{metric}_minute'][lo:hi], resolution)
+        stats = segment_stats(keys, values, assume_sorted=True)
+        x, y = bucket_starts(stats['key'], resolution), stats[aggregation]
+        if x.size > width:
+            selected = downsample(x, y, width, 'lttb')
+            x, y = x[selected], y[selected]
+
+    return {
+        'metric': metric,
+        'resolution': resolution,
+        'aggregation': aggregation,
+        'x': x.astype('datetime64[ms]').astype(np.int64).astype(np.float64),
+        'y': np.asarray(y, dtype=np.float64),
+        'count': int(values.size)
+    }
@@ -1,11 +1,58 @@
-import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import json
 import traceback
 import datetime
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from app.utils.kernels import segment_stats
+from app.utils.timekeys import days_to_iso, window_start_day
+from app.utils.profiles import WEEKDAY_LABELS, slot_labels
+from app.utils.downsampling import downsample, DEFAULT_MAX_POINTS
+from app.utils.figures import figure, hrect, hline, subplot_grid, cell_domain, encode_figure, decode_figure
+from app.utils.health_parser import is_cumulative_type, SLEEP_TYPES
+from app.utils.cache import result_cache, peek_payload, store_payload
+from app.utils.lazy import lazy_module
+
+# pandas在首次绘图时才导入
+pd = lazy_module('pandas')
+
+# 综合仪表板的面板（2×2网格，行优先）及其标题
+DASHBOARD_PANELS = ('steps', 'heart_rate', 'sleep', 'ecg')
+DASHBOARD_TITLES = {'steps': '每日步数', 'heart_rate': '心率变化', 'sleep': '睡眠时长', 'ecg': 'ECG记录'}
+# 并行构建面板的线程数（所有请求共用，保证并发有上限）
+PANEL_WORKERS = 4
+# 每次请求等待面板的最长时间（秒），超时的面板显示为“加载中”并在后台继续计算
+PANEL_TIMEOUT = 10.0
+# 持久化仪表板面板的结果名称
+PANELS_ARTIFACT = 'dashboard_panels'
+
+_panel_executor = ThreadPoolExecutor(max_workers=PANEL_WORKERS, thread_name_prefix='dashboard-panel')
+# 正在构建的面板：(数据集版本, 面板名, 窗口起始日) -> Future；超时后仍在后台运行的面板被再次请求时复用，不重复提交
+_inflight_panels = {}
+_inflight_lock = threading.Lock()
+
+def _panels_params(days):
+    """持久化面板的参数：内容随“最近days天”窗口的起始日变化"""
+    return {'days': days, 'since_day': window_start_day(days)}
+
+def save_dashboard_panels(directory, version, days, panels):
+    """
+    将build_dashboard_panels的结果与数据集的其他派生结果一起持久化（上传时和离线报告生成后调用）
+
+    返回:
+        是否已缓存（version为None时不缓存）
+    """
+    return store_payload(version, directory, PANELS_ARTIFACT, encode_figure(panels), _panels_params(days)) is not None
+
+def load_dashboard_panels(directory, version, days):
+    """
+    读取持久化的仪表板面板（数值数组还原为numpy数组，日期为ISO字符串）
+
+    返回:
+        面板字典，尚未保存、数据已变化或窗口起始日已变化时返回None
+    """
+    text, _ = peek_payload(version, directory, PANELS_ARTIFACT, _panels_params(days))
+    return decode_figure(text) if text is not None else None
 
 class HealthDataVisualizer:
     """Apple健康数据可视化类"""
@@ -15,458 +62,585 @@ class HealthDataVisualizer:
         初始化可视化器
         
         参数:
-            parser: HealthDataParser实例，用于获取健康数据
+            parser: HealthDataParser实例，用于获取健康数据；只读取已缓存或正在构建的仪表板面板时可以为None
         """
         self.parser = parser
+        self.panel_timings = {}  # 最近一次创建仪表板时各面板的状态和耗时
     
-    def plot_daily_steps(self):
-        """绘制每日步数图表"""
-        daily_steps = self.parser.get_daily_step_count()
+    def plot_daily_steps(self, days=None):
+        """
+        绘制每日步数图表
+        
+        参数:
+            days: 只显示最近多少天，None表示全部历史
+        """
+        daily_steps = self.parser.get_daily_step_count(window_start_day(days))
         if daily_steps.empty:
             return None
         
-        fig = px.bar(
-            daily_steps, 
-            x='日期', 
-            y='步数',
-            title='每日步数',
-            labels={'日期': '日期', '步数': '步数'},
-            color_discrete_sequence=['#1f77b4']
-        )
-        
         # 添加平均线
-        avg_steps = daily_steps['步数'].mean()
-        fig.add_hline(
-            y=avg_steps,
-            line_dash="dash",
-            line_color="red",
-            annotation_text=f"平均: {avg_steps:.0f}步",
-            annotation_position="top right"
-        )
+        avg_steps = float(daily_steps['步数'].mean())
+        shape, annotation = hline(avg_steps, 'red', f"平均: {avg_steps:.0f}步")
         
-        # 设置布局
-        fig.update_layout(
-            xaxis_title='日期',
-            yaxis_title='步数',
-            hovermode='x unified',
-            height=400
+        return figure(
+            [{
+                'type': 'bar',
+                'x': daily_steps['日期'].to_numpy(),
+                'y': daily_steps['步数'].to_numpy(dtype=float),
+                'name': '',
+                'marker': {'color': '#1f77b4'},
+                'hovertemplate': '日期=%{x}<br>步数=%{y}<extra></extra>'
+            }],
+            {
+                'title': {'text': '每日步数'},
+                'xaxis': {'title': {'text': '日期'}},
+                'yaxis': {'title': {'text': '步数'}},
+                'hovermode': 'x unified',
+                'height': 400,
+                'shapes': [shape],
+                'annotations': [annotation]
+            }
         )
-        
-        return json.loads(fig.to_json())
     
-    def plot_heart_rate_over_time(self):
-        """绘制心率随时间变化图表"""
-        hr_data = self.parser.get_heart_rate_data()
-        if hr_data.empty:
-            return None
-        
-        # 确保value列是数值类型
-        hr_data['value'] = pd.to_numeric(hr_data['value'], errors='coerce')
+    def _downsample_heart_rate(self, heart_rate_data, max_points, method='lttb'):
+        """
+        将心率样本按本地时间排序并降采样到至多max_points个点（保留峰值和谷值）
         
-        # 重采样为小时数据点以减少数据量
-        hr_data.set_index('startDate', inplace=True)
-        hr_hourly = hr_data.resample('H').mean().reset_index()
+        返回:
+            只包含选中样本的DataFrame
+        """
+        hr = heart_rate_data.dropna(subset=['startDate', 'value']).sort_values('startDate', kind='mergesort')
+        if hr.empty:
+            return hr
         
-        # 创建图表
-        fig = px.line(
-            hr_hourly, 
-            x='startDate', 
-            y='value',
-            title='心率变化趋势',
-            labels={'startDate': '时间', 'value': '心率 (bpm)'},
-            color_discrete_sequence=['#ff7f0e']
+        selected = downsample(
+            hr['startDate'].to_numpy(), hr['value'].to_numpy(dtype=float),
+            max_points, method
         )
+        return hr.iloc[selected]
+    
+    def plot_heart_rate_over_time(self, max_points=DEFAULT_MAX_POINTS, method='lttb', days=None):
+        """
+        绘制心率随时间变化图表
         
-        # 添加心率区间
-        fig.add_hrect(
-            y0=100, y1=max(hr_hourly['value'].max(), 100),
-            fillcolor="red", opacity=0.1,
-            layer="below", line_width=0,
-            annotation_text="高心率区间",
-            annotation_position="top right"
-        )
+        参数:
+            max_points: 曲线的最大点数
+            method: 降采样方法，'lttb'或'minmax'
+            days: 只显示最近多少天，None表示全部历史
+        """
+        hr_data = self.parser.get_heart_rate_data(window_start_day(days))
+        if hr_data.empty:
+            return None
         
-        fig.add_hrect(
-            y0=60, y1=100,
-            fillcolor="green", opacity=0.1,
-            layer="below", line_width=0,
-            annotation_text="正常心率区间",
-            annotation_position="top left"
-        )
+        # 对原始样本做保持形状的降采样，而不是按小时取平均（startDate为记录本地时间）
+        hr_points = self._downsample_heart_rate(hr_data, max_points, method)
         
-        fig.add_hrect(
-            y0=min(hr_hourly['value'].min(), 60), y1=60,
-            fillcolor="blue", opacity=0.1,
-            layer="below", line_width=0,
-            annotation_text="低心率区间",
-            annotation_position="bottom left"
+        return self._heart_rate_figure(
+            hr_points['startDate'].to_numpy(dtype='datetime64[s]'),
+            hr_points['value'].to_numpy(dtype=float),
+            '时间'
         )
+    
+    def _heart_rate_figure(self, x, y, x_title):
+        """心率折线图（附高、正常、低心率区间背景）"""
+        max_value = float(y.max())
+        min_value = float(y.min())
+        zones = [
+            hrect(100, max(max_value, 100), 'red', '高心率区间', 'top right'),
+            hrect(60, 100, 'green', '正常心率区间', 'top left'),
+            hrect(min(min_value, 60), 60, 'blue', '低心率区间', 'bottom left')
+        ]
         
-        # 设置布局
-        fig.update_layout(
-            xaxis_title='时间',
-            yaxis_title='心率 (bpm)',
-            hovermode='x unified',
-            height=400
+        return figure(
+            [{
+                'type': 'scatter',
+                'mode': 'lines',
+                'x': x,
+                'y': y,
+                'name': '',
+                'line': {'color': '#ff7f0e'},
+                'hovertemplate': f'{x_title}=%{{x}}<br>心率 (bpm)=%{{y}}<extra></extra>'
+            }],
+            {
+                'title': {'text': '心率变化趋势'},
+                'xaxis': {'title': {'text': x_title}},
+                'yaxis': {'title': {'text': '心率 (bpm)'}},
+                'hovermode': 'x unified',
+                'height': 400,
+                'shapes': [shape for shape, _ in zones],
+                'annotations': [annotation for _, annotation in zones]
+            }
         )
-        
-        return json.loads(fig.to_json())
     
-    def plot_sleep_duration(self):
-        """绘制睡眠时长图表"""
-        sleep_data = self.parser.get_sleep_duration_daily()
+    def plot_sleep_duration(self, days=None):
+        """
+        绘制睡眠时长图表
+        
+        参数:
+            days: 只显示最近多少天，None表示全部历史
+        """
+        sleep_data = self.parser.get_sleep_duration_daily(window_start_day(days))
         if sleep_data.empty:
             return None
         
-        # 创建图表
-        fig = px.bar(
-            sleep_data, 
-            x='日期', 
-            y='睡眠时长(小时)',
-            title='每日睡眠时长',
-            labels={'日期': '日期', '睡眠时长(小时)': '睡眠时长 (小时)'},
-            color_discrete_sequence=['#2ca02c']
-        )
-        
         # 添加推荐睡眠时长线
-        fig.add_hline(
-            y=8,
-            line_dash="dash",
-            line_color="red",
-            annotation_text="推荐睡眠时长: 8小时",
-            annotation_position="top right"
-        )
+        shape, annotation = hline(8, 'red', '推荐睡眠时长: 8小时')
         
-        # 设置布局
-        fig.update_layout(
-            xaxis_title='日期',
-            yaxis_title='睡眠时长 (小时)',
-            hovermode='x unified',
-            height=400
+        return figure(
+            [{
+                'type': 'bar',
+                'x': sleep_data['日期'].to_numpy(),
+                'y': sleep_data['睡眠时长(小时)'].to_numpy(dtype=float),
+                'name': '',
+                'marker': {'color': '#2ca02c'},
+                'hovertemplate': '日期=%{x}<br>睡眠时长 (小时)=%{y}<extra></extra>'
+            }],
+            {
+                'title': {'text': '每日睡眠时长'},
+                'xaxis': {'title': {'text': '日期'}},
+                'yaxis': {'title': {'text': '睡眠时长 (小时)'}},
+                'hovermode': 'x unified',
+                'height': 400,
+                'shapes': [shape],
+                'annotations': [annotation]
+            }
         )
-        
-        return json.loads(fig.to_json())
     
-    def plot_stress_indicators(self):
-        """绘制压力指标图表"""
-        stress_data = self.parser.get_stress_indicators()
+    def plot_stress_indicators(self, days=None):
+        """
+        绘制压力指标图表
+        
+        参数:
+            days: 只显示最近多少天，None表示全部历史
+        """
+        stress_data = self.parser.get_stress_indicators(window_start_day(days))
         if stress_data.empty:
             return None
         
-        # 创建子图
-        fig = make_subplots(
-            rows=2, cols=1,
-            subplot_titles=("心率波动 (压力指标)", "每日压力指数"),
-            vertical_spacing=0.15
-        )
-        
-        # 添加心率波动图
-        fig.add_trace(
-            go.Scatter(
-                x=stress_data['日期'], 
-                y=stress_data['心率波动'],
-                mode='lines+markers',
-                name='心率波动',
-                line=dict(color='#d62728')
-            ),
-            row=1, col=1
+        # 创建2行1列的子图
+        layout, (top, bottom) = subplot_grid(
+            2, 1, titles=("心率波动 (压力指标)", "每日压力指数"), vertical_spacing=0.15
         )
+        dates = stress_data['日期'].to_numpy()
         
-        # 添加压力指数图
-        fig.add_trace(
-            go.Bar(
-                x=stress_data['日期'], 
-                y=stress_data['压力指数'],
-                name='压力指数',
-                marker_color='#9467bd'
-            ),
-            row=2, col=1
-        )
+        # 心率波动图和压力指数图
+        traces = [
+            {
+                'type': 'scatter',
+                'x': dates,
+                'y': stress_data['心率波动'].to_numpy(dtype=float),
+                'mode': 'lines+markers',
+                'name': '心率波动',
+                'line': {'color': '#d62728'},
+                'xaxis': f'x{top}', 'yaxis': f'y{top}'
+            },
+            {
+                'type': 'bar',
+                'x': dates,
+                'y': stress_data['压力指数'].to_numpy(dtype=float),
+                'name': '压力指数',
+                'marker': {'color': '#9467bd'},
+                'xaxis': f'x{bottom}', 'yaxis': f'y{bottom}'
+            }
+        ]
         
         # 设置布局
-        fig.update_layout(
-            height=600,
-            hovermode='x unified',
-            showlegend=False
-        )
-        
-        fig.update_xaxes(title_text='日期', row=2, col=1)
-        fig.update_yaxes(title_text='心率标准差', row=1, col=1)
-        fig.update_yaxes(title_text='压力指数', row=2, col=1)
+        layout[f'xaxis{bottom}']['title'] = {'text': '日期'}
+        layout[f'yaxis{top}']['title'] = {'text': '心率标准差'}
+        layout[f'yaxis{bottom}']['title'] = {'text': '压力指数'}
+        layout.update(height=600, hovermode='x unified', showlegend=False)
         
-        return json.loads(fig.to_json())
+        return figure(traces, layout)
     
-    def create_health_dashboard(self, days=30):
-        """创建健康数据仪表板"""
-        try:
-            print(f"开始创建健康仪表板...")
-            
-            # 获取步数数据
-            steps_data = self.parser.get_step_count_data()
-            print(f"步数数据类型: {type(steps_data)}")
-            if not steps_data.empty:
-                print(f"步数数据列: {steps_data.columns.tolist()}")
-                print(f"步数value列类型: {type(steps_data['value'].iloc[0]) if 'value' in steps_data.columns and not steps_data.empty else 'N/A'}")
-            
-            steps_df = self._prepare_steps_chart_data(steps_data, days)
-            
-            # 获取心率数据
-            heart_rate_data = self.parser.get_heart_rate_data()
-            print(f"心率数据类型: {type(heart_rate_data)}")
-            if not heart_rate_data.empty:
-                print(f"心率数据列: {heart_rate_data.columns.tolist()}")
-                print(f"心率value列类型: {type(heart_rate_data['value'].iloc[0]) if 'value' in heart_rate_data.columns and not heart_rate_data.empty else 'N/A'}")
-            
-            hr_df = self._prepare_heart_rate_chart_data(heart_rate_data, days)
-            print(f"处理后的心率数据类型: {type(hr_df)}")
-            if not hr_df.empty:
-                print(f"处理后的心率数据列: {hr_df.columns.tolist()}")
-                print(f"处理后心率value列类型: {type(hr_df['value'].iloc[0]) if 'value' in hr_df.columns and not hr_df.empty else 'N/A'}")
-            
-            # 获取睡眠数据
-            sleep_data = self.parser.get_sleep_analysis_data()
-            print(f"睡眠数据类型: {type(sleep_data)}")
-            if not sleep_data.empty:
-                print(f"睡眠数据列: {sleep_data.columns.tolist()}")
-                if 'duration' in sleep_data.columns:
-                    print(f"睡眠duration列类型: {type(sleep_data['duration'].iloc[0])}")
-            
-            # 直接使用duration列，duration列已经在sleep_analysis_data方法中计算好了
-            if not sleep_data.empty and 'duration' in sleep_data.columns:
-                sleep_df = self._prepare_sleep_chart_data(sleep_data, days)
-                print(f"处理后的睡眠数据类型: {type(sleep_df)}")
-                if not sleep_df.empty:
-                    print(f"处理后的睡眠数据列: {sleep_df.columns.tolist()}")
-                    print(f"处理后睡眠duration列类型: {type(sleep_df['duration'].iloc[0]) if 'duration' in sleep_df.columns and not sleep_df.empty else 'N/A'}")
-            else:
-                sleep_df = pd.DataFrame()
-            
-            # 获取ECG数据
-            ecg_data = self.parser.get_ecg_data()
-            print(f"ECG数据类型: {type(ecg_data)}")
-            if not ecg_data.empty:
-                print(f"ECG数据列: {ecg_data.columns.tolist()}")
-            
-            ecg_df = self._prepare_ecg_chart_data(ecg_data, days)
-            
-            # 准备返回的完整图表数据
-            chart_data = {}
-            has_any_data = False
+    def plot_weekday_heatmap(self, data_type, slot_minutes=60, title=None, days=None):
+        """
+        绘制 星期×当日时段 的作息热力图
+        
+        测量型数据（如心率）显示每个单元的样本均值；累计型数据（如步数）和睡眠显示
+        该时段平均每天的累计量。
+        
+        参数:
+            data_type: 类型字符串
+            slot_minutes: 时段长度（分钟），60为7×24网格，15为7×96网格
+            title: 图表标题，默认按类型生成
+            days: 只统计最近多少天，None表示全部历史
             
-            # 创建各个图表并存储
-            try:
-                print(f"创建步数图表...")
-                steps_chart = None
-                if not steps_df.empty:
-                    steps_chart = self._create_steps_chart(steps_df)
-                    if steps_chart and 'data' in steps_chart and len(steps_chart['data']) > 0:
-                        chart_data['steps'] = steps_chart
-                        has_any_data = True
-                        print(f"步数图表创建成功，包含 {len(steps_chart['data'])} 个trace")
-                    else:
-                        print(f"步数图表创建失败或无有效数据")
-                else:
-                    print(f"步数数据为空，跳过图表创建")
-            except Exception as e:
-                print(f"创建步数图表时出错: {str(e)}")
-                traceback.print_exc()
+        返回:
+            图表字典，没有数据时返回None
+        """
+        profile = self.parser.get_weekday_profile(data_type, slot_minutes, window_start_day(days))
+        if profile is None:
+            return None
+        
+        cumulative = is_cumulative_type(data_type) or data_type in SLEEP_TYPES
+        grid = profile['daily_mean'] if cumulative else profile['mean']
+        value_label = '平均每天累计' if cumulative else '平均值'
+        
+        # 没有样本的单元显示为空白
+        z = np.where(profile['count'] > 0, np.round(grid, 2), np.nan)
+        
+        return figure(
+            [{
+                'type': 'heatmap',
+                'z': z,
+                'x': slot_labels(slot_minutes),
+                'y': WEEKDAY_LABELS,
+                'customdata': profile['count'],
+                'colorscale': 'YlOrRd',
+                'colorbar': {'title': {'text': value_label}},
+                'hovertemplate': '%{y} %{x}<br>' + value_label + ': %{z}<br>样本数: %{customdata}<extra></extra>'
+            }],
+            {
+                'title': {'text': title or f'{data_type} 作息分布（星期×时段）'},
+                'xaxis': {'title': {'text': '时段'}},
+                'yaxis': {'title': {'text': '星期'}, 'autorange': 'reversed'},
+                'height': 450
+            }
+        )
+    
+    def _build_steps_panel(self, days):
+        """构建仪表板的步数面板"""
+        steps_df = self._prepare_steps_chart_data(self.parser.get_step_count_data(window_start_day(days)), days)
+        if steps_df.empty:
+            print(f"步数数据为空，跳过图表创建")
+            return None
+        return self._create_steps_chart(steps_df)
 
-            try:
-                print(f"创建心率图表...")
-                hr_chart = None
-                if not hr_df.empty:
-                    hr_chart = self._create_heart_rate_chart(hr_df)
-                    if hr_chart and 'data' in hr_chart and len(hr_chart['data']) > 0:
-                        chart_data['heart_rate'] = hr_chart
-                        has_any_data = True
-                        print(f"心率图表创建成功，包含 {len(hr_chart['data'])} 个trace")
-                    else:
-                        print(f"心率图表创建失败或无有效数据")
-                else:
-                    print(f"心率数据为空，跳过图表创建")
-            except Exception as e:
-                print(f"创建心率图表时出错: {str(e)}")
-                traceback.print_exc()
+    def _build_heart_rate_panel(self, days):
+        """构建仪表板的心率面板"""
+        hr_df = self._prepare_heart_rate_chart_data(self.parser.get_heart_rate_data(window_start_day(days)), days)
+        if hr_df.empty:
+            print(f"心率数据为空，跳过图表创建")
+            return None
+        return self._create_heart_rate_chart(hr_df)
 
-            try:
-                print(f"创建睡眠图表...")
-                sleep_chart = None
-                if not sleep_df.empty and 'duration' in sleep_df.columns:
-                    sleep_chart = self._create_sleep_chart(sleep_df)
-                    if sleep_chart and 'data' in sleep_chart and len(sleep_chart['data']) > 0:
-                        chart_data['sleep'] = sleep_chart
-                        has_any_data = True
-                        print(f"睡眠图表创建成功，包含 {len(sleep_chart['data'])} 个trace")
-                    else:
-                        print(f"睡眠图表创建失败或无有效数据")
-                else:
-                    print(f"睡眠数据为空或缺少duration列，跳过图表创建")
-            except Exception as e:
-                print(f"创建睡眠图表时出错: {str(e)}")
-                traceback.print_exc()
+    def _build_sleep_panel(self, days):
+        """构建仪表板的睡眠面板"""
+        # 直接使用duration列，duration列已经在sleep_analysis_data方法中计算好了
+        sleep_data = self.parser.get_sleep_analysis_data(window_start_day(days))
+        if sleep_data.empty or 'duration' not in sleep_data.columns:
+            print(f"睡眠数据为空或缺少duration列，跳过图表创建")
+            return None
+        sleep_df = self._prepare_sleep_chart_data(sleep_data, days)
+        if sleep_df.empty or 'duration' not in sleep_df.columns:
+            print(f"最近{days}天没有睡眠数据，跳过图表创建")
+            return None
+        return self._create_sleep_chart(sleep_df)
 
+    def _build_ecg_panel(self, days):
+        """构建仪表板的ECG面板（可能需要扫描ECG目录，是最容易变慢的面板）"""
+        ecg_df = self._prepare_ecg_chart_data(self.parser.get_ecg_data(window_start_day(days)), days)
+        if ecg_df.empty:
+            print(f"ECG数据为空，跳过图表创建")
+            return None
+        return self._create_ecg_chart(ecg_df)
+
+    def _panel_builders(self):
+        """仪表板各面板的构建函数（面板名 -> 以days为参数的函数）"""
+        return {
+            'steps': self._build_steps_panel,
+            'heart_rate': self._build_heart_rate_panel,
+            'sleep': self._build_sleep_panel,
+            'ecg': self._build_ecg_panel
+        }
+
+    def build_dashboard_panels(self, days=30):
+        """
+        依次构建仪表板的各个面板（不使用线程池和超时，供离线报告等批处理使用）
+
+        参数:
+            days: 显示最近多少天的数据
+
+        返回:
+            有数据的面板字典（面板名 -> 图表字典），按DASHBOARD_PANELS的顺序
+        """
+        panels = {}
+        for panel, build in self._panel_builders().items():
             try:
-                print(f"创建ECG图表...")
-                ecg_chart = None
-                if not ecg_df.empty:
-                    ecg_chart = self._create_ecg_chart(ecg_df)
-                    if ecg_chart and 'data' in ecg_chart and len(ecg_chart['data']) > 0:
-                        chart_data['ecg'] = ecg_chart
-                        has_any_data = True
-                        print(f"ECG图表创建成功，包含 {len(ecg_chart['data'])} 个trace")
-                    else:
-                        print(f"ECG图表创建失败或无有效数据")
-                else:
-                    print(f"ECG数据为空，跳过图表创建")
+                chart = build(days)
             except Exception as e:
-                print(f"创建ECG图表时出错: {str(e)}")
+                print(f"创建{DASHBOARD_TITLES[panel]}图表时出错: {str(e)}")
                 traceback.print_exc()
+                continue
+            if chart and chart.get('data'):
+                panels[panel] = chart
+        return panels
 
-            # 检查是否有任何有效图表
-            if not has_any_data:
-                print(f"没有任何有效数据可用于创建仪表板")
-                # 创建一个默认的空仪表板，但带有提示信息
-                empty_chart = {
-                    "data": [
-                        {
-                            "type": "scatter",
-                            "x": [],
-                            "y": [],
-                            "mode": "text",
-                            "text": ["暂无健康数据"],
-                            "textposition": "middle center"
-                        }
-                    ],
-                    "layout": {
-                        "title": {"text": "暂无可用的健康数据"},
-                        "height": 500,
-                        "xaxis": {"visible": False},
-                        "yaxis": {"visible": False}
-                    }
-                }
-                return empty_chart
-            
-            # 创建一个综合仪表板
-            fig = make_subplots(
-                rows=2, cols=2,
-                subplot_titles=(
-                    "每日步数" if 'steps' in chart_data else "",
-                    "心率变化" if 'heart_rate' in chart_data else "",
-                    "睡眠时长" if 'sleep' in chart_data else "",
-                    "ECG记录" if 'ecg' in chart_data else ""
-                ),
-                specs=[
-                    [{"type": "scatter"}, {"type": "scatter"}],
-                    [{"type": "scatter"}, {"type": "scatter"}]
-                ],
-                vertical_spacing=0.12,
-                horizontal_spacing=0.07
-            )
-            
-            # 填充仪表板
-            trace_count = 0
-            
-            # 添加步数图表
-            if 'steps' in chart_data and 'data' in chart_data['steps']:
-                for trace in chart_data['steps']['data']:
-                    if trace:
-                        fig.add_trace(trace, row=1, col=1)
-                        trace_count += 1
-                        
-            # 添加心率图表
-            if 'heart_rate' in chart_data and 'data' in chart_data['heart_rate']:
-                for trace in chart_data['heart_rate']['data']:
-                    if trace:
-                        fig.add_trace(trace, row=1, col=2)
-                        trace_count += 1
-                        
-            # 添加睡眠图表
-            if 'sleep' in chart_data and 'data' in chart_data['sleep']:
-                for trace in chart_data['sleep']['data']:
-                    if trace:
-                        fig.add_trace(trace, row=2, col=1)
-                        trace_count += 1
-                        
-            # 添加ECG图表
-            if 'ecg' in chart_data and 'data' in chart_data['ecg']:
-                # 检查ECG图表中的饼图，需要特殊处理
-                for i, trace in enumerate(chart_data['ecg']['data']):
-                    if trace:
-                        if 'type' in trace and trace['type'] == 'pie':
-                            # 饼图需要特殊处理，这里简化为条形图
-                            labels = trace.get('labels', [])
-                            values = trace.get('values', [])
-                            if labels and values:
-                                bar_trace = go.Bar(
-                                    x=labels,
-                                    y=values,
-                                    name="ECG分类"
-                                )
-                                fig.add_trace(bar_trace, row=2, col=2)
-                                trace_count += 1
-                        else:
-                            fig.add_trace(trace, row=2, col=2)
-                            trace_count += 1
-            
-            # 设置布局
-            fig.update_layout(
-                title_text="健康数据摘要",
-                height=800,
-                showlegend=False
+    def _run_panel(self, panel, build, days, cache_version, since_day):
+        """
+        在线程池中构建单个面板并计时
+
+        面板构建完成（包括没有数据）且给出了数据集版本时，结果按窗口起始日since_day写入全局结果缓存，
+        因此即使本次请求已经超时返回，后台完成的面板也能在下次请求时直接使用。
+
+        返回:
+            (图表字典或None, 状态'ok'/'empty'/'error', 耗时秒数)
+        """
+        start = time.perf_counter()
+        status = 'ok'
+        chart = None
+        try:
+            chart = build(days)
+        except Exception as e:
+            print(f"创建{DASHBOARD_TITLES[panel]}图表时出错: {str(e)}")
+            traceback.print_exc()
+            status = 'error'
+
+        if not chart or not chart.get('data'):
+            chart = None
+            status = 'empty' if status == 'ok' else status
+        if cache_version is not None:
+            if status != 'error':
+                # 没有数据的面板以空图表缓存，避免每次请求重新扫描
+                result_cache.set(cache_version, f'dashboard-panel-{panel}', chart or {'data': []},
+                                 {'since_day': since_day})
+            # 先写缓存再移出构建中登记，之后的请求总能从两者之一得到这个面板
+            with _inflight_lock:
+                _inflight_panels.pop((cache_version, panel, since_day), None)
+
+        seconds = time.perf_counter() - start
+        print(f"{DASHBOARD_TITLES[panel]}面板耗时 {seconds:.3f} 秒（{status}）")
+        return chart, status, seconds
+
+    def _submit_panels(self, days, cache_version):
+        """
+        提交仪表板各面板的构建任务（同时重置self.panel_timings）
+
+        已缓存的面板直接使用；同一数据集版本和窗口起始日的面板仍在后台构建时复用其Future，不重复提交。
+        缓存和构建登记都按窗口起始日区分（而不是天数），跨天后“最近days天”的旧面板不再被使用。
+
+        返回:
+            (已完成的面板字典, 面板名 -> Future的字典，按DASHBOARD_PANELS的顺序)
+        """
+        chart_data = {}
+        futures = {}
+        self.panel_timings = {}
+        since_day = window_start_day(days)
+        for panel in DASHBOARD_PANELS:
+            cached = None
+            if cache_version is not None:
+                cached = result_cache.get(cache_version, f'dashboard-panel-{panel}', {'since_day': since_day})
+            if cached is not None:
+                if cached['data']:
+                    chart_data[panel] = cached
+                self.panel_timings[panel] = {'status': 'cached', 'seconds': 0.0}
+            elif cache_version is None:
+                futures[panel] = _panel_executor.submit(
+                    self._run_panel, panel, self._panel_builders()[panel], days, cache_version, since_day
+                )
+            else:
+                # 登记和提交在同一把锁内完成，构建结束时的移除操作一定发生在登记之后
+                with _inflight_lock:
+                    key = (cache_version, panel, since_day)
+                    future = _inflight_panels.get(key)
+                    if future is None:
+                        future = _panel_executor.submit(
+                            self._run_panel, panel, self._panel_builders()[panel], days, cache_version, since_day
+                        )
+                        _inflight_panels[key] = future
+                futures[panel] = future
+        return chart_data, futures
+
+    @staticmethod
+    def panels_available(days, cache_version):
+        """
+        综合仪表板的每个面板是否都已缓存或正在后台构建
+
+        为True时创建仪表板不会提交新的构建任务，可以用不带解析器的可视化器（HealthDataVisualizer(None)）
+        只读取缓存和构建状态，不必重新解析数据。
+        """
+        if cache_version is None:
+            return False
+        since_day = window_start_day(days)
+        with _inflight_lock:
+            return all(
+                result_cache.get(cache_version, f'dashboard-panel-{panel}', {'since_day': since_day}) is not None
+                or (cache_version, panel, since_day) in _inflight_panels
+                for panel in DASHBOARD_PANELS
             )
+
+    def create_health_dashboard(self, days=30, panel_timeout=PANEL_TIMEOUT, cache_version=None):
+        """
+        创建健康数据仪表板
+
+        步数、心率、睡眠和ECG四个面板互不依赖，在有界线程池中并行构建（共享同一个解析器的内存数据）。
+        每个面板最多等待panel_timeout秒，超时的面板在图中显示为“加载中”并在后台继续计算；
+        各面板的状态和耗时记录在self.panel_timings中，并随图表写入layout.meta。
+
+        参数:
+            days: 显示最近多少天的数据
+            panel_timeout: 等待每个面板的最长时间（秒）
+            cache_version: 数据集版本，给出时已完成的面板按版本缓存，供后续请求复用
+
+        返回:
+            图表字典；仍在加载的面板列在layout.meta.pending中
+        """
+        try:
+            print(f"开始创建健康仪表板...")
+            chart_data, futures = self._submit_panels(days, cache_version)
+
+            # 所有面板同时开始，按同一截止时间等待
+            deadline = time.perf_counter() + panel_timeout
+            pending = []
+            for panel, future in futures.items():
+                try:
+                    chart, status, seconds = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+                except FuturesTimeoutError:
+                    print(f"{DASHBOARD_TITLES[panel]}面板超过 {panel_timeout} 秒未完成，显示为加载中")
+                    pending.append(panel)
+                    self.panel_timings[panel] = {'status': 'timeout', 'seconds': round(float(panel_timeout), 3)}
+                    continue
+                self.panel_timings[panel] = {'status': status, 'seconds': round(seconds, 3)}
+                if chart is not None:
+                    chart_data[panel] = chart
+
+            return self._dashboard_figure(chart_data, pending)
             
-            print(f"综合仪表板创建完成，共添加了 {trace_count} 个trace")
-            
-            # 检查是否有任何trace被添加
-            if trace_count == 0:
-                print(f"警告：仪表板中没有添加任何trace")
-                # 创建一个默认的空仪表板，但带有提示信息
-                empty_chart = {
-                    "data": [
-                        {
-                            "type": "scatter",
-                            "x": [],
-                            "y": [],
-                            "mode": "text",
-                            "text": ["暂无健康数据"],
-                            "textposition": "middle center"
-                        }
-                    ],
-                    "layout": {
-                        "title": {"text": "暂无可用的健康数据"},
-                        "height": 500,
-                        "xaxis": {"visible": False},
-                        "yaxis": {"visible": False}
-                    }
-                }
-                return empty_chart
-                
-            dashboard_json = json.loads(fig.to_json())
-            print(f"仪表板成功转换为JSON格式")
-            return dashboard_json
-            
         except Exception as e:
             print(f"创建健康仪表板时出错: {str(e)}")
             traceback.print_exc()
-            # 返回错误信息
-            return {
+            return self._dashboard_error_figure(e)
+
+    def iter_health_dashboard(self, days=30, panel_timeout=PANEL_TIMEOUT, cache_version=None):
+        """
+        逐步创建健康数据仪表板：先生成只含已缓存面板的图表，之后每完成一个面板生成一次更新后的完整图表
+
+        面板的构建、缓存和计时与create_health_dashboard相同；panel_timeout秒后仍未完成的面板
+        列在最后一个图表的layout.meta.pending中，并在后台继续计算。
+
+        生成:
+            图表字典，最后一个为最终结果；所有面板都已缓存时只生成一个
+        """
+        try:
+            chart_data, futures = self._submit_panels(days, cache_version)
+            pending = list(futures)
+            if not pending:
+                yield self._dashboard_figure(chart_data, pending)
+                return
+
+            yield self._dashboard_figure(chart_data, pending)
+            panels = {future: panel for panel, future in futures.items()}
+            try:
+                for future in as_completed(panels, timeout=panel_timeout):
+                    panel = panels[future]
+                    chart, status, seconds = future.result()
+                    self.panel_timings[panel] = {'status': status, 'seconds': round(seconds, 3)}
+                    if chart is not None:
+                        chart_data[panel] = chart
+                    pending.remove(panel)
+                    yield self._dashboard_figure(chart_data, pending)
+            except FuturesTimeoutError:
+                for panel in pending:
+                    print(f"{DASHBOARD_TITLES[panel]}面板超过 {panel_timeout} 秒未完成，显示为加载中")
+                    self.panel_timings[panel] = {'status': 'timeout', 'seconds': round(float(panel_timeout), 3)}
+                yield self._dashboard_figure(chart_data, pending)
+
+        except Exception as e:
+            print(f"创建健康仪表板时出错: {str(e)}")
+            traceback.print_exc()
+            yield self._dashboard_error_figure(e)
+
+    def _dashboard_figure(self, chart_data, pending):
+        """
+        将已完成的面板组装为2×2的综合仪表板图表
+
+        参数:
+            chart_data: 面板名 -> 图表字典（只包含有数据的面板）
+            pending: 仍在加载的面板名列表，显示为“加载中”
+
+        返回:
+            图表字典，面板耗时和未完成的面板写入layout.meta
+        """
+        # 检查是否有任何有效图表
+        if not chart_data and not pending:
+            print(f"没有任何有效数据可用于创建仪表板")
+            # 创建一个默认的空仪表板，但带有提示信息
+            empty_chart = {
                 "data": [
                     {
                         "type": "scatter",
                         "x": [],
                         "y": [],
                         "mode": "text",
-                        "text": [f"创建仪表板时出错: {str(e)}"],
+                        "text": ["暂无健康数据"],
                         "textposition": "middle center"
                     }
                 ],
                 "layout": {
-                    "title": {"text": "仪表板创建失败"},
+                    "title": {"text": "暂无可用的健康数据"},
                     "height": 500,
                     "xaxis": {"visible": False},
                     "yaxis": {"visible": False}
                 }
             }
+            return empty_chart
+        
+        # 创建一个综合仪表板：直接组装各子图的trace字典，不再经过make_subplots/add_trace逐个校验
+        layout, suffixes = subplot_grid(
+            2, 2,
+            titles=[
+                DASHBOARD_TITLES[panel] if panel in chart_data or panel in pending else ""
+                for panel in DASHBOARD_PANELS
+            ]
+        )
+        
+        # 填充仪表板
+        traces = []
+        for panel, suffix in zip(DASHBOARD_PANELS, suffixes):
+            if panel in pending:
+                # 未完成的面板显示为加载中
+                layout['annotations'].append({
+                    'text': '加载中…', 'showarrow': False, 'font': {'size': 14, 'color': 'gray'},
+                    'xref': f'x{suffix} domain', 'yref': f'y{suffix} domain', 'x': 0.5, 'y': 0.5
+                })
+                layout[f'xaxis{suffix}']['visible'] = False
+                layout[f'yaxis{suffix}']['visible'] = False
+                continue
+            if panel not in chart_data or 'data' not in chart_data[panel]:
+                continue
+            for trace in chart_data[panel]['data']:
+                if not trace:
+                    continue
+                if trace.get('type') == 'pie':
+                    # 饼图需要特殊处理，这里简化为条形图
+                    labels = trace.get('labels')
+                    values = trace.get('values')
+                    if labels is None or values is None or len(labels) == 0:
+                        continue
+                    trace = {'type': 'bar', 'x': labels, 'y': values, 'name': "ECG分类"}
+                traces.append({**trace, 'xaxis': f'x{suffix}', 'yaxis': f'y{suffix}'})
+        
+        # 设置布局，面板耗时和未完成的面板写入meta
+        layout.update(
+            title={'text': "健康数据摘要"},
+            height=800,
+            showlegend=False,
+            meta={'pending': list(pending), 'panel_timings': dict(self.panel_timings)}
+        )
+        
+        print(f"综合仪表板创建完成，共添加了 {len(traces)} 个trace，{len(pending)} 个面板仍在加载")
+        return figure(traces, layout)
+
+    def _dashboard_error_figure(self, error):
+        """创建仪表板出错时显示的图表"""
+        return {
+            "data": [
+                {
+                    "type": "scatter",
+                    "x": [],
+                    "y": [],
+                    "mode": "text",
+                    "text": [f"创建仪表板时出错: {str(error)}"],
+                    "textposition": "middle center"
+                }
+            ],
+            "layout": {
+                "title": {"text": "仪表板创建失败"},
+                "height": 500,
+                "xaxis": {"visible": False},
+                "yaxis": {"visible": False}
+            }
+        }
     
     def plot_ecg_summary(self, ecg_data):
         """绘制心电图数据摘要"""
@@ -490,13 +664,6 @@ class HealthDataVisualizer:
             print(f"ECG数据类型: {type(ecg_data)}")
             print(f"ECG数据行数: {len(ecg_data)}")
                 
-            # 创建一个多面板的图表布局
-            fig = make_subplots(rows=2, cols=1, 
-                              subplot_titles=("ECG记录数量", "ECG分类分布"),
-                              specs=[[{"type": "xy"}], [{"type": "pie"}]],
-                              row_heights=[0.6, 0.4],
-                              vertical_spacing=0.1)
-            
             # 确保日期列是datetime类型
             ecg_data[date_col] = pd.to_datetime(ecg_data[date_col], errors='coerce')
             # 删除NaT（无效日期）
@@ -506,9 +673,9 @@ class HealthDataVisualizer:
                 print("清理日期后ECG数据为空")
                 return {"error": "ECG数据日期无效"}
                 
-            # 计算每天的记录数
-            daily_counts = ecg_data.groupby(ecg_data[date_col].dt.date).size().reset_index()
-            daily_counts.columns = ['date', 'count']
+            # 按本地日编号计算每天的记录数
+            day_keys, day_counts = np.unique(ecg_data['local_day'].to_numpy(), return_counts=True)
+            daily_counts = pd.DataFrame({'date': days_to_iso(day_keys), 'count': day_counts})
             
             # 确保count列是整数类型
             daily_counts['count'] = daily_counts['count'].astype(int)
@@ -517,22 +684,8 @@ class HealthDataVisualizer:
             
             # 确保有记录后再绘制图表
             if not daily_counts.empty:
-                # 绘制每天的记录数量
-                fig.add_trace(
-                    go.Bar(
-                        x=[str(d) for d in daily_counts['date']],  # 确保日期是字符串类型以便JSON序列化
-                        y=daily_counts['count'],
-                        name="每日ECG记录数",
-                        marker_color='rgb(55, 83, 109)'
-                    ),
-                    row=1, col=1
-                )
-                
-                # 设置x轴格式为日期
-                fig.update_xaxes(title_text="日期", row=1, col=1)
-                fig.update_yaxes(title_text="记录数量", row=1, col=1)
-                
                 # 处理分类信息 - 优先使用 classification 列
+                class_counts = None
                 class_col = None
                 for col in ['classification', 'Classification', '分類', '分类']:
                     if col in ecg_data.columns:
@@ -554,35 +707,11 @@ class HealthDataVisualizer:
                         class_counts['class'] = class_counts['class'].astype(str)
                         
                         print(f"ECG分类分布: {class_counts[['class', 'count']].values.tolist()}")
-                        
-                        # 绘制饼图
-                        fig.add_trace(
-                            go.Pie(
-                                labels=class_counts['class'],
-                                values=class_counts['count'],
-                                name="分类分布",
-                                marker_colors=px.colors.qualitative.Plotly
-                            ),
-                            row=2, col=1
-                        )
-                
-                # 设置图表布局
-                fig.update_layout(
-                    title_text="心电图数据摘要",
-                    height=800,
-                    showlegend=True
-                )
                 
-                print(f"ECG图表创建完成，包含 {len(fig.data)} 个trace")
+                fig = self._ecg_figure(daily_counts, class_counts, ("ECG记录数量", "ECG分类分布"))
+                print(f"ECG图表创建完成，包含 {len(fig['data'])} 个trace")
                 
-                # 安全地转换为JSON
-                try:
-                    json_data = json.loads(fig.to_json())
-                    print(f"ECG图表成功转换为JSON")
-                    return json_data
-                except Exception as json_error:
-                    print(f"ECG图表JSON转换出错: {str(json_error)}")
-                    return {"error": "ECG图表数据处理出错"}
+                return fig
             else:
                 print("ECG每日记录数为空")
                 return {"error": "ECG记录数为0"}
@@ -591,6 +720,43 @@ class HealthDataVisualizer:
             traceback.print_exc()
             return {"error": f"处理ECG数据时出错: {str(e)}"}
 
+    def _ecg_figure(self, daily_counts, class_counts, titles):
+        """
+        ECG摘要图表：上方为每日记录数柱状图，下方为分类分布饼图
+
+        参数:
+            daily_counts: 包含date和count列的每日记录数
+            class_counts: 包含class和count列的分类统计，None表示没有分类信息
+            titles: 两个子图的标题
+        """
+        layout, (top, bottom) = subplot_grid(2, 1, titles=titles, row_heights=[0.6, 0.4], vertical_spacing=0.1)
+        pie_domain = cell_domain(layout, bottom)
+        
+        # 绘制每天的记录数量
+        traces = [{
+            'type': 'bar',
+            'x': daily_counts['date'].astype(str).tolist(),  # 确保日期是字符串类型以便JSON序列化
+            'y': daily_counts['count'].to_numpy(),
+            'name': "每日ECG记录数",
+            'marker': {'color': 'rgb(55, 83, 109)'},
+            'xaxis': f'x{top}', 'yaxis': f'y{top}'
+        }]
+        layout[f'xaxis{top}']['title'] = {'text': "日期"}
+        layout[f'yaxis{top}']['title'] = {'text': "记录数量"}
+        
+        # 绘制分类分布饼图（颜色使用模板的默认配色）
+        if class_counts is not None:
+            traces.append({
+                'type': 'pie',
+                'labels': class_counts['class'].tolist(),
+                'values': class_counts['count'].to_numpy(),
+                'name': "分类分布",
+                'domain': pie_domain
+            })
+        
+        layout.update(title={'text': "心电图数据摘要"}, height=800, showlegend=True)
+        return figure(traces, layout)
+
     def _prepare_steps_chart_data(self, steps_data, days=30):
         """准备步数图表数据"""
         try:
@@ -601,29 +767,18 @@ class HealthDataVisualizer:
             
             print(f"步数数据列: {steps_data.columns.tolist()}")
             
-            # 提取日期部分
-            steps_data['日期'] = steps_data['startDate'].dt.date
-            print(f"添加日期列后的数据列: {steps_data.columns.tolist()}")
-            
-            # 按日期分组并计算总步数
-            daily_steps = steps_data.groupby('日期').agg({'value': 'sum'}).reset_index()
-            print(f"按日期分组后的数据列: {daily_steps.columns.tolist()}")
-            
-            # 确保value列是数值类型
-            daily_steps['value'] = pd.to_numeric(daily_steps['value'], errors='coerce')
-            daily_steps = daily_steps.dropna(subset=['value'])
-            if not daily_steps.empty:
-                print(f"确保数值类型后步数value列类型: {type(daily_steps['value'].iloc[0])}")
+            # 按本地日编号分组计算总步数（结果已按日期排序）
+            daily = segment_stats(steps_data['local_day'].to_numpy(), steps_data['value'].to_numpy(dtype=float))
             
             # 只保留最近的N天数据
-            cutoff_date = (pd.Timestamp.now() - pd.Timedelta(days=days)).date()
-            recent_steps = daily_steps[daily_steps['日期'] >= cutoff_date]
-            
-            # 按日期排序
-            recent_steps = recent_steps.sort_values('日期')
+            cutoff_day = window_start_day(days)
+            recent = daily['key'] >= cutoff_day
             
             # 转换日期为字符串，以便JSON序列化
-            recent_steps['日期'] = recent_steps['日期'].astype(str)
+            recent_steps = pd.DataFrame({
+                '日期': days_to_iso(daily['key'][recent]),
+                'value': daily['sum'][recent]
+            })
             print(f"处理后的步数数据形状: {recent_steps.shape}")
             
             return recent_steps
@@ -632,7 +787,7 @@ class HealthDataVisualizer:
             traceback.print_exc()
             return pd.DataFrame()
 
-    def _prepare_heart_rate_chart_data(self, heart_rate_data, days=30):
+    def _prepare_heart_rate_chart_data(self, heart_rate_data, days=30, max_points=DEFAULT_MAX_POINTS):
         """准备心率图表数据"""
         try:
             print(f"开始准备心率图表数据...")
@@ -651,23 +806,14 @@ class HealthDataVisualizer:
                 if not heart_rate_data.empty:
                     print(f"转换后心率value列类型: {type(heart_rate_data['value'].iloc[0])}")
             
-            # 重采样为小时数据点以减少数据量
-            heart_rate_data.set_index('startDate', inplace=True)
-            hr_hourly = heart_rate_data.resample('H').mean().reset_index()
-            print(f"重采样后的心率数据列: {hr_hourly.columns.tolist()}")
+            # 只保留最近的N天数据（按记录本地日期）
+            recent_hr = heart_rate_data[heart_rate_data['local_day'] >= window_start_day(days)]
             
-            # 提取日期部分
-            hr_hourly['日期'] = hr_hourly['startDate'].dt.date
-            
-            # 只保留最近的N天数据
-            cutoff_date = (pd.Timestamp.now() - pd.Timedelta(days=days)).date()
-            recent_hr = hr_hourly[hr_hourly['日期'] >= cutoff_date]
+            # 降采样到至多max_points个点，保留峰值和谷值
+            recent_hr = self._downsample_heart_rate(recent_hr, max_points).copy()
             
-            # 按日期排序
-            recent_hr = recent_hr.sort_values('日期')
-            
-            # 转换日期为字符串，以便JSON序列化
-            recent_hr['日期'] = recent_hr['日期'].astype(str)
+            # 时间转换为ISO字符串，以便JSON序列化
+            recent_hr['日期'] = np.datetime_as_string(recent_hr['startDate'].to_numpy(dtype='datetime64[s]'))
             print(f"处理后的心率数据形状: {recent_hr.shape}")
             if 'value' in recent_hr.columns and not recent_hr.empty:
                 print(f"处理后心率value列类型: {type(recent_hr['value'].iloc[0])}")
@@ -698,34 +844,21 @@ class HealthDataVisualizer:
                     print(f"转换后睡眠duration列类型: {type(sleep_data['duration'].iloc[0])}")
                     print(f"睡眠duration前几个值: {sleep_data['duration'].head().tolist()}")
             
-            # 提取日期部分 - 添加这一步，从startDate创建日期列
-            if 'startDate' in sleep_data.columns and '日期' not in sleep_data.columns:
-                print("从startDate创建日期列")
-                sleep_data['日期'] = sleep_data['startDate'].dt.date
-            
             # 只保留最近的N天数据
-            cutoff_date = (pd.Timestamp.now() - pd.Timedelta(days=days)).date()
+            cutoff_day = window_start_day(days)
             
-            # 确保日期列存在
-            if '日期' not in sleep_data.columns:
+            # 确保本地日编号存在
+            if 'local_day' not in sleep_data.columns:
                 print("警告：睡眠数据中缺少日期列，返回所有数据")
                 recent_sleep = sleep_data.copy()
             else:
-                recent_sleep = sleep_data[sleep_data['日期'] >= cutoff_date]
-            
-            # 按日期排序
-            if '日期' in recent_sleep.columns:
-                recent_sleep = recent_sleep.sort_values('日期')
+                recent_sleep = sleep_data[sleep_data['local_day'] >= cutoff_day]
+                
+                # 按日期排序
+                recent_sleep = recent_sleep.sort_values('local_day', kind='mergesort')
                 
                 # 转换日期为字符串，以便JSON序列化
-                recent_sleep['日期'] = recent_sleep['日期'].astype(str)
-            else:
-                # 如果没有日期列，尝试按startDate排序
-                if 'startDate' in recent_sleep.columns:
-                    recent_sleep = recent_sleep.sort_values('startDate')
-                    
-                    # 创建一个日期列用于显示
-                    recent_sleep['日期'] = recent_sleep['startDate'].dt.date.astype(str)
+                recent_sleep['日期'] = days_to_iso(recent_sleep['local_day'].to_numpy())
             
             print(f"处理后的睡眠数据形状: {recent_sleep.shape}")
             
@@ -746,29 +879,20 @@ class HealthDataVisualizer:
             print(f"ECG数据类型: {type(ecg_data)}")
             print(f"ECG数据列: {ecg_data.columns.tolist()}")
             
-            # 识别日期列
-            date_col = None
-            for col in ['date', 'startDate']:
-                if col in ecg_data.columns:
-                    date_col = col
-                    break
-                    
-            if date_col is None:
+            # 使用解析时计算的本地日编号
+            if 'local_day' not in ecg_data.columns:
                 print("ECG数据缺少日期列")
                 return pd.DataFrame()
             
-            # 提取日期部分
-            ecg_data['日期'] = ecg_data[date_col].dt.date
-            
             # 只保留最近的N天数据
-            cutoff_date = (pd.Timestamp.now() - pd.Timedelta(days=days)).date()
-            recent_ecg = ecg_data[ecg_data['日期'] >= cutoff_date]
+            cutoff_day = window_start_day(days)
+            recent_ecg = ecg_data[ecg_data['local_day'] >= cutoff_day]
             
             # 按日期排序
-            recent_ecg = recent_ecg.sort_values('日期')
+            recent_ecg = recent_ecg.sort_values('local_day', kind='mergesort')
             
             # 转换日期为字符串，以便JSON序列化
-            recent_ecg['日期'] = recent_ecg['日期'].astype(str)
+            recent_ecg['日期'] = days_to_iso(recent_ecg['local_day'].to_numpy())
             print(f"处理后的ECG数据形状: {recent_ecg.shape}")
             
             return recent_ecg
@@ -802,37 +926,33 @@ class HealthDataVisualizer:
                 print("数据转换后为空，无法创建图表")
                 return None
             
-            fig = px.bar(
-                steps_chart_data, 
-                x='日期', 
-                y='value',
-                title='每日步数',
-                labels={'日期': '日期', 'value': '步数'},
-                color_discrete_sequence=['#1f77b4']
-            )
-            
             # 添加平均线
             avg_steps = float(steps_chart_data['value'].mean())
             print(f"平均步数: {avg_steps}, 类型: {type(avg_steps)}")
-            
-            fig.add_hline(
-                y=avg_steps,
-                line_dash="dash",
-                line_color="red",
-                annotation_text=f"平均: {avg_steps:.0f}步",
-                annotation_position="top right"
-            )
-            
-            # 设置布局
-            fig.update_layout(
-                xaxis_title='日期',
-                yaxis_title='步数',
-                hovermode='x unified',
-                height=400
+            shape, annotation = hline(avg_steps, 'red', f"平均: {avg_steps:.0f}步")
+            
+            chart = figure(
+                [{
+                    'type': 'bar',
+                    'x': steps_chart_data['日期'].to_numpy(),
+                    'y': steps_chart_data['value'].to_numpy(dtype=float),
+                    'name': '',
+                    'marker': {'color': '#1f77b4'},
+                    'hovertemplate': '日期=%{x}<br>步数=%{y}<extra></extra>'
+                }],
+                {
+                    'title': {'text': '每日步数'},
+                    'xaxis': {'title': {'text': '日期'}},
+                    'yaxis': {'title': {'text': '步数'}},
+                    'hovermode': 'x unified',
+                    'height': 400,
+                    'shapes': [shape],
+                    'annotations': [annotation]
+                }
             )
             
             print(f"步数图表创建完成")
-            return json.loads(fig.to_json())
+            return chart
         except Exception as e:
             print(f"创建步数图表时出错: {str(e)}")
             traceback.print_exc()
@@ -863,55 +983,14 @@ class HealthDataVisualizer:
                 print("数据转换后为空，无法创建图表")
                 return None
             
-            fig = px.line(
-                hr_chart_data, 
-                x='日期', 
-                y='value',
-                title='心率变化趋势',
-                labels={'日期': '日期', 'value': '心率 (bpm)'},
-                color_discrete_sequence=['#ff7f0e']
-            )
-            
-            # 添加心率区间
-            max_value = float(hr_chart_data['value'].max())
-            min_value = float(hr_chart_data['value'].min())
-            print(f"心率最大值: {max_value}, 类型: {type(max_value)}")
-            print(f"心率最小值: {min_value}, 类型: {type(min_value)}")
-            
-            fig.add_hrect(
-                y0=100, y1=max(max_value, 100),
-                fillcolor="red", opacity=0.1,
-                layer="below", line_width=0,
-                annotation_text="高心率区间",
-                annotation_position="top right"
-            )
-            
-            fig.add_hrect(
-                y0=60, y1=100,
-                fillcolor="green", opacity=0.1,
-                layer="below", line_width=0,
-                annotation_text="正常心率区间",
-                annotation_position="top left"
-            )
-            
-            fig.add_hrect(
-                y0=min(min_value, 60), y1=60,
-                fillcolor="blue", opacity=0.1,
-                layer="below", line_width=0,
-                annotation_text="低心率区间",
-                annotation_position="bottom left"
-            )
-            
-            # 设置布局
-            fig.update_layout(
-                xaxis_title='日期',
-                yaxis_title='心率 (bpm)',
-                hovermode='x unified',
-                height=400
+            chart = self._heart_rate_figure(
+                hr_chart_data['日期'].to_numpy(),
+                hr_chart_data['value'].to_numpy(dtype=float),
+                '日期'
             )
             
             print(f"心率图表创建完成")
-            return json.loads(fig.to_json())
+            return chart
         except Exception as e:
             print(f"创建心率图表时出错: {str(e)}")
             traceback.print_exc()
@@ -942,30 +1021,27 @@ class HealthDataVisualizer:
                 print("数据转换后为空，无法创建图表")
                 return None
             
-            # 创建图表
-            fig = go.Figure()
-            
-            # 添加睡眠时间柱状图
-            fig.add_trace(go.Bar(
-                x=sleep_chart_data['日期'],
-                y=sleep_chart_data['duration'],  # 这里使用duration而不是value
-                marker_color='skyblue',
-                name='睡眠时长(小时)'
-            ))
-            
-            # 设置图表标题和轴标签
-            fig.update_layout(
-                title='每日睡眠时长',
-                xaxis_title='日期',
-                yaxis_title='睡眠时长(小时)',
-                template='plotly_white',
-                margin=dict(l=0, r=0, t=30, b=0),
-                height=300
-            )
+            # 睡眠时间柱状图
+            chart = {
+                'data': [{
+                    'type': 'bar',
+                    'x': sleep_chart_data['日期'].to_numpy(),
+                    'y': sleep_chart_data['duration'].to_numpy(dtype=float),  # 这里使用duration而不是value
+                    'marker': {'color': 'skyblue'},
+                    'name': '睡眠时长(小时)'
+                }],
+                'layout': {
+                    'title': {'text': '每日睡眠时长'},
+                    'xaxis': {'title': {'text': '日期'}},
+                    'yaxis': {'title': {'text': '睡眠时长(小时)'}},
+                    'template': 'plotly_white',
+                    'margin': {'l': 0, 'r': 0, 't': 30, 'b': 0},
+                    'height': 300
+                }
+            }
             
             print(f"睡眠图表创建完成")
-            # 与其他图表保持一致，返回JSON而不是HTML
-            return json.loads(fig.to_json())
+            return chart
         except Exception as e:
             print(f"创建睡眠图表时出错: {str(e)}")
             traceback.print_exc()
@@ -984,13 +1060,6 @@ class HealthDataVisualizer:
             # 创建一个副本避免修改原始数据
             ecg_chart_data = ecg_data.copy()
             
-            # 创建一个2行1列的图表布局
-            fig = make_subplots(rows=2, cols=1, 
-                              subplot_titles=("ECG记录分布", "ECG分类统计"),
-                              specs=[[{"type": "xy"}], [{"type": "pie"}]],
-                              row_heights=[0.6, 0.4],
-                              vertical_spacing=0.1)
-            
             # 获取日期列
             date_col = None
             for col in ['date', 'startDate']:
@@ -1012,31 +1081,17 @@ class HealthDataVisualizer:
                 print("清理日期后ECG数据为空，无法创建图表")
                 return None
                 
-            # 计算每天的记录数
-            daily_counts = ecg_chart_data.groupby(ecg_chart_data[date_col].dt.date).size().reset_index()
-            daily_counts.columns = ['date', 'count']
+            # 按本地日编号计算每天的记录数
+            day_keys, day_counts = np.unique(ecg_chart_data['local_day'].to_numpy(), return_counts=True)
+            daily_counts = pd.DataFrame({'date': days_to_iso(day_keys), 'count': day_counts})
             
             # 确保count列是整数类型
             daily_counts['count'] = daily_counts['count'].astype(int)
             
             print(f"ECG每日记录数: {daily_counts['count'].tolist()}")
             
-            # 绘制每天的记录数量
-            fig.add_trace(
-                go.Bar(
-                    x=daily_counts['date'].astype(str),  # 确保日期是字符串类型以便JSON序列化
-                    y=daily_counts['count'],
-                    name="每日ECG记录数",
-                    marker_color='rgb(55, 83, 109)'
-                ),
-                row=1, col=1
-            )
-            
-            # 设置x轴格式为日期
-            fig.update_xaxes(title_text="日期", row=1, col=1)
-            fig.update_yaxes(title_text="记录数量", row=1, col=1)
-        
-            # 绘制分类分布饼图
+            # 统计分类分布
+            class_counts = None
             class_col = None
             for col in ['classification', 'Classification', '分類', '分类']:
                 if col in ecg_chart_data.columns:
@@ -1058,34 +1113,10 @@ class HealthDataVisualizer:
                     class_counts['class'] = class_counts['class'].astype(str)
                     
                     print(f"ECG分类分布: {class_counts[['class', 'count']].values.tolist()}")
-                    
-                    # 绘制饼图
-                    fig.add_trace(
-                        go.Pie(
-                            labels=class_counts['class'],
-                            values=class_counts['count'],
-                            name="分类分布",
-                            marker_colors=px.colors.qualitative.Plotly
-                        ),
-                        row=2, col=1
-                    )
             
-            # 设置图表布局
-            fig.update_layout(
-                title_text="心电图数据摘要",
-                height=800,
-                showlegend=True
-            )
-            
-            # 安全地转换为JSON
-            try:
-                json_data = json.loads(fig.to_json())
-                print(f"ECG图表创建成功，包含 {len(fig.data)} 个trace")
-                return json_data
-            except Exception as json_error:
-                print(f"ECG图表JSON转换出错: {str(json_error)}")
-                # 返回一个简单的占位图表
-                return {"data": [], "layout": {"title": {"text": "ECG数据处理出错"}}}
+            fig = self._ecg_figure(daily_counts, class_counts, ("ECG记录分布", "ECG分类统计"))
+            print(f"ECG图表创建成功，包含 {len(fig['data'])} 个trace")
+            return fig
             
         except Exception as e:
             print(f"创建ECG图表时出错: {str(e)}")
@@ -0,0 +1,87 @@
+"""
+应用启动导入时间检查
+
+用`python -X importtime`在子进程中执行`from app import create_app; create_app()`，
+汇总所有模块的导入耗时，超过预算或导入了应在首次使用时才加载的重型依赖时以非零状态退出。
+
+用法:
+    python scripts/check_import_time.py [--budget 毫秒] [--repeat 次数]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# 启动阶段的导入时间预算（毫秒）
+DEFAULT_BUDGET_MS = 500
+# 启动阶段不应导入的模块（由app.utils.lazy延迟到首次使用）
+DEFERRED_MODULES = ('pandas', 'plotly', 'scipy', 'matplotlib')
+# 子进程中执行的启动代码
+STARTUP_CODE = "from app import create_app; create_app({'TESTING': True})"
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import_time():
+    """
+    在新的解释器中执行启动代码并解析-X importtime的输出
+
+    返回:
+        (总导入时间毫秒数, 已导入的顶层包名集合, 各模块的(累计微秒, 模块名)列表)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_CODE],
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"启动代码执行失败:\n{result.stderr}")
+
+    total_us = 0
+    packages = set()
+    modules = []
+    for line in result.stderr.splitlines():
+        # 格式: "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        self_us, cumulative_us, name = int(fields[0]), int(fields[1]), fields[2].strip()
+        total_us += self_us
+        packages.add(name.split('.')[0])
+        modules.append((cumulative_us, name))
+
+    return total_us / 1000.0, packages, modules
+
+
+def main():
+    """执行检查，超出预算或导入了延迟模块时返回1"""
+    arg_parser = argparse.ArgumentParser(description='检查应用启动的导入时间')
+    arg_parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_MS, help='导入时间预算（毫秒）')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='测量次数，取最小值以减少抖动')
+    args = arg_parser.parse_args()
+
+    runs = [measure_import_time() for _ in range(max(1, args.repeat))]
+    total_ms, packages, modules = min(runs, key=lambda run: run[0])
+
+    print(f"启动导入时间: {total_ms:.1f} ms（预算 {args.budget:.0f} ms，{len(runs)} 次测量取最小值）")
+    print("耗时最多的模块（累计）:")
+    for cumulative_us, name in sorted(modules, reverse=True)[:10]:
+        print(f"    {cumulative_us / 1000.0:8.1f} ms  {name}")
+
+    failed = False
+    eager = sorted(packages.intersection(DEFERRED_MODULES))
+    if eager:
+        print(f"失败: 启动阶段导入了应延迟加载的模块: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget:
+        print(f"失败: 导入时间 {total_ms:.1f} ms 超出预算 {args.budget:.0f} ms")
+        failed = True
+
+    if not failed:
+        print("通过")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import datetime
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# 直接运行pytest时也能导入app包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _record(record_type, start, end, value, source='Apple Watch'):
+    """生成一条Apple健康导出格式的Record元素"""
+    fmt = '%Y-%m-%d %H:%M:%S -0500'
+    return (f'<Record type="{record_type}" sourceName="{source}" '
+            f'startDate="{start.strftime(fmt)}" endDate="{end.strftime(fmt)}" value="{value}"/>')
+
+
+def write_export(path, days=21):
+    """
+    写入一个小型的合成导出文件：截至今天的days天心率（每20分钟）、每小时步数和每晚睡眠
+
+    返回:
+        文件路径字符串
+    """
+    rng = np.random.default_rng(0)
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    first = today - datetime.timedelta(days=days)
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<HealthData locale="en_US">']
+    for day in range(days):
+        midnight = first + datetime.timedelta(days=day)
+        for slot in range(72):
+            t = midnight + datetime.timedelta(minutes=20 * slot)
+            lines.append(_record('HKQuantityTypeIdentifierHeartRate', t, t, int(rng.integers(50, 110))))
+        for hour in range(8, 22):
+            t = midnight + datetime.timedelta(hours=hour)
+            lines.append(_record('HKQuantityTypeIdentifierStepCount', t, t + datetime.timedelta(minutes=30),
+                                 int(rng.integers(100, 1500))))
+        bed = midnight + datetime.timedelta(hours=23)
+        lines.append(_record('HKCategoryTypeIdentifierSleepAnalysis', bed, bed + datetime.timedelta(hours=7),
+                             'HKCategoryValueSleepAnalysisAsleep'))
+    lines.append('</HealthData>')
+    path.write_text('\n'.join(lines), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def export_path(tmp_path):
+    """合成导出文件的路径"""
+    return write_export(tmp_path / 'export.xml')
+
+
+@pytest.fixture
+def app():
+    """测试用应用"""
+    from app import create_app
+    return create_app({'TESTING': True, 'SECRET_KEY': 'test'})
+
+
+@pytest.fixture
+def client(app, export_path):
+    """会话中已加载合成导出文件的测试客户端"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['data_file_path'] = export_path
+    return client
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from app.utils.anomalies import rolling_robust_zscore, detect_anomalies, MAD_SCALE, MEAN_AD_SCALE
+
+
+def _reference(keys, values, window, period, min_periods):
+    """逐点取同一相位此前window个桶，按定义计算中位数、MAD和z分数"""
+    z = np.full(keys.size, np.nan)
+    for i, key in enumerate(keys):
+        same_phase = (keys < key) & ((keys % period == key % period) if period else True)
+        history = values[same_phase][-window:]
+        if history.size < max(min_periods, 1):
+            continue
+        center = np.median(history)
+        deviations = np.abs(history - center)
+        scale = MAD_SCALE * np.median(deviations)
+        if scale == 0:
+            scale = MEAN_AD_SCALE * deviations.mean()
+        if scale > 0:
+            z[i] = (values[i] - center) / scale
+    return z
+
+
+@pytest.mark.parametrize('window, period, min_periods', [(28, None, 7), (5, None, 1), (14, 24, 7), (4, 3, 2)])
+def test_matches_reference_loop(window, period, min_periods):
+    rng = np.random.default_rng(0)
+    keys = np.sort(rng.choice(np.arange(20000, 20400), size=300, replace=False))
+    values = np.round(rng.normal(60, 8, size=keys.size))
+
+    result = rolling_robust_zscore(keys, values, window, period, min_periods)
+    np.testing.assert_allclose(result['z'], _reference(keys, values, window, period, min_periods),
+                               rtol=1e-12, equal_nan=True)
+
+
+def test_constant_history_uses_mean_deviation_fallback():
+    values = np.array([10.0] * 9 + [20.0, 10.0, 100.0])
+    result = rolling_robust_zscore(np.arange(values.size), values, window=10, min_periods=3)
+    # 全部相同的历史没有尺度，无法评分
+    assert np.isnan(result['z'][9])
+    # MAD为0但平均绝对偏差不为0时改用平均绝对偏差
+    assert np.isfinite(result['z'][11]) and result['z'][11] > 0
+
+
+def test_detect_anomalies_flags_spike():
+    rng = np.random.default_rng(1)
+    keys = np.arange(19723, 19723 + 60)
+    values = rng.normal(8000, 300, size=keys.size)
+    values[45] = 20000
+    points = detect_anomalies(keys, values, 'day')
+    spike = max(points, key=lambda point: abs(point['score']))
+    assert spike['time'] == '2024-02-15' and spike['value'] == 20000
+    assert spike['direction'] == 'high' and spike['score'] >= 3.5
+    assert all(abs(point['score']) >= 3.5 for point in points)
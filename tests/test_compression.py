@@ -0,0 +1,79 @@
+import gzip
+import json
+import zlib
+
+import pytest
+
+from app.utils.compression import StreamCompressor, compress, MIN_COMPRESS_SIZE
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+
+def _body(response):
+    """解压（如果已压缩）后的响应正文"""
+    data = response.get_data()
+    return gzip.decompress(data) if response.headers.get('Content-Encoding') == 'gzip' else data
+
+
+def test_compress_round_trip():
+    data = b'{"value": 72}' * 1000
+    assert gzip.decompress(compress(data, 'gzip')) == data
+
+
+def test_stream_compressor_flushes_each_chunk():
+    compressor = StreamCompressor('gzip')
+    decoder = zlib.decompressobj(31)
+    # 每一块压缩后都能立即完整解出，不需要等到流结束
+    for line in (b'{"a": 1}\n', b'{"b": 2}\n'):
+        assert decoder.decompress(compressor.compress(line)) == line
+    decoder.decompress(compressor.finish())
+    assert decoder.eof
+
+
+def test_json_compressed_when_accepted(client):
+    plain = client.get('/dashboard/chart/heart_rate')
+    compressed = client.get('/dashboard/chart/heart_rate', headers=GZIP)
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert _body(compressed) == plain.get_data()
+
+
+def test_identity_and_rejected_encodings(client):
+    for accept in ('identity', 'gzip;q=0'):
+        response = client.get('/dashboard/chart/heart_rate', headers={'Accept-Encoding': accept})
+        assert 'Content-Encoding' not in response.headers
+
+
+def test_tiny_responses_not_compressed(client):
+    response = client.get('/dashboard/series/unknown', headers=GZIP)
+    assert len(response.get_data()) < MIN_COMPRESS_SIZE
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_etag_consistent_between_200_and_304(client):
+    first = client.get('/dashboard/chart/heart_rate', headers=GZIP)
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+
+    revalidated = client.get('/dashboard/chart/heart_rate', headers={**GZIP, 'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == etag
+
+
+def test_stream_and_chart_representations_do_not_collide(client):
+    # 先让流式接口完成并缓存最终图表，再依次请求JSON和NDJSON两种表示
+    client.get('/dashboard/stream')
+    chart = client.get('/dashboard/chart/dashboard', headers=GZIP)
+    stream = client.get('/dashboard/stream', headers=GZIP)
+
+    assert chart.headers['ETag'] != stream.headers['ETag']
+    assert stream.mimetype == 'application/x-ndjson'
+    assert _body(stream) == _body(chart) + b'\n'
+
+
+@pytest.mark.parametrize('headers', [{}, GZIP])
+def test_stream_lines_are_complete_figures(client, headers):
+    lines = _body(client.get('/dashboard/stream', headers=headers)).decode('utf-8').splitlines()
+    charts = [json.loads(line) for line in lines]
+    assert charts[-1]['layout']['meta']['pending'] == []
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from app.utils.correlation import pearson_matrix, spearman_matrix, correlation_pvalues
+
+pd = pytest.importorskip('pandas')
+
+
+def _matrix_with_gaps(rows=80, cols=4, seed=0):
+    rng = np.random.default_rng(seed)
+    base = rng.normal(size=(rows, 1))
+    X = base + rng.normal(scale=[0.3, 1.0, 2.0, 0.5][:cols], size=(rows, cols))
+    X[rng.random(size=X.shape) < 0.2] = np.nan
+    return X
+
+
+def test_pearson_matrix_matches_pairwise_pandas():
+    X = _matrix_with_gaps()
+    r, n = pearson_matrix(X)
+    frame = pd.DataFrame(X)
+    np.testing.assert_allclose(r, frame.corr(method='pearson').to_numpy(), atol=1e-10)
+    mask = (~np.isnan(X)).astype(int)
+    np.testing.assert_array_equal(n, mask.T @ mask)
+
+
+def test_pearson_matrix_min_periods_and_constant_column():
+    X = _matrix_with_gaps(rows=10, cols=3)
+    X[:, 2] = 5.0
+    r, n = pearson_matrix(X, min_periods=9)
+    assert np.isnan(r[2]).all() and np.isnan(r[:, 2]).all()
+    assert np.isnan(r[n < 9]).all()
+
+
+def test_spearman_matrix_matches_pandas_without_gaps():
+    X = np.round(_matrix_with_gaps(seed=1), 0)
+    X = X[~np.isnan(X).any(axis=1)]
+    r, _ = spearman_matrix(X)
+    np.testing.assert_allclose(r, pd.DataFrame(X).corr(method='spearman').to_numpy(), atol=1e-10)
+
+
+def test_spearman_matrix_reranks_pairs_with_different_gaps():
+    stats = pytest.importorskip('scipy.stats')
+    X = np.round(_matrix_with_gaps(seed=4), 1)
+    # 各列缺失模式不同：第0列只在前半段有值，第3列没有缺失
+    X[40:, 0] = np.nan
+    X[:, 3] = np.round(np.random.default_rng(5).normal(size=X.shape[0]), 1)
+    r, n = spearman_matrix(X)
+
+    for i in range(X.shape[1]):
+        for j in range(X.shape[1]):
+            if i == j:
+                continue
+            keep = ~np.isnan(X[:, i]) & ~np.isnan(X[:, j])
+            assert n[i, j] == keep.sum()
+            assert r[i, j] == pytest.approx(stats.spearmanr(X[keep, i], X[keep, j])[0], abs=1e-10)
+    np.testing.assert_allclose(r, pd.DataFrame(X).corr(method='spearman').to_numpy(), atol=1e-10)
+
+
+def test_pvalues_match_pearsonr():
+    stats = pytest.importorskip('scipy.stats')
+    rng = np.random.default_rng(2)
+    x = rng.normal(size=25)
+    y = 0.4 * x + rng.normal(size=25)
+    result = stats.pearsonr(x, y)
+    p = correlation_pvalues(np.array([result[0]]), np.array([25]))
+    assert p[0] == pytest.approx(result[1], rel=1e-6)
+
+
+def test_matrix_route_clamps_min_periods(client, monkeypatch):
+    from app.components import analysis
+
+    url = '/analysis/correlation/matrix?types=HKQuantityTypeIdentifierStepCount,HKQuantityTypeIdentifierHeartRate'
+    low = client.get(url + '&min_periods=1')
+    assert low.status_code == 200
+
+    def fail():
+        raise AssertionError('缓存命中时不应解析数据')
+
+    # 低于3的取值都被限制为3，与默认值共用同一个缓存结果
+    monkeypatch.setattr(analysis, 'initialize_parser', fail)
+    assert client.get(url).get_json() == low.get_json()
+    assert client.get(url + '&min_periods=0').get_json() == low.get_json()
+
+
+RESAMPLE_RULES = {'hour': 'h', 'day': 'D', 'week': 'W-MON'}
+
+
+@pytest.mark.parametrize('granularity, agg1, agg2', [
+    ('day', None, None),
+    ('week', 'max', 'mean'),
+    ('hour', 'sum', 'min'),
+    ('day', 'max', 'std'),
+])
+def test_correlation_alignment_matches_pandas_resample(client, export_path, granularity, agg1, agg2):
+    from app.utils.health_parser import HealthDataParser
+
+    step_type, hr_type = 'HKQuantityTypeIdentifierStepCount', 'HKQuantityTypeIdentifierHeartRate'
+    url = f'/analysis/correlation?type1={step_type}&type2={hr_type}&granularity={granularity}'
+    url += ''.join(f'&{name}={agg}' for name, agg in (('agg1', agg1), ('agg2', agg2)) if agg)
+    result = client.get(url).get_json()
+
+    # 参考实现：按本地墙钟时间重采样（每周从周一开始），没有样本的桶丢弃，再按时间内连接
+    parser = HealthDataParser()
+    assert parser.parse_xml(export_path)
+    columns = []
+    for data_type, agg in ((step_type, agg1 or 'sum'), (hr_type, agg2 or 'mean')):
+        samples, column = parser.get_range_samples(data_type)
+        resampled = samples.set_index('startDate')[column].resample(
+            RESAMPLE_RULES[granularity], label='left', closed='left'
+        )
+        columns.append(resampled.agg(agg)[resampled.count() > 0])
+    merged = pd.concat(columns, axis=1, join='inner', keys=['value_1', 'value_2']).dropna()
+
+    assert result['aggregation'] == {'type1': agg1 or 'sum', 'type2': agg2 or 'mean'}
+    assert result['count'] == len(merged)
+    np.testing.assert_array_equal(pd.to_datetime(result['data']['date']), merged.index)
+    np.testing.assert_allclose(result['data']['value_1'], merged['value_1'], rtol=1e-9)
+    np.testing.assert_allclose(result['data']['value_2'], merged['value_2'], rtol=1e-9)
+    assert result['correlation'] == pytest.approx(merged['value_1'].corr(merged['value_2']), abs=1e-4)
@@ -0,0 +1,62 @@
+import numpy as np
+
+from app.components import dashboard
+
+
+def test_chart_cache_key_ignores_unrelated_args(client, monkeypatch):
+    first = client.get('/dashboard/chart/steps?days=7')
+    assert first.status_code == 200 and 'data' in first.get_json()
+
+    def fail():
+        raise AssertionError('缓存命中时不应解析数据')
+
+    monkeypatch.setattr(dashboard, 'initialize_parser', fail)
+    second = client.get('/dashboard/chart/steps?days=7&_=12345')
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert second.get_data() == first.get_data()
+
+
+def test_chart_etag_changes_with_window_start(client, monkeypatch):
+    etag = client.get('/dashboard/chart/steps?days=7').headers['ETag']
+
+    # 跨天后“最近7天”的起始日变化，缓存键和ETag随之改变
+    window_start_day = dashboard.window_start_day
+    monkeypatch.setattr(dashboard, 'window_start_day', lambda days: window_start_day(days) + 1)
+    response = client.get('/dashboard/chart/steps?days=7', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_chart_errors_not_cached(client):
+    url = '/dashboard/chart/heatmap?type=HKQuantityTypeIdentifierBodyMass'
+    assert 'error' in client.get(url).get_json()
+    response = client.get(url)
+    assert 'error' in response.get_json() and 'ETag' not in response.headers
+
+
+def test_chart_rejects_invalid_params(client):
+    assert 'error' in client.get('/dashboard/chart/heatmap?slot=30').get_json()
+    assert 'error' in client.get('/dashboard/chart/heart_rate?points=5').get_json()
+    assert 'error' in client.get('/dashboard/chart/heart_rate?downsample=mean').get_json()
+
+
+def test_series_viewports_share_one_load(client, monkeypatch):
+    wide = client.get('/dashboard/series/heart_rate?width=100')
+    assert wide.status_code == 200 and wide.get_json()['resolution'] == 'day'
+
+    def fail():
+        raise AssertionError('视口样本已加载时不应解析数据')
+
+    # 新的视口只在已加载的样本上截取
+    monkeypatch.setattr(dashboard, 'initialize_parser', fail)
+    day = str(np.datetime64('today', 'D') - 3)
+    narrow = client.get(f'/dashboard/series/heart_rate?start={day}&end={day} 12:00&width=800')
+    assert narrow.get_json()['resolution'] == 'raw' and narrow.get_json()['count'] == 36
+    assert client.get('/dashboard/series/steps?width=1000').get_json()['resolution'] == 'hour'
+
+
+def test_series_rejects_invalid_params(client):
+    assert 'error' in client.get('/dashboard/series/weight').get_json()
+    assert 'error' in client.get('/dashboard/series/heart_rate?width=10').get_json()
+    assert 'error' in client.get('/dashboard/series/heart_rate?start=2024-01-02&end=2024-01-01').get_json()
+    assert 'error' in client.get('/dashboard/series/heart_rate?start=yesterday').get_json()
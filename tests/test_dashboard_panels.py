@@ -0,0 +1,73 @@
+import threading
+
+from app.utils.health_parser import HealthDataParser
+from app.utils.visualization import HealthDataVisualizer, _inflight_panels
+
+
+def _parser(export_path):
+    parser = HealthDataParser()
+    assert parser.parse_xml(export_path)
+    return parser
+
+
+def test_timed_out_panel_is_reused_not_resubmitted(export_path, monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def slow_ecg_panel(self, days):
+        calls.append(days)
+        release.wait(5)
+        return None
+
+    monkeypatch.setattr(HealthDataVisualizer, '_build_ecg_panel', slow_ecg_panel)
+    version = f'test-{export_path}'
+
+    chart = HealthDataVisualizer(_parser(export_path)).create_health_dashboard(
+        days=30, panel_timeout=0.5, cache_version=version
+    )
+    assert chart['layout']['meta']['pending'] == ['ecg']
+    assert HealthDataVisualizer.panels_available(30, version)
+
+    # 轮询时不需要解析器，也不会再次提交仍在构建的面板
+    chart = HealthDataVisualizer(None).create_health_dashboard(days=30, panel_timeout=0.1, cache_version=version)
+    assert chart['layout']['meta']['pending'] == ['ecg']
+    assert calls == [30]
+
+    release.set()
+    chart = HealthDataVisualizer(None).create_health_dashboard(days=30, panel_timeout=5, cache_version=version)
+    assert chart['layout']['meta']['pending'] == []
+    assert calls == [30]
+    assert not any(key[0] == version for key in _inflight_panels)
+
+
+def test_panels_not_available_for_unknown_version():
+    assert not HealthDataVisualizer.panels_available(30, 'no-such-version')
+    assert not HealthDataVisualizer.panels_available(30, None)
+
+
+def test_dashboard_poll_does_not_reparse(client, monkeypatch):
+    from app.components import dashboard
+
+    # 第一次请求构建并缓存所有面板
+    assert client.get('/dashboard/stream').status_code == 200
+
+    def fail():
+        raise AssertionError('面板已缓存时不应重新解析数据')
+
+    monkeypatch.setattr(dashboard, 'initialize_parser', fail)
+    response = client.get('/dashboard/chart/dashboard?days=30')
+    assert response.status_code == 200
+    assert response.get_json()['layout']['meta']['pending'] == []
+
+
+def test_panel_cache_keyed_on_window_start(export_path, monkeypatch):
+    from app.utils import visualization
+
+    version = f'window-{export_path}'
+    HealthDataVisualizer(_parser(export_path)).create_health_dashboard(days=30, cache_version=version)
+    assert HealthDataVisualizer.panels_available(30, version)
+
+    # 跨天后“最近30天”的起始日变化，之前的面板不再可用
+    window_start_day = visualization.window_start_day
+    monkeypatch.setattr(visualization, 'window_start_day', lambda days: window_start_day(days) + 1)
+    assert not HealthDataVisualizer.panels_available(30, version)
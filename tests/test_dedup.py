@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from app.utils.dedup import rank_sources, deduplicate_intervals, _merge_intervals
+
+
+def _brute_force(starts, ends, values, ranks):
+    """在整数时间格上逐格计算：每级样本只保留未被更高优先级样本覆盖的格子"""
+    adjusted = np.array(values, dtype=np.float64)
+    covered = set()
+    for rank in sorted(set(ranks)):
+        members = [i for i, r in enumerate(ranks) if r == rank]
+        for i in members:
+            cells = range(starts[i], max(ends[i], starts[i]))
+            if len(cells):
+                hidden = sum(cell in covered for cell in cells)
+                adjusted[i] *= 1 - hidden / len(cells)
+            elif starts[i] in covered:
+                adjusted[i] = 0.0
+        for i in members:
+            covered.update(range(starts[i], max(ends[i], starts[i])))
+    return adjusted
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_brute_force_merge(seed):
+    rng = np.random.default_rng(seed)
+    n = 60
+    starts = rng.integers(0, 200, size=n)
+    ends = starts + rng.integers(0, 30, size=n)
+    values = rng.integers(1, 500, size=n).astype(float)
+    ranks = rng.integers(0, 4, size=n)
+
+    result = deduplicate_intervals(starts, ends, values, ranks)
+    np.testing.assert_allclose(result, _brute_force(starts, ends, values, ranks))
+
+
+def test_same_source_samples_are_not_discounted():
+    result = deduplicate_intervals([0, 5], [10, 15], [100, 100], [0, 0])
+    np.testing.assert_allclose(result, [100, 100])
+
+
+def test_merge_intervals_matches_reference():
+    rng = np.random.default_rng(7)
+    starts = rng.integers(0, 100, size=40).astype(float)
+    ends = starts + rng.integers(0, 10, size=40)
+    merged_starts, merged_ends = _merge_intervals(starts, ends)
+
+    assert np.all(merged_starts[1:] > merged_ends[:-1])
+    cells = set()
+    for s, e in zip(starts, ends):
+        cells.update(range(int(s), int(e)))
+    merged_cells = set()
+    for s, e in zip(merged_starts, merged_ends):
+        merged_cells.update(range(int(s), int(e)))
+    assert merged_cells == cells
+
+
+def test_rank_sources_priority_and_uniqueness():
+    names = ['Bob’s iPhone', 'Apple Watch', None, 'Oura', 'Apple Watch', 'Zepp', 'bob’s iphone']
+    ranks = rank_sources(names)
+    assert ranks[1] == ranks[4] == 0
+    assert ranks[0] > 0 and ranks[6] > 0 and ranks[0] != ranks[6]
+    assert max(ranks[0], ranks[6]) < min(ranks[2], ranks[3], ranks[5])
+    assert len(set(ranks.tolist())) == 6
+
+    custom = rank_sources(names, priority=['iphone'])
+    assert custom[0] < custom[1]
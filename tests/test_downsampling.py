@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from app.utils.downsampling import lttb, minmax, downsample
+
+
+def _lttb_reference(x, y, n_out):
+    """Steinarsson论文中的逐桶LTTB实现"""
+    n = len(x)
+    every = (n - 2) / (n_out - 2)
+    selected = [0]
+    a = 0
+    for i in range(n_out - 2):
+        start = int(np.floor(i * every)) + 1
+        end = int(np.floor((i + 1) * every)) + 1
+        next_start = end
+        next_end = min(int(np.floor((i + 2) * every)) + 1, n)
+        if next_start >= n - 1 or i == n_out - 3:
+            cx, cy = x[n - 1], y[n - 1]
+        else:
+            cx, cy = np.mean(x[next_start:next_end]), np.mean(y[next_start:next_end])
+        best, best_area = start, -1.0
+        for j in range(start, min(end, n - 1)):
+            area = abs((x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return np.array(selected)
+
+
+def _signal(n, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.cumsum(rng.uniform(1, 60, size=n))
+    y = np.sin(x / 500) * 20 + rng.normal(0, 3, size=n) + 70
+    return x, y
+
+
+@pytest.mark.parametrize('n, n_out', [(1000, 100), (5003, 250), (37, 10), (100, 99)])
+def test_lttb_matches_reference(n, n_out):
+    x, y = _signal(n)
+    np.testing.assert_array_equal(lttb(x, y, n_out), _lttb_reference(x, y, n_out))
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_endpoints_and_global_extremes_preserved(method):
+    x, y = _signal(4000, seed=1)
+    y[1234] = 250.0
+    y[2345] = -40.0
+    indices = downsample(x, y, 200, method)
+    assert indices[0] == 0 and indices[-1] == x.size - 1
+    assert np.all(np.diff(indices) > 0)
+    assert indices.size <= 200
+    assert 1234 in indices and 2345 in indices
+
+
+def test_minmax_matches_per_column_reference():
+    x, y = _signal(3000, seed=2)
+    n_out = 120
+    columns = (n_out - 2) // 2
+    bins = np.minimum(((x - x[0]) * columns / (x[-1] - x[0])).astype(int), columns - 1)
+    expected = {0, x.size - 1}
+    for column in np.unique(bins):
+        members = np.flatnonzero(bins == column)
+        expected.add(members[np.argmin(y[members])])
+        expected.add(members[np.argmax(y[members])])
+    np.testing.assert_array_equal(minmax(x, y, n_out), sorted(expected))
+
+
+def test_short_series_and_datetime_axis():
+    x, y = _signal(50)
+    np.testing.assert_array_equal(downsample(x, y, 100), np.arange(50))
+    times = np.datetime64('2024-01-01T00:00:00') + (x * 1000).astype('timedelta64[ms]')
+    np.testing.assert_array_equal(downsample(times, y, 20), lttb(x * 1e6, y, 20))
+    with pytest.raises(ValueError):
+        downsample(x, y, 20, 'average')
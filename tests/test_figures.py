@@ -0,0 +1,112 @@
+import base64
+import json
+
+import numpy as np
+import pytest
+
+from app.utils.figures import (
+    typed_array, encode_figure, decode_figure, subplot_grid, cell_domain, TYPED_ARRAY_DTYPES
+)
+
+
+def _decode(spec):
+    """按plotly.js的规则解码类型化数组"""
+    dtype = np.dtype('<' + spec['dtype'])
+    array = np.frombuffer(base64.b64decode(spec['bdata']), dtype=dtype)
+    if 'shape' in spec:
+        array = array.reshape([int(size) for size in spec['shape'].split(',')])
+    return array
+
+
+@pytest.mark.parametrize('values', [
+    np.arange(10, dtype=np.int64),
+    np.array([True, False, True]),
+    np.array([2**40, -1], dtype=np.int64),
+    np.linspace(0, 1, 7, dtype=np.float32),
+    np.array([[1.5, np.nan], [3.0, 4.0]]),
+    np.array([], dtype=np.int64),
+])
+def test_typed_array_round_trip(values):
+    spec = typed_array(values)
+    assert spec['dtype'] in TYPED_ARRAY_DTYPES.values()
+    np.testing.assert_array_equal(_decode(spec), values.astype(_decode(spec).dtype))
+    assert _decode(spec).shape == values.shape
+
+
+def test_encode_figure_matches_plain_json():
+    figure = {
+        'data': [{'x': np.array(['2024-01-01T08:00'], dtype='datetime64[m]'), 'y': np.array([1.0]),
+                  'text': np.array(['<b>'])}],
+        'layout': {'width': np.int64(3), 'height': np.float32(np.nan)}
+    }
+    decoded = json.loads(encode_figure(figure))
+    assert decoded['data'][0]['x'] == ['2024-01-01T08:00']
+    assert _decode(decoded['data'][0]['y']).tolist() == [1.0]
+    assert decoded['data'][0]['text'] == ['<b>']
+    assert decoded['layout'] == {'width': 3, 'height': None}
+    assert '<' not in encode_figure(figure)
+
+
+def test_decode_figure_restores_typed_arrays():
+    figure = {'data': [{'y': np.array([1.5, 2.0]), 'z': np.arange(6, dtype=np.int16).reshape(2, 3),
+                        'text': ['a', 'b']}]}
+    decoded = decode_figure(encode_figure(figure))['data'][0]
+    np.testing.assert_array_equal(decoded['y'], figure['data'][0]['y'])
+    np.testing.assert_array_equal(decoded['z'], figure['data'][0]['z'])
+    assert decoded['z'].dtype == np.int16 and decoded['text'] == ['a', 'b']
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'rows': 2, 'cols': 2},
+    {'rows': 2, 'cols': 1, 'vertical_spacing': 0.15},
+    {'rows': 2, 'cols': 1, 'vertical_spacing': 0.1, 'row_heights': [0.6, 0.4]},
+    {'rows': 3, 'cols': 2, 'horizontal_spacing': 0.05},
+])
+def test_subplot_grid_matches_make_subplots(kwargs):
+    make_subplots = pytest.importorskip('plotly.subplots').make_subplots
+    expected = make_subplots(**kwargs).layout
+    rows, cols = kwargs['rows'], kwargs['cols']
+    options = {key: value for key, value in kwargs.items() if key not in ('rows', 'cols')}
+    layout, suffixes = subplot_grid(rows, cols, **options)
+
+    assert len(suffixes) == rows * cols
+    for suffix in suffixes:
+        for axis in (f'xaxis{suffix}', f'yaxis{suffix}'):
+            np.testing.assert_allclose(layout[axis]['domain'], expected[axis].domain, atol=1e-9)
+            assert layout[axis]['anchor'] == expected[axis].anchor
+
+
+def test_cell_domain_removes_axes():
+    layout, suffixes = subplot_grid(2, 1, row_heights=[0.6, 0.4], vertical_spacing=0.1)
+    domain = cell_domain(layout, suffixes[1])
+    assert 'xaxis2' not in layout and 'yaxis2' not in layout
+    np.testing.assert_allclose(domain['y'], [0, 0.36], atol=1e-9)
+
+
+def test_stress_and_ecg_figures_are_plain_dicts(export_path):
+    pd = pytest.importorskip('pandas')
+    from app.utils.health_parser import HealthDataParser
+    from app.utils.visualization import HealthDataVisualizer
+
+    parser = HealthDataParser()
+    parser.parse_xml(export_path)
+    visualizer = HealthDataVisualizer(parser)
+
+    stress = visualizer.plot_stress_indicators()
+    assert [trace['type'] for trace in stress['data']] == ['scatter', 'bar']
+    assert [trace['yaxis'] for trace in stress['data']] == ['y', 'y2']
+    json.loads(encode_figure(stress))
+
+    ecg = pd.DataFrame({
+        'startDate': pd.to_datetime(['2024-01-01 08:00', '2024-01-01 09:00', '2024-01-03 08:00']),
+        'local_day': [19723, 19723, 19725],
+        'classification': ['SinusRhythm', 'AtrialFibrillation', 'SinusRhythm']
+    })
+    summary = visualizer.plot_ecg_summary(ecg)
+    bar, pie = summary['data']
+    assert bar['x'] == ['2024-01-01', '2024-01-03'] and bar['y'].tolist() == [2, 1]
+    assert pie['type'] == 'pie' and dict(zip(pie['labels'], pie['values'].tolist())) == {
+        'SinusRhythm': 2, 'AtrialFibrillation': 1
+    }
+    assert 'xaxis2' not in summary['layout']
+    json.loads(encode_figure(summary))
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from app.utils.indicators import rolling_mean, rolling_std, bollinger_bands, rsi, atr, compute_indicators
+
+
+def _series(n=120, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 8000 + rng.normal(0, 800, size=n).cumsum()
+    high = close + rng.uniform(0, 300, size=n)
+    low = close - rng.uniform(0, 300, size=n)
+    return close, high, low
+
+
+def _naive_window(values, window, reduce):
+    result = np.full(values.size, np.nan)
+    for end in range(window - 1, values.size):
+        result[end] = reduce(values[end - window + 1:end + 1])
+    return result
+
+
+@pytest.mark.parametrize('window', [1, 7, 30])
+def test_rolling_mean_and_std_match_loop(window):
+    close, _, _ = _series()
+    np.testing.assert_allclose(rolling_mean(close, window), _naive_window(close, window, np.mean), rtol=1e-9)
+    # 累积平方和相减有舍入误差，数值量级约1e4时绝对误差在1e-3以内
+    np.testing.assert_allclose(rolling_std(close, window), _naive_window(close, window, np.std),
+                               rtol=1e-6, atol=1e-3)
+
+
+def test_window_longer_than_series():
+    assert np.isnan(rolling_mean([1.0, 2.0], 5)).all()
+    assert np.isnan(rsi([1.0, 2.0], 14)).all()
+    assert np.isnan(atr([1.0], [1.0], [1.0], 14)).all()
+
+
+def test_bollinger_bands_are_symmetric():
+    close, _, _ = _series()
+    middle, upper, lower = bollinger_bands(close, 20, 2.0)
+    np.testing.assert_allclose(upper - middle, middle - lower)
+    np.testing.assert_allclose(upper - middle, 2.0 * _naive_window(close, 20, np.std), rtol=1e-6)
+
+
+def test_rsi_matches_loop():
+    close, _, _ = _series(seed=1)
+    period = 14
+    expected = np.full(close.size, np.nan)
+    for end in range(period, close.size):
+        changes = np.diff(close[end - period:end + 1])
+        gains = changes[changes > 0].sum()
+        losses = -changes[changes < 0].sum()
+        expected[end] = 50.0 if gains + losses == 0 else 100.0 * gains / (gains + losses)
+    np.testing.assert_allclose(rsi(close, period), expected, rtol=1e-9)
+    assert rsi(np.full(20, 3.0), period)[-1] == 50.0
+
+
+def test_atr_matches_wilder_recursion():
+    pytest.importorskip('scipy')
+    close, high, low = _series(seed=2)
+    period = 14
+    true_range = np.empty(close.size)
+    true_range[0] = high[0] - low[0]
+    for i in range(1, close.size):
+        true_range[i] = max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+    expected = np.full(close.size, np.nan)
+    expected[period - 1] = true_range[:period].mean()
+    for i in range(period, close.size):
+        expected[i] = (expected[i - 1] * (period - 1) + true_range[i]) / period
+    np.testing.assert_allclose(atr(high, low, close, period), expected, rtol=1e-9)
+
+
+def test_compute_indicators_shapes():
+    pytest.importorskip('scipy')
+    close, high, low = _series()
+    result = compute_indicators(close, high, low, sma_windows=(7, 14))
+    assert set(result['sma']) == {7, 14}
+    for array in (result['rsi'], result['atr'], *result['bollinger'].values(), *result['sma'].values()):
+        assert array.shape == close.shape
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from app.utils.kernels import segment_bounds, segment_stats
+
+pd = pytest.importorskip('pandas')
+
+
+@pytest.mark.parametrize('assume_sorted', [False, True])
+def test_segment_stats_matches_groupby(assume_sorted):
+    rng = np.random.default_rng(0)
+    keys = rng.integers(0, 40, size=2000)
+    values = rng.normal(1e6, 50, size=keys.size)
+    values[rng.random(keys.size) < 0.05] = np.nan
+    if assume_sorted:
+        order = np.argsort(keys, kind='mergesort')
+        keys, values = keys[order], values[order]
+
+    stats = segment_stats(keys, values, assume_sorted=assume_sorted)
+    expected = pd.Series(values).groupby(keys).agg(['count', 'sum', 'mean', 'std', 'min', 'max'])
+    expected = expected[expected['count'] > 0]
+    expected['std'] = expected['std'].fillna(0.0)
+
+    np.testing.assert_array_equal(stats['key'], expected.index.to_numpy())
+    np.testing.assert_array_equal(stats['count'], expected['count'].to_numpy())
+    for column in ('sum', 'mean', 'std', 'min', 'max'):
+        np.testing.assert_allclose(stats[column], expected[column].to_numpy(), rtol=1e-10, atol=1e-9)
+    np.testing.assert_allclose(stats['range'], stats['max'] - stats['min'])
+
+
+def test_single_sample_std_and_empty_input():
+    stats = segment_stats([3, 1, 1], [2.0, 4.0, 6.0])
+    assert stats['key'].tolist() == [1, 3]
+    assert stats['std'][1] == 0.0
+    assert stats['std'][0] == pytest.approx(np.std([4.0, 6.0], ddof=1))
+
+    empty = segment_stats([1, 2], [np.nan, np.nan])
+    assert empty['key'].size == 0 and empty['mean'].size == 0
+
+
+def test_segment_bounds():
+    keys, starts, counts = segment_bounds(np.array([2, 2, 5, 7, 7, 7]))
+    assert keys.tolist() == [2, 5, 7]
+    assert starts.tolist() == [0, 2, 3]
+    assert counts.tolist() == [2, 1, 3]
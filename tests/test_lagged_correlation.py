@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from app.utils.correlation import lagged_cross_correlation, peak_lag
+
+LAGGED_URL = ('/analysis/correlation/lagged?type1=HKQuantityTypeIdentifierStepCount'
+              '&type2=HKQuantityTypeIdentifierHeartRate')
+
+
+def _direct_lagged(x, y, max_lag):
+    """逐个滞后截取成对样本直接计算相关系数的参考实现"""
+    rows = []
+    for lag in range(-max_lag, max_lag + 1):
+        a = x[:x.size - lag] if lag >= 0 else x[-lag:]
+        b = y[lag:] if lag >= 0 else y[:y.size + lag]
+        keep = ~np.isnan(a) & ~np.isnan(b)
+        rows.append((lag, keep.sum(), np.corrcoef(a[keep], b[keep])[0, 1]))
+    return rows
+
+
+def test_fft_lagged_correlation_matches_direct_pairs():
+    rng = np.random.default_rng(3)
+    x = rng.normal(size=120)
+    y = np.roll(x, 4) + 0.3 * rng.normal(size=120)
+    x[rng.random(120) < 0.1] = np.nan
+    y[rng.random(120) < 0.1] = np.nan
+    result = lagged_cross_correlation(x, y, max_lag=10)
+
+    expected = _direct_lagged(x, y, 10)
+    assert result['lags'].tolist() == [lag for lag, _, _ in expected]
+    assert result['n'].tolist() == [n for _, n, _ in expected]
+    np.testing.assert_allclose(result['r'], [r for _, _, r in expected], atol=1e-9)
+    assert peak_lag(result)['lag'] == 4
+
+
+def test_max_lag_clamped_to_series_length():
+    x = np.arange(6.0)
+    result = lagged_cross_correlation(x, x ** 2, max_lag=50)
+    assert result['lags'].tolist() == list(range(-5, 6))
+    # 成对样本少于min_periods的滞后没有相关系数
+    assert np.isnan(result['r'][result['n'] < 3]).all()
+
+
+def test_peak_lag_bonferroni_adjustment():
+    result = {
+        'lags': np.array([-2, -1, 0, 1, 2]),
+        'r': np.array([0.1, np.nan, -0.6, 0.3, 0.2]),
+        'n': np.array([20, 2, 22, 21, 20]),
+        'p_value': np.array([0.6, np.nan, 0.01, 0.2, 0.4])
+    }
+    peak = peak_lag(result)
+    # 绝对值最大的是负相关；校正只计入有相关系数的4个滞后
+    assert peak['lag'] == 0 and peak['r'] == -0.6 and peak['n'] == 22
+    assert peak['lags_tested'] == 4
+    assert peak['p_value_adjusted'] == pytest.approx(0.04)
+
+    result['p_value'][2] = 0.5
+    assert peak_lag(result)['p_value_adjusted'] == 1.0
+    assert peak_lag({**result, 'r': np.full(5, np.nan)}) is None
+
+
+def test_lagged_route_validates_max_lag(client):
+    response = client.get(LAGGED_URL + '&max_lag=3')
+    assert response.status_code == 200
+    assert response.get_json()['lags'] == list(range(-3, 4))
+
+    for max_lag in ('-1', '366', 'abc'):
+        response = client.get(LAGGED_URL + f'&max_lag={max_lag}')
+        assert response.status_code == 400 and 'max_lag' in response.get_json()['error']
+    assert client.get(LAGGED_URL + '&granularity=hour&max_lag=336').status_code == 200
+    assert client.get(LAGGED_URL + '&granularity=week&max_lag=105').status_code == 400
@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+from app.utils.lazy import lazy_module
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_lazy_module_imports_on_first_attribute_access():
+    proxy = lazy_module('json.decoder')
+    assert '未导入' in repr(proxy)
+    assert proxy.JSONDecodeError is sys.modules['json.decoder'].JSONDecodeError
+    assert '已导入' in repr(proxy)
+
+
+def test_app_startup_does_not_import_deferred_modules():
+    sys.path.insert(0, os.path.join(PROJECT_ROOT, 'scripts'))
+    try:
+        from check_import_time import DEFERRED_MODULES, STARTUP_CODE
+    finally:
+        sys.path.pop(0)
+
+    code = STARTUP_CODE + (
+        "\nimport sys"
+        f"\nprint(','.join(sorted({{name.split('.')[0] for name in sys.modules}} & set({DEFERRED_MODULES!r}))))"
+    )
+    result = subprocess.run([sys.executable, '-c', code], cwd=PROJECT_ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ''
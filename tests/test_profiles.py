@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from app.utils.profiles import weekday_profile, weekday_codes, slot_labels
+
+pd = pytest.importorskip('pandas')
+
+
+def _groupby_reference(local_day, minute, values, slot_minutes):
+    """逐样本按(星期, 时段)分组的参考实现，星期由日期本身得到"""
+    frame = pd.DataFrame({'day': local_day, 'minute': minute, 'value': values}).dropna()
+    frame['weekday'] = pd.to_datetime(frame['day'], unit='D').dt.weekday
+    frame['slot'] = frame['minute'] // slot_minutes
+    grouped = frame.groupby(['weekday', 'slot'])['value']
+    days = frame.drop_duplicates('day')['weekday'].value_counts()
+    return grouped.count(), grouped.sum(), grouped.mean(), days
+
+
+def test_weekday_codes_match_calendar():
+    days = np.arange(19723, 19723 + 14)
+    expected = pd.to_datetime(days, unit='D').weekday
+    np.testing.assert_array_equal(weekday_codes(days), expected)
+    # 2024-01-01是周一
+    assert weekday_codes([19723])[0] == 0
+
+
+@pytest.mark.parametrize('slot_minutes', [60, 15])
+def test_profile_matches_groupby(slot_minutes):
+    rng = np.random.default_rng(slot_minutes)
+    size = 5000
+    local_day = rng.integers(19700, 19760, size=size)
+    minute = rng.integers(0, 1440, size=size)
+    values = rng.normal(70, 10, size=size)
+    values[rng.random(size) < 0.05] = np.nan
+
+    profile = weekday_profile(local_day, minute, values, slot_minutes)
+    count, total, mean, days = _groupby_reference(local_day, minute, values, slot_minutes)
+
+    slots = 1440 // slot_minutes
+    assert profile['count'].shape == (7, slots)
+    assert profile['count'].sum() == count.sum()
+    for (weekday, slot), n in count.items():
+        assert profile['count'][weekday, slot] == n
+        assert profile['sum'][weekday, slot] == pytest.approx(total[(weekday, slot)])
+        assert profile['mean'][weekday, slot] == pytest.approx(mean[(weekday, slot)])
+        assert profile['daily_mean'][weekday, slot] == pytest.approx(total[(weekday, slot)] / days[weekday])
+    np.testing.assert_array_equal(profile['days'], days.reindex(range(7), fill_value=0).to_numpy())
+    assert np.isnan(profile['mean'][profile['count'] == 0]).all()
+
+
+def test_profile_rejects_uneven_slots():
+    with pytest.raises(ValueError):
+        weekday_profile([19723], [0], [1.0], slot_minutes=7)
+
+
+@pytest.mark.parametrize('data_type, slot_minutes', [
+    ('HKQuantityTypeIdentifierHeartRate', 15),
+    ('HKQuantityTypeIdentifierStepCount', 60),
+])
+def test_weekday_heatmap_matches_sample_groupby(export_path, data_type, slot_minutes):
+    from app.utils.health_parser import HealthDataParser
+    from app.utils.visualization import HealthDataVisualizer
+
+    parser = HealthDataParser()
+    assert parser.parse_xml(export_path)
+    chart = HealthDataVisualizer(parser).plot_weekday_heatmap(data_type, slot_minutes)
+    trace = chart['data'][0]
+    assert trace['x'] == slot_labels(slot_minutes) and len(trace['y']) == 7
+
+    # 参考值直接由每条样本的本地墙钟时间分组得到
+    samples, column = parser.get_range_samples(data_type)
+    local = samples['startDate']
+    count, total, mean, days = _groupby_reference(
+        (local.dt.normalize() - pd.Timestamp('1970-01-01')).dt.days, local.dt.hour * 60 + local.dt.minute,
+        samples[column], slot_minutes
+    )
+    cumulative = data_type.endswith('StepCount')
+    expected = np.full((7, 1440 // slot_minutes), np.nan)
+    for (weekday, slot), value in (total / days.reindex(total.index.get_level_values(0)).to_numpy()
+                                   if cumulative else mean).items():
+        expected[weekday, slot] = round(value, 2)
+    np.testing.assert_allclose(trace['z'], expected, atol=1e-9)
+    assert trace['customdata'].sum() == len(samples)
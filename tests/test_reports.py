@@ -0,0 +1,66 @@
+import os
+import shutil
+
+import pytest
+
+from app.utils import reports
+from app.utils.cache import artifact_dir, dataset_version
+from app.utils.health_parser import HealthDataParser
+from app.utils.summary import persist_health_summary
+from app.utils.visualization import HealthDataVisualizer, save_dashboard_panels, load_dashboard_panels
+
+pytest.importorskip('matplotlib')
+# 测试环境没有中文字体
+pytestmark = pytest.mark.filterwarnings('ignore:Glyph .* missing from')
+
+
+@pytest.fixture
+def upload_root(tmp_path, export_path):
+    """包含一个数据集（上传目录ds1）的上传根目录"""
+    root = tmp_path / 'uploads'
+    (root / 'ds1').mkdir(parents=True)
+    shutil.copy(export_path, root / 'ds1' / 'export.xml')
+    return str(root)
+
+
+@pytest.mark.parametrize('fmt, names, magic', [
+    ('png', ['dashboard.png', 'summary.png'], b'\x89PNG'),
+    ('pdf', ['ds1.pdf'], b'%PDF'),
+])
+def test_render_dataset_writes_report(upload_root, tmp_path, fmt, names, magic):
+    output = tmp_path / 'reports'
+    result = reports.render_dataset(upload_root, 'ds1', str(output), fmt)
+    assert result['status'] == 'ok'
+    assert [os.path.basename(path) for path in result['files']] == names
+    for path in result['files']:
+        with open(path, 'rb') as f:
+            assert f.read(4) == magic
+
+
+@pytest.mark.parametrize('dataset_id', ['missing', '..', '../uploads', ''])
+def test_render_dataset_rejects_unknown_ids(upload_root, tmp_path, dataset_id):
+    result = reports.render_dataset(upload_root, dataset_id, str(tmp_path / 'reports'))
+    assert result['status'] == 'error' and result['files'] == []
+    assert not (tmp_path / 'reports').exists()
+
+
+def test_render_dataset_reuses_persisted_artifacts(upload_root, tmp_path, monkeypatch):
+    xml_path = os.path.join(upload_root, 'ds1', 'export.xml')
+    parser = HealthDataParser()
+    assert parser.parse_xml(xml_path)
+    panels = HealthDataVisualizer(parser).build_dashboard_panels(30)
+    persist_health_summary(parser, xml_path)
+    directory, version = artifact_dir(xml_path), dataset_version(xml_path)
+    assert save_dashboard_panels(directory, version, 30, panels)
+
+    loaded = load_dashboard_panels(directory, version, 30)
+    assert list(loaded) == list(panels)
+    assert load_dashboard_panels(directory, version, 7) is None
+
+    def fail(*args, **kwargs):
+        raise AssertionError('已持久化摘要和面板时不应解析数据')
+
+    # 上传时已保存摘要和面板，生成报告不需要解析数据
+    monkeypatch.setattr(reports, 'load_dataset', fail)
+    result = reports.render_dataset(upload_root, 'ds1', str(tmp_path / 'reports'), 'png', days=30)
+    assert result['status'] == 'ok' and len(result['files']) == 2
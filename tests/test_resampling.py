@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from app.utils import resampling
+from app.utils.resampling import (
+    block_bootstrap_indices, bootstrap_correlation_ci, permutation_test, _row_ranks, _bootstrap_batch
+)
+
+
+def _series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=n).cumsum()
+    y = 0.5 * x + rng.normal(size=n)
+    return x, y
+
+
+def test_block_indices_are_wrapped_consecutive_blocks():
+    n, block_length = 17, 4
+    indices = block_bootstrap_indices(n, 50, block_length, np.random.default_rng(1))
+    assert indices.shape == (50, n)
+    for row in indices:
+        for start in range(0, n, block_length):
+            block = row[start:start + block_length]
+            assert np.array_equal(block, (block[0] + np.arange(block.size)) % n)
+
+
+def test_row_ranks_match_rankdata():
+    stats = pytest.importorskip('scipy.stats')
+    matrix = np.random.default_rng(2).integers(0, 5, size=(6, 30)).astype(float)
+    expected = np.vstack([stats.rankdata(row) for row in matrix])
+    np.testing.assert_allclose(_row_ranks(matrix), expected)
+
+
+def test_bootstrap_batch_matches_per_resample_loop():
+    stats = pytest.importorskip('scipy.stats')
+    x, y = _series(40)
+    seed = np.random.SeedSequence(3)
+    batch = _bootstrap_batch(x, y, 25, 5, seed)
+
+    indices = block_bootstrap_indices(x.size, 25, 5, np.random.default_rng(seed))
+    for column, index in enumerate(indices):
+        xs, ys = x[index], y[index]
+        assert batch[0, column] == pytest.approx(np.corrcoef(xs, ys)[0, 1])
+        assert batch[1, column] == pytest.approx(stats.spearmanr(xs, ys)[0])
+        assert batch[2, column] == pytest.approx(np.polyfit(xs, ys, 1)[0])
+
+
+def test_bootstrap_interval_contains_estimate_and_is_reproducible():
+    x, y = _series(200)
+    first = bootstrap_correlation_ci(x, y, n_resamples=500, seed=7)
+    second = bootstrap_correlation_ci(x, y, n_resamples=500, seed=7)
+    assert first == second
+    observed = np.corrcoef(x, y)[0, 1]
+    assert first['pearson']['low'] <= observed <= first['pearson']['high']
+
+
+def test_parallel_bootstrap_matches_serial(monkeypatch):
+    x, y = _series(resampling.PARALLEL_MIN_SAMPLES)
+    # 小批次保证有多个批次可以分发
+    monkeypatch.setattr(resampling, 'MAX_BATCH_ELEMENTS', x.size * 50)
+    serial = bootstrap_correlation_ci(x, y, n_resamples=200, max_workers=1)
+    parallel = bootstrap_correlation_ci(x, y, n_resamples=200, max_workers=2)
+    assert serial == parallel
+
+    # 后续请求复用同一个进程池
+    pool = resampling._process_pool
+    assert pool is not None
+    bootstrap_correlation_ci(x, y, n_resamples=100, max_workers=2)
+    assert resampling._process_pool is pool
+
+
+CORRELATION_URL = ('/analysis/correlation?type1=HKQuantityTypeIdentifierStepCount'
+                   '&type2=HKQuantityTypeIdentifierHeartRate&bootstrap=1&n_boot=200')
+
+
+def test_correlation_response_cached_before_parsing(client, monkeypatch):
+    from app.components import analysis
+
+    first = client.get(CORRELATION_URL)
+    assert first.status_code == 200 and first.get_json()['bootstrap']['n_resamples'] == 200
+
+    def fail():
+        raise AssertionError('缓存命中时不应解析数据')
+
+    monkeypatch.setattr(analysis, 'initialize_parser', fail)
+    second = client.get(CORRELATION_URL)
+    assert second.status_code == 200
+    assert second.get_data() == first.get_data()
+    assert client.get(CORRELATION_URL, headers={'If-None-Match': second.headers['ETag']}).status_code == 304
+
+
+def test_correlation_errors_not_cached(client):
+    url = '/analysis/correlation?type1=HKQuantityTypeIdentifierStepCount&type2=Missing'
+    assert client.get(url).status_code == 404
+    response = client.get(url)
+    assert response.status_code == 404 and 'ETag' not in response.headers
+
+
+def test_permutation_test_matches_loop_reference():
+    x, y = _series(30, seed=4)
+    y = y + np.random.default_rng(5).normal(scale=5, size=y.size)
+    n_permutations = 500
+    result = permutation_test(x, y, n_permutations, seed=11)
+
+    observed = np.corrcoef(x, y)[0, 1]
+    rng = np.random.default_rng(11)
+    permutations = rng.permuted(np.broadcast_to(np.arange(x.size), (n_permutations, x.size)), axis=1)
+    extreme = sum(abs(np.corrcoef(x, y[p])[0, 1]) >= abs(observed) - 1e-12 for p in permutations)
+
+    assert result['statistic'] == round(observed, 4)
+    assert result['p_value'] == round((extreme + 1) / (n_permutations + 1), 6)
+
+
+def test_permutation_test_spearman_statistic():
+    stats = pytest.importorskip('scipy.stats')
+    x, y = _series(60, seed=6)
+    result = permutation_test(x, y, 200, method='spearman')
+    assert result['statistic'] == pytest.approx(stats.spearmanr(x, y)[0], abs=1e-4)
+
+
+def test_permutation_test_constant_input():
+    result = permutation_test(np.ones(10), np.arange(10.0), 100)
+    assert result['statistic'] is None and result['p_value'] is None
+    with pytest.raises(ValueError):
+        permutation_test(np.arange(5.0), np.arange(5.0), 100, method='kendall')
@@ -0,0 +1,60 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.utils.running_stats import RunningStats, merge_stats
+
+
+def _accumulate(values, times=None):
+    stats = RunningStats()
+    for i, value in enumerate(values):
+        stats.update(value, None if times is None else times[i])
+    return stats
+
+
+def test_matches_two_pass_statistics():
+    values = np.random.default_rng(0).normal(1e7, 3.0, size=5000)
+    stats = _accumulate(values.tolist())
+    assert stats.count == values.size
+    assert stats.mean == pytest.approx(values.mean(), rel=1e-12)
+    assert stats.variance == pytest.approx(values.var(ddof=1), rel=1e-8)
+    assert stats.min == values.min() and stats.max == values.max()
+
+
+def test_merge_equals_single_pass():
+    rng = np.random.default_rng(1)
+    values = rng.normal(70, 10, size=900)
+    times = rng.integers(0, 10**9, size=900)
+    whole = _accumulate(values.tolist(), times.tolist())
+
+    parts = [_accumulate(values[a:b].tolist(), times[a:b].tolist()) for a, b in ((0, 1), (1, 400), (400, 900))]
+    merged = RunningStats()
+    for part in parts:
+        merged.merge(part)
+
+    assert merged.count == whole.count and merged.records == whole.records
+    assert merged.mean == pytest.approx(whole.mean, rel=1e-12)
+    assert merged.variance == pytest.approx(whole.variance, rel=1e-10)
+    assert (merged.min, merged.max, merged.first, merged.last) == (whole.min, whole.max, whole.first, whole.last)
+
+
+def test_non_numeric_records_and_small_counts():
+    stats = RunningStats()
+    stats.update(None, 100, 200)
+    assert stats.records == 1 and stats.count == 0
+    assert math.isnan(stats.variance)
+    summary = stats.to_dict()
+    assert summary['mean'] is None and summary['std'] is None
+    assert summary['first'] == '1970-01-01T00:01:40' and summary['last'] == '1970-01-01T00:03:20'
+
+    stats.update(5.0)
+    assert stats.to_dict()['mean'] == 5.0 and stats.to_dict()['std'] is None
+
+
+def test_merge_stats_does_not_alias_sources():
+    source = {'HeartRate': _accumulate([60.0, 80.0])}
+    target = merge_stats({}, source)
+    target['HeartRate'].update(100.0)
+    assert source['HeartRate'].count == 2
+    assert merge_stats(target, source)['HeartRate'].count == 5
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from app.utils.sketches import QuantileSketches, rank_errors, save_sketches, load_sketches
+
+QS = [0.0, 0.05, 0.25, 0.5, 0.75, 0.95, 1.0]
+
+
+def _sample(seed=0, groups=12):
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(1, 3000, size=groups)
+    keys = np.repeat(np.arange(groups) * 3, sizes)
+    values = rng.normal(70, 12, size=keys.size)
+    order = rng.permutation(keys.size)
+    return keys[order], values[order]
+
+
+def _rank_distance(sorted_values, value, q):
+    """返回value在排序样本中的位置与精确目标秩之间的距离"""
+    target = int(np.floor(q * (sorted_values.size - 1)))
+    low = np.searchsorted(sorted_values, value, side='left')
+    high = np.searchsorted(sorted_values, value, side='right') - 1
+    if low <= target <= high:
+        return 0
+    return min(abs(low - target), abs(high - target))
+
+
+@pytest.mark.parametrize('k', [8, 50, 200])
+def test_per_key_quantiles_within_rank_bound(k):
+    keys, values = _sample()
+    sketches = QuantileSketches.build(keys, values, k=k)
+    result_keys, matrix = sketches.quantiles(QS)
+
+    assert np.array_equal(result_keys, np.unique(keys))
+    for row, key in enumerate(result_keys):
+        exact = np.sort(values[keys == key])
+        bound = rank_errors([exact.size], k)[0]
+        for col, q in enumerate(QS):
+            assert _rank_distance(exact, matrix[row, col], q) <= bound
+
+
+def test_small_groups_are_exact():
+    keys, values = _sample(groups=5)
+    sketches = QuantileSketches.build(keys, values, k=10000)
+    _, matrix = sketches.quantiles([0.5])
+    for row, key in enumerate(np.unique(keys)):
+        exact = np.sort(values[keys == key])
+        assert matrix[row, 0] == exact[int(np.floor(0.5 * (exact.size - 1)))]
+
+
+def test_range_quantiles_within_merged_bound():
+    keys, values = _sample(seed=1)
+    sketches = QuantileSketches.build(keys, values, k=40)
+    start, end = 6, 21
+    merged, count = sketches.range_quantiles(QS, start, end)
+
+    selected = (keys >= start) & (keys <= end)
+    exact = np.sort(values[selected])
+    assert count == exact.size
+    bound = sketches.rank_error_bound((sketches.keys >= start) & (sketches.keys <= end))
+    for col, q in enumerate(QS):
+        assert _rank_distance(exact, merged[col], q) <= bound
+
+
+def test_nan_values_ignored_and_empty_range():
+    sketches = QuantileSketches.build([1, 1, 2], [np.nan, 5.0, 7.0])
+    assert sketches.counts.tolist() == [1, 1]
+    merged, count = sketches.range_quantiles([0.5], start=100)
+    assert count == 0 and np.isnan(merged).all()
+
+
+def test_persistence_round_trip(tmp_path):
+    keys, values = _sample(seed=2)
+    built = QuantileSketches.build(keys, values, k=30)
+    sketches = {('HKQuantityTypeIdentifierHeartRate', 'day'): built,
+                ('HKQuantityTypeIdentifierHeartRate', 'hour'): None}
+
+    assert save_sketches(str(tmp_path), 'v1', sketches)
+    loaded = load_sketches(str(tmp_path), 'v1')
+    assert load_sketches(str(tmp_path), 'v2') is None
+
+    assert loaded[('HKQuantityTypeIdentifierHeartRate', 'hour')] is None
+    restored = loaded[('HKQuantityTypeIdentifierHeartRate', 'day')]
+    assert restored.k == built.k
+    for field in ('keys', 'offsets', 'values', 'weights'):
+        assert np.array_equal(getattr(restored, field), getattr(built, field))
+    assert np.array_equal(restored.quantiles(QS)[1], built.quantiles(QS)[1])
+
+
+def test_merge_alias_sketches_within_bound():
+    keys, values = _sample(seed=3)
+    # 两个别名的样本落在部分重叠的键上
+    first = keys % 2 == 0
+    second = ~first | (keys < 12)
+    parts = [QuantileSketches.build(keys[mask], values[mask], k=30) for mask in (first, second & ~first)]
+    merged = QuantileSketches.merge(parts + [None])
+
+    assert np.array_equal(merged.keys, np.unique(keys))
+    assert merged.counts.sum() == keys.size
+    result, count = merged.range_quantiles(QS)
+    exact = np.sort(values)
+    assert count == exact.size
+    bound = merged.rank_error_bound()
+    assert bound == sum(part.rank_error_bound() for part in parts)
+    for col, q in enumerate(QS):
+        assert _rank_distance(exact, result[col], q) <= bound
+
+    assert QuantileSketches.merge([None]) is None
+    assert QuantileSketches.merge([parts[0]]) is parts[0]
@@ -0,0 +1,106 @@
+import re
+
+import numpy as np
+import pytest
+
+from app.utils.health_parser import HealthDataParser
+from app.utils.summary import build_health_summary
+
+
+@pytest.fixture
+def alias_export(export_path):
+    """把每隔一条的心率和步数记录改为别名类型（如旧版导出或第三方转换的数据）"""
+    lines = open(export_path, encoding='utf-8').read().split('\n')
+    aliases = {'HKQuantityTypeIdentifierHeartRate': 'HeartRate', 'HKQuantityTypeIdentifierStepCount': 'StepCount'}
+    for index in range(0, len(lines), 2):
+        for name, alias in aliases.items():
+            lines[index] = lines[index].replace(f'type="{name}"', f'type="{alias}"')
+    with open(export_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+    return export_path
+
+
+def test_summary_merges_type_aliases(alias_export):
+    parser = HealthDataParser()
+    assert parser.parse_xml(alias_export)
+    assert {'HeartRate', 'HKQuantityTypeIdentifierHeartRate', 'StepCount'} <= set(parser.record_types)
+
+    summary = build_health_summary(parser)
+
+    daily_steps = parser.get_daily_step_count()
+    assert summary['steps']['average'] == pytest.approx(float(daily_steps['步数'].mean()))
+
+    stress = parser.get_stress_indicators()
+    assert summary['stress']['average'] == pytest.approx(float(stress['压力指数'].mean()))
+
+
+def _classify(average):
+    """逐条按原有规则划分压力等级"""
+    if average > 10:
+        return '高压力'
+    if average < 5:
+        return '低压力'
+    return '中等压力'
+
+
+@pytest.mark.parametrize('scale, level', [(0.0, '低压力'), (1.0, '低压力'), (4.0, '中等压力')])
+def test_stress_level_matches_indicators(export_path, scale, level):
+    # 按比例放大心率围绕80的波动，改变每日标准差和范围
+    text = open(export_path, encoding='utf-8').read()
+    pattern = re.compile(r'(type="HKQuantityTypeIdentifierHeartRate".*?value=")(\d+)(")')
+    text = pattern.sub(lambda m: f"{m[1]}{80 + (int(m[2]) - 80) * scale:g}{m[3]}", text)
+    with open(export_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+    parser = HealthDataParser()
+    assert parser.parse_xml(export_path)
+    summary = build_health_summary(parser)
+
+    average = float(parser.get_stress_indicators()['压力指数'].mean())
+    assert summary['stress']['average'] == pytest.approx(average)
+    assert summary['stress']['level'] == _classify(average) == level
+
+
+def test_heart_rate_percentiles_merge_aliases(alias_export):
+    # 别名记录的心率整体偏高，只用一个别名的摘要会得到不同的分位数
+    text = open(alias_export, encoding='utf-8').read()
+    pattern = re.compile(r'(type="HeartRate".*?value=")(\d+)(")')
+    with open(alias_export, 'w', encoding='utf-8') as f:
+        f.write(pattern.sub(lambda m: f"{m[1]}{int(m[2]) + 60}{m[3]}", text))
+
+    parser = HealthDataParser()
+    assert parser.parse_xml(alias_export)
+    section = build_health_summary(parser)['heart_rate']
+
+    # 每天的样本数不超过摘要大小，合并后的分位数是精确的
+    values = np.sort(parser.get_samples(['HKQuantityTypeIdentifierHeartRate', 'HeartRate'])['value'].to_numpy())
+    assert values.size == 21 * 72
+    for key, q in (('p5', 0.05), ('median', 0.5), ('p95', 0.95)):
+        assert section[key] == values[int(np.floor(q * (values.size - 1)))]
+
+
+def test_analysis_index_renders_persisted_summary(client, export_path, monkeypatch):
+    from app.components import analysis, dashboard
+    from app.utils.summary import persist_health_summary, load_health_summary, SUMMARY_FORMAT
+
+    parser = HealthDataParser()
+    assert parser.parse_xml(export_path)
+    persist_health_summary(parser, export_path)
+    assert load_health_summary(export_path)['format'] == SUMMARY_FORMAT
+
+    def fail():
+        raise AssertionError('摘要已持久化时不应解析数据')
+
+    monkeypatch.setattr(dashboard, 'initialize_parser', fail)
+    monkeypatch.setattr(analysis, 'initialize_parser', fail)
+    response = client.get('/analysis')
+    assert response.status_code == 200
+
+    daily_steps = parser.get_daily_step_count()['步数']
+    stats = analysis._summary_stats(load_health_summary(export_path))
+    assert stats['steps']['总步数'] == pytest.approx(float(daily_steps.sum()))
+    assert stats['steps']['最高步数'] == pytest.approx(float(daily_steps.max()))
+    sleep = parser.get_sleep_duration_daily()['睡眠时长(小时)']
+    assert stats['sleep']['最短睡眠时长'] == pytest.approx(float(sleep.min()))
+    assert stats['heart_rate']['最大心率'] == parser.get_heart_rate_stats()['最高心率']
+    assert f"{int(daily_steps.sum())}" in response.get_data(as_text=True)
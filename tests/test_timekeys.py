@@ -0,0 +1,124 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from app.utils.timekeys import (
+    parse_timestamps, timestamp_to_utc_seconds, bucket_keys, bucket_starts, bucket_labels,
+    prefilter_since, window_start_day, INVALID_DAY
+)
+
+
+def _reference(text):
+    """逐条用datetime解析Apple导出格式"""
+    parsed = datetime.datetime.strptime(text, '%Y-%m-%d %H:%M:%S %z')
+    local = parsed.replace(tzinfo=None)
+    epoch = datetime.datetime(1970, 1, 1)
+    local_seconds = int((local - epoch).total_seconds())
+    offset = int(parsed.utcoffset().total_seconds() // 60)
+    return local_seconds, offset
+
+
+def test_apple_format_with_offsets():
+    rng = np.random.default_rng(0)
+    base = datetime.datetime(2023, 12, 31, 22, 0)
+    texts = []
+    for _ in range(200):
+        moment = base + datetime.timedelta(minutes=int(rng.integers(0, 60 * 24 * 5)))
+        minutes = int(rng.choice([-600, -300, -150, 0, 330, 345, 540, 840]))
+        sign = '-' if minutes < 0 else '+'
+        texts.append(f"{moment:%Y-%m-%d %H:%M:%S} {sign}{abs(minutes) // 60:02d}{abs(minutes) % 60:02d}")
+
+    parsed = parse_timestamps(texts)
+    assert parsed['valid'].all()
+    for i, text in enumerate(texts):
+        local_seconds, offset = _reference(text)
+        assert parsed['offset'][i] == offset
+        assert parsed['local'][i].astype(np.int64) == local_seconds
+        assert parsed['utc'][i].astype(np.int64) == local_seconds - offset * 60
+        assert parsed['local_day'][i] == local_seconds // 86400
+        assert parsed['minute'][i] == (local_seconds % 86400) // 60
+        assert timestamp_to_utc_seconds(text) == local_seconds - offset * 60
+
+
+def test_invalid_and_fallback_rows():
+    texts = [
+        '2024-03-10 01:30:00 -0500',
+        None,
+        '',
+        'not a date',
+        '2024-03-10T08:15:00Z',
+        '2024-03-10 09:00:00',
+        float('nan'),
+    ]
+    parsed = parse_timestamps(texts)
+    assert parsed['valid'].tolist() == [True, False, False, False, True, True, False]
+    invalid = ~parsed['valid']
+    assert (parsed['local_day'][invalid] == INVALID_DAY).all()
+    assert (parsed['minute'][invalid] == -1).all()
+    assert np.isnat(parsed['local'][invalid]).all() and np.isnat(parsed['utc'][invalid]).all()
+    # ISO格式和不带时区的时间逐条回退解析，偏移为0
+    assert parsed['minute'][4] == 8 * 60 + 15 and parsed['offset'][4] == 0
+    assert parsed['minute'][5] == 9 * 60 and parsed['offset'][5] == 0
+
+
+def test_out_of_range_month_falls_back_per_row():
+    parsed = parse_timestamps(['2024-13-01 00:00:00 +0000', '2024-01-02 03:04:05 +0100'])
+    assert parsed['valid'].tolist() == [False, True]
+    assert parsed['offset'][1] == 60 and parsed['minute'][1] == 3 * 60 + 4
+
+
+def test_bucket_keys_round_trip():
+    days = np.array([19723, 19724, 19729, 19730])  # 2024-01-01是周一
+    minutes = np.array([0, 61, 1439, 720])
+    assert bucket_labels(bucket_keys(days, minutes, 'hour'), 'hour').tolist()[1] == '2024-01-02T01:00'
+    weeks = bucket_keys(days, minutes, 'week')
+    assert bucket_labels(weeks, 'week').tolist() == ['2024-01-01', '2024-01-01', '2024-01-01', '2024-01-08']
+    assert bucket_starts(weeks[:1], 'week')[0] == np.datetime64('2024-01-01T00:00:00')
+    with pytest.raises(ValueError):
+        bucket_keys(days, minutes, 'month')
+
+
+def test_prefilter_and_window():
+    since = window_start_day(7, today=datetime.date(2024, 1, 10))
+    assert since == 19723 + 2
+    keep = prefilter_since(['2024-01-02 10:00:00 +0000', '2024-01-03 00:00:00 +0000', 'Jan 1 2024', None], since)
+    assert keep.tolist() == [False, True, True, True]
+    assert window_start_day(None) is None
+
+
+def test_since_day_pushdown_matches_filtering_full_parse(tmp_path):
+    pytest.importorskip('pandas')
+    from app.utils.health_parser import HealthDataParser
+
+    rng = np.random.default_rng(1)
+    base = datetime.datetime(2024, 1, 1)
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<HealthData locale="en_US">']
+    for _ in range(300):
+        # 集中在午夜前后，覆盖不同时区偏移下本地日期与UTC日期不同的记录
+        moment = base + datetime.timedelta(days=int(rng.integers(0, 10)), minutes=int(rng.integers(-90, 90)))
+        minutes = int(rng.choice([-600, -300, 0, 330, 540, 840]))
+        sign = '-' if minutes < 0 else '+'
+        text = f"{moment:%Y-%m-%d %H:%M:%S} {sign}{abs(minutes) // 60:02d}{abs(minutes) % 60:02d}"
+        record_type = rng.choice(['HKQuantityTypeIdentifierHeartRate', 'HKQuantityTypeIdentifierStepCount'])
+        lines.append(f'<Record type="{record_type}" sourceName="Watch" startDate="{text}" endDate="{text}" '
+                     f'value="{int(rng.integers(1, 200))}"/>')
+    lines.append('</HealthData>')
+    path = tmp_path / 'export.xml'
+    path.write_text('\n'.join(lines), encoding='utf-8')
+
+    full_parser = HealthDataParser()
+    assert full_parser.parse_xml(str(path))
+    for record_type in ('HKQuantityTypeIdentifierHeartRate', 'HKQuantityTypeIdentifierStepCount'):
+        full = full_parser.get_samples([record_type])
+        for since_day in (19723, 19725, 19728, 19740):
+            # 每个窗口用新的解析器，确保走解析前的预筛选而不是从已缓存的全量结果中截取
+            parser = HealthDataParser()
+            assert parser.parse_xml(str(path))
+            windowed = parser.get_samples([record_type], since_day=since_day)
+            expected = full[full['local_day'] >= since_day].reset_index(drop=True)
+            assert list(windowed.columns) == list(expected.columns)
+            if expected.empty:
+                assert windowed.empty
+            else:
+                assert windowed.equals(expected)
@@ -0,0 +1,39 @@
+import os
+import zipfile
+
+from app.components import upload
+from app.utils.cache import artifact_dir, dataset_version
+
+
+def test_zip_upload_persists_export_and_artifacts(app, tmp_path, export_path, monkeypatch):
+    app.config.update(UPLOAD_FOLDER=str(tmp_path / 'uploads'), SOURCE_PRIORITY=['iPhone'])
+    archive = tmp_path / 'export.zip'
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.write(export_path, 'apple_health_export/export.xml')
+
+    priorities = []
+    parser_class = upload.HealthDataParser
+
+    def recording_parser(**kwargs):
+        priorities.append(kwargs.get('source_priority'))
+        return parser_class(**kwargs)
+
+    monkeypatch.setattr(upload, 'HealthDataParser', recording_parser)
+
+    client = app.test_client()
+    with open(archive, 'rb') as f:
+        response = client.post('/upload', data={'file': (f, 'export.zip')}, content_type='multipart/form-data')
+    assert response.status_code == 302
+    assert priorities == [['iPhone']]
+
+    with client.session_transaction() as session:
+        data_file_path = session['data_file_path']
+    # 解压出的XML保存在上传目录中，解析器清理后仍然存在
+    assert os.path.dirname(data_file_path).startswith(app.config['UPLOAD_FOLDER'])
+    assert os.path.exists(data_file_path)
+
+    version = dataset_version(data_file_path, None)
+    artifacts = os.listdir(artifact_dir(data_file_path, None))
+    assert f'health_summary-{version}.json' in artifacts
+    assert f'quantile_sketches-{version}.npz' in artifacts
+    assert f'viewport_samples-{version}.npz' in artifacts
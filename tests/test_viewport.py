@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from app.utils.health_parser import HealthDataParser
+from app.utils.viewport import build_viewport_store, save_viewport_store, load_viewport_store, viewport_series
+
+HEART_RATE = 'HKQuantityTypeIdentifierHeartRate'
+STEP_COUNT = 'HKQuantityTypeIdentifierStepCount'
+
+
+@pytest.fixture
+def parser(export_path):
+    parser = HealthDataParser()
+    assert parser.parse_xml(export_path)
+    return parser
+
+
+def _milliseconds(days, minutes=0):
+    return (np.asarray(days, dtype=np.int64) * 86400 + np.asarray(minutes, dtype=np.int64) * 60) * 1000.0
+
+
+def test_narrow_viewport_returns_raw_samples(parser):
+    store = build_viewport_store(parser)
+    samples, _ = parser.get_range_samples(HEART_RATE)
+    day = int(samples['local_day'].iloc[len(samples) // 2])
+    start, end = np.datetime64(day, 'D'), np.datetime64(day + 1, 'D')
+
+    series = viewport_series(store, 'heart_rate', start, end, width=1000)
+    expected = samples[samples['local_day'] == day]
+    assert series['resolution'] == 'raw' and series['count'] == len(expected)
+    np.testing.assert_array_equal(series['y'], expected['value'].to_numpy(dtype=float))
+    np.testing.assert_array_equal(series['x'], _milliseconds(day, expected['minute'].to_numpy()))
+
+
+@pytest.mark.parametrize('width, resolution', [(100, 'day'), (10, 'week')])
+def test_wide_viewport_averages_heart_rate_buckets(parser, width, resolution):
+    store = build_viewport_store(parser)
+    series = viewport_series(store, 'heart_rate', width=width)
+    assert series['resolution'] == resolution and series['aggregation'] == 'mean'
+
+    samples, _ = parser.get_range_samples(HEART_RATE)
+    if resolution == 'day':
+        keys = samples['local_day']
+        expected = samples.groupby(keys)['value'].mean()
+        np.testing.assert_allclose(series['x'], _milliseconds(expected.index.to_numpy()))
+    else:
+        # 每周从周一开始（1970-01-01是周四）
+        keys = (samples['local_day'] + 3) // 7
+        expected = samples.groupby(keys)['value'].mean()
+    np.testing.assert_allclose(series['y'], expected.to_numpy())
+
+
+def test_cumulative_metric_sums_hourly_buckets(parser):
+    store = build_viewport_store(parser)
+    series = viewport_series(store, 'steps', width=1000)
+    assert series['resolution'] == 'hour' and series['aggregation'] == 'sum'
+
+    samples, _ = parser.get_range_samples(STEP_COUNT)
+    expected = samples.groupby([samples['local_day'], samples['minute'] // 60])['value'].sum()
+    days, hours = (np.array(level) for level in zip(*expected.index))
+    np.testing.assert_allclose(series['x'], _milliseconds(days, hours * 60))
+    np.testing.assert_allclose(series['y'], expected.to_numpy())
+
+
+def test_store_round_trip_and_empty_range(parser, tmp_path):
+    store = build_viewport_store(parser)
+    assert save_viewport_store(str(tmp_path), 'v1', store)
+    loaded = load_viewport_store(str(tmp_path), 'v1')
+    assert sorted(loaded) == sorted(store)
+    for name in store:
+        np.testing.assert_array_equal(loaded[name], store[name])
+
+    assert viewport_series(loaded, 'heart_rate', np.datetime64('1990-01-01'), np.datetime64('1990-01-02')) is None
+    assert load_viewport_store(str(tmp_path), 'v2') is None